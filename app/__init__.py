@@ -1,63 +1,65 @@
 # app/__init__.py
 
-import logging
-from logging.handlers import RotatingFileHandler
 import os
 from dotenv import load_dotenv
 from flask import Flask
-from flask_migrate import Migrate
 from flask_wtf import CSRFProtect
+from app.logging_setup import configure_logging
 from config import Config
-from database import db
+from database import configure_sqlite, db
 
 csrf = CSRFProtect()
-migrate = Migrate()
 
 
-def create_app():
+def create_db_app(config_class=Config):
+    """
+    Приложение только для работы с базой: настройки, Flask-SQLAlchemy, прагмы SQLite и учет
+    SQL-запросов. Без blueprints, форм и CSRF - его поднимают боты, relay, init_db и manage.py.
+    """
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+    db.init_app(app)
+
+    # Импорт моделей регистрирует таблицы в метаданных (create_all, Flask-Migrate)
+    from app.model import Admin, Disinsector, Client, Order
+
+    with app.app_context():
+        configure_sqlite(db.engine, app.config.get('SQLITE_PRAGMAS'))
+        from app import metrics, query_monitor
+        query_monitor.init_app(app)
+        if app.config.get('METRICS_ENABLED', True) or query_monitor.enabled():
+            metrics.install_db_metrics(db.engine)
+    return app
+
+
+def create_app(config_class=Config):
+    app = create_db_app(config_class)
 
     basedir = os.path.abspath(os.path.dirname(__file__))
     load_dotenv(os.path.join(basedir, '..', '.env'))
 
     # Инициализация расширений
     csrf.init_app(app)
-    db.init_app(app)
-    migrate.init_app(app, db)
-
-    # Импорт моделей для обнаружения Flask-Migrate
-    from app.model import Admin, Disinsector, Client, Order
 
-    # Настройка логирования
+    # Настройка логирования: очередь и поток записи, JSON в файл. Если процесс уже настроил
+    # логирование (боты делают это при старте), повторный вызов ничего не добавляет.
     if not app.debug and not app.testing:
-        # RotatingFileHandler для логов в файл
-        file_handler = RotatingFileHandler(app.config['LOG_FILE'], maxBytes=10240, backupCount=10)
-        file_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s [in %(pathname)s:%(lineno)d]'
-        )
-        file_handler.setFormatter(formatter)
-        app.logger.addHandler(file_handler)
-
-        # StreamHandler для вывода логов в консоль
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        console_handler.setFormatter(formatter)
-        app.logger.addHandler(console_handler)
-
-        app.logger.setLevel(logging.INFO)
+        configure_logging('web', log_file=app.config['LOG_FILE'])
         app.logger.info('DisinsectorBot-v3 startup')
 
     # Регистрация Blueprint'ов
     with app.app_context():
-        from app.api import api_bp
+        from app import metrics
+        metrics.init_app(app, db.engine)
+        from app.api import api_bp, bulk_create_orders, create_order
         from app.auth import auth_bp
         from app.main import main_bp
         app.register_blueprint(auth_bp)
         app.register_blueprint(main_bp)
         app.register_blueprint(api_bp, url_prefix='/api')
+        # Эти маршруты вызывают внешние системы с X-API-Key, а не формы сайта - CSRF-токена
+        # у них нет. Новые POST-маршруты API без ключа остаются под защитой CSRF.
+        for view in (create_order, bulk_create_orders):
+            csrf.exempt(view)
 
     return app
-
-
@@ -1,42 +1,122 @@
-import asyncio
+import csv
+import hmac
+from functools import wraps
 
-from flask import Blueprint, request, jsonify
-from app.model import Order, Client
-from disinsector_bot import assign_and_notify_disinsector, notify_new_order
+from flask import Blueprint, current_app, request, jsonify, url_for
+from app.model import Order, Client, STATUS_NEW
+from app.order_import import ImportFormatError, import_orders, iter_csv, iter_ndjson, parse_order_row
+from app.order_jobs import enqueue_order_job, order_assignment_status
+from app.query_monitor import query_budget
 from database import db
 import logging
 
 api_bp = Blueprint('api', __name__)
 logger = logging.getLogger('api_bp')
 
+# Форматы массового импорта: тело читается потоково, построчно
+BULK_READERS = {
+    'application/x-ndjson': iter_ndjson,
+    'application/jsonl': iter_ndjson,
+    'text/csv': iter_csv,
+}
+
+
+def require_api_key(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        api_key = request.headers.get('X-API-Key', '')
+        if not hmac.compare_digest(api_key, current_app.config['API_KEY']):
+            return jsonify({'error': 'Invalid API key'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
 
 @api_bp.route('/create_order', methods=['POST'])
+@require_api_key
+@query_budget(6)
 def create_order():
-    data = request.get_json()
-    if not data:
+    """
+    Сохраняет заявку и сразу отвечает 202. Назначение дезинсектора и уведомление
+    выполняет фоновый обработчик очереди order_jobs; результат - по status_url.
+    """
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data, dict):
         return jsonify({'error': 'No data provided'}), 400
 
-    # Проверка на наличие необходимых данных
-    required_fields = ['client_name', 'phone_number', 'address', 'object_type', 'insect_quantity']
-    missing_fields = [field for field in required_fields if field not in data]
-    if missing_fields:
-        return jsonify({'error': f'Missing fields: {", ".join(missing_fields)}'}), 400
-
-    # Создание клиента, если его нет
-    client = Client.query.filter_by(phone=data['phone_number']).first()
-    if not client:
-        client = Client(name=data['client_name'], phone=data['phone_number'], address=data['address'])
-        db.session.add(client)
+    fields, error = parse_order_row(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        # Создание клиента, если его нет
+        client = Client.query.filter_by(phone=fields['phone']).first()
+        if not client:
+            client = Client(name=fields['client_name'], phone=fields['phone'], address=fields['address'])
+            db.session.add(client)
+
+        new_order = Order(
+            client=client,
+            object_type=fields['object_type'],
+            insect_quantity=fields['insect_quantity'],
+            disinsect_experience=fields['disinsect_experience'],
+            order_status=STATUS_NEW,
+        )
+        db.session.add(new_order)
+        db.session.flush()
+        # Задача на назначение - в той же транзакции, что и заявка
+        enqueue_order_job(new_order.id)
         db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Ошибка при создании заявки через API: {e}")
+        return jsonify({'error': 'Failed to create order'}), 500
+
+    status_url = url_for('api.order_status', order_id=new_order.id)
+    response = jsonify({'order_id': new_order.id, 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+
+@api_bp.route('/orders/<int:order_id>/status', methods=['GET'])
+@require_api_key
+@query_budget(3)
+def order_status(order_id):
+    """
+    Состояние заявки и ее назначения для опроса после /create_order. Только с X-API-Key:
+    id заявок последовательные, и без ключа по ним можно перебрать все назначения.
+    """
+    status = order_assignment_status(order_id)
+    if status is None:
+        return jsonify({'error': 'Order not found'}), 404
+    return jsonify(status), 200
+
+
+@api_bp.route('/orders/bulk', methods=['POST'])
+@require_api_key
+def bulk_create_orders():
+    """
+    Массовый импорт заявок из NDJSON или CSV (по одной заявке на строку, поля как у /create_order).
+    Возвращает число созданных заявок и строк с ошибками, а также первые
+    BULK_IMPORT_MAX_ERRORS ошибок с номерами строк.
+    """
+    reader = BULK_READERS.get(request.mimetype)
+    if reader is None:
+        return jsonify({'error': 'Unsupported Content-Type: use application/x-ndjson or text/csv'}), 415
 
-    # Создаем новый заказ
-    new_order = Order(
-        client_id=client.id,
-        object_type=data['object_type'],
-        insect_quantity=data['insect_quantity'],
-        disinsect_experience=data.get('disinsect_experience', False),
-        order_status='Новая'
-    )
-    db.session.add(new_order)
-    db.session.commit()
+    try:
+        result = import_orders(
+            reader(request.stream),
+            chunk_size=current_app.config['BULK_IMPORT_CHUNK_SIZE'],
+            max_rows=current_app.config['BULK_IMPORT_MAX_ROWS'],
+            max_errors=current_app.config['BULK_IMPORT_MAX_ERRORS'],
+        )
+    except ImportFormatError as e:
+        return jsonify({'error': str(e)}), 413
+    except (ValueError, csv.Error) as e:
+        return jsonify({'error': f'Malformed body: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Ошибка массового импорта заявок: {e}")
+        return jsonify({'error': 'Import failed'}), 500
 
+    return jsonify(result), 200
@@ -0,0 +1,411 @@
+# app/assignment.py
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import contains_eager, joinedload
+
+from app.bot_db import run_db
+from app.entity_cache import get_disinsector_profile
+from app.metrics import ORDER_ASSIGNMENTS
+from app.model import Disinsector, Order, STATUS_NEW
+from app.order_stats import record_order_stats
+from app.outbox import enqueue_backlog_notification, enqueue_order_notification
+from database import db
+
+logger = logging.getLogger('assignment')
+
+
+# Дезинсекторы, которым можно назначать заявки: есть бот, привязан Telegram и есть свободная емкость
+AVAILABLE_CONDITIONS = (
+    Disinsector.token.isnot(None),
+    Disinsector.telegram_user_id.isnot(None),
+    Disinsector.load < Disinsector.max_load,
+)
+
+
+def available_disinsectors_query():
+    return Disinsector.query.filter(*AVAILABLE_CONDITIONS)
+
+
+def disinsector_summary(disinsector):
+    """
+    Данные дезинсектора, нужные для отправки ему уведомлений.
+    """
+    return {
+        'id': disinsector.id,
+        'name': disinsector.name,
+        'token': disinsector.token,
+        'telegram_user_id': disinsector.telegram_user_id,
+    }
+
+
+def order_summary(order):
+    """
+    Поля заявки и клиента, нужные для уведомления дезинсектора.
+    """
+    return {
+        'id': order.id,
+        'client_name': order.client.name,
+        'address': order.client.address,
+        'phone': order.client.phone,
+        'object_type': order.object_type,
+    }
+
+
+def plan_assignments(orders, disinsectors):
+    """
+    Распределяет заявки по дезинсекторам без обращений к базе.
+
+    Заявки обрабатываются в порядке поступления, каждая уходит дезинсектору, которому
+    дольше всех ничего не назначали (та же политика, что и при одиночном назначении).
+    Куча по (last_assigned, порядковый номер) дает O((N + M) log M) вместо запроса на каждую заявку.
+    Возвращает список пар (order, disinsector).
+    """
+    sequence = itertools.count()
+    heap = []
+    free = {}
+    for disinsector in disinsectors:
+        capacity = (disinsector.max_load or 0) - (disinsector.load or 0)
+        if capacity > 0:
+            free[disinsector.id] = capacity
+            heap.append((disinsector.last_assigned or datetime.min, next(sequence), disinsector))
+    heapq.heapify(heap)
+
+    plan = []
+    for order in orders:
+        if not heap:
+            break
+        last_assigned, _, disinsector = heapq.heappop(heap)
+        plan.append((order, disinsector))
+        free[disinsector.id] -= 1
+        if free[disinsector.id] > 0:
+            # Только что получивший заявку уходит в конец очереди
+            heapq.heappush(heap, (datetime.max, next(sequence), disinsector))
+    return plan
+
+
+class CapacityHeap:
+    """
+    Необязательная подсказка в памяти процесса: куча дезинсекторов со свободной емкостью,
+    упорядоченная по last_assigned. Позволяет выбрать кандидата без запроса к таблице на
+    каждую заявку. Окончательно место резервирует условный UPDATE в базе, поэтому устаревшие
+    данные кучи приводят только к повторной попытке, а не к перегрузке.
+    """
+    def __init__(self, ttl=30, min_refresh_interval=1):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._heap = []
+        self._entries = {}  # id -> порядковый номер актуальной записи в куче
+        self._free = {}
+        self._last_assigned = {}
+        self._loaded_at = 0
+
+    def refresh(self):
+        rows = db.session.query(
+            Disinsector.id, Disinsector.load, Disinsector.max_load, Disinsector.last_assigned
+        ).filter(*AVAILABLE_CONDITIONS).all()
+        with self._lock:
+            self._heap = []
+            self._entries = {}
+            self._free = {}
+            self._last_assigned = {}
+            for disinsector_id, load, max_load, last_assigned in rows:
+                self._free[disinsector_id] = (max_load or 0) - (load or 0)
+                self._last_assigned[disinsector_id] = last_assigned or datetime.min
+                self._push(disinsector_id, self._last_assigned[disinsector_id])
+            heapq.heapify(self._heap)
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0
+
+    def _push(self, disinsector_id, key):
+        seq = next(self._sequence)
+        self._entries[disinsector_id] = seq
+        heapq.heappush(self._heap, (key, seq, disinsector_id))
+
+    def candidate(self):
+        """
+        Возвращает id дезинсектора, которому дольше всех ничего не назначали, или None.
+        """
+        age = time.monotonic() - self._loaded_at
+        if age > self.ttl or (not self._free_any() and age > self.min_refresh_interval):
+            self.refresh()
+        with self._lock:
+            while self._heap:
+                _, seq, disinsector_id = self._heap[0]
+                if self._entries.get(disinsector_id) == seq and self._free.get(disinsector_id, 0) > 0:
+                    return disinsector_id
+                heapq.heappop(self._heap)
+            return None
+
+    def _free_any(self):
+        with self._lock:
+            return any(free > 0 for free in self._free.values())
+
+    def reserved(self, disinsector_id):
+        with self._lock:
+            self._free[disinsector_id] = self._free.get(disinsector_id, 1) - 1
+            # То же время, что reserve_capacity записал в last_assigned
+            self._last_assigned[disinsector_id] = datetime.utcnow()
+            self._push(disinsector_id, self._last_assigned[disinsector_id])
+
+    def rejected(self, disinsector_id):
+        with self._lock:
+            self._free[disinsector_id] = 0
+
+    def released(self, disinsector_id):
+        """
+        Возвращает место дезинсектора в кучу с его настоящим last_assigned: освобождение
+        не ставит его впереди тех, кто ждет заявку дольше. Если дезинсектора нет в куче
+        (при загрузке он был заполнен), куча перечитывается при следующем выборе кандидата.
+        """
+        with self._lock:
+            if disinsector_id not in self._free:
+                self._loaded_at = 0
+                return
+            self._free[disinsector_id] += 1
+            self._push(disinsector_id, self._last_assigned[disinsector_id])
+
+
+_capacity_heap = None
+_capacity_heap_lock = threading.Lock()
+
+
+def get_capacity_heap():
+    """
+    Куча емкости процесса, если она включена настройкой ASSIGNMENT_CAPACITY_HEAP.
+    """
+    global _capacity_heap
+    if not current_app.config.get('ASSIGNMENT_CAPACITY_HEAP'):
+        return None
+    if _capacity_heap is None:
+        with _capacity_heap_lock:
+            if _capacity_heap is None:
+                _capacity_heap = CapacityHeap(ttl=current_app.config.get('ASSIGNMENT_CAPACITY_HEAP_TTL', 30))
+    return _capacity_heap
+
+
+def reserve_capacity_statement(disinsector_id=None):
+    """
+    Условный UPDATE, занимающий одно место у дезинсектора (см. reserve_capacity).
+    """
+    if disinsector_id is None:
+        target = (
+            select(Disinsector.id)
+            .where(*AVAILABLE_CONDITIONS)
+            .order_by(Disinsector.last_assigned)
+            .limit(1)
+            .scalar_subquery()
+        )
+    else:
+        target = disinsector_id
+    statement = (
+        update(Disinsector)
+        .where(Disinsector.id == target, *AVAILABLE_CONDITIONS)
+        .values(load=Disinsector.load + 1, last_assigned=datetime.utcnow())
+        .returning(Disinsector.id)
+        .execution_options(synchronize_session=False)
+    )
+    return statement
+
+
+def reserve_capacity(disinsector_id=None):
+    """
+    Атомарно занимает одно место у дезинсектора одним условным UPDATE.
+
+    Без disinsector_id кандидат выбирается подзапросом в том же UPDATE. Повторная проверка
+    load < max_load в WHERE не дает двум конкурентным транзакциям превысить max_load.
+    Возвращает id дезинсектора или None, если место занять не удалось.
+    """
+    return db.session.execute(reserve_capacity_statement(disinsector_id)).scalar()
+
+
+def assign_order(order_id, attempts=3):
+    """
+    Назначает заявке дезинсектора, которому дольше всех ничего не назначали.
+
+    Резервирование емкости и привязка заявки выполняются в одной транзакции условными
+    UPDATE, поэтому параллельные процессы не перегружают дезинсекторов и не назначают
+    одну заявку дважды. Возвращает {'disinsector': ..., 'order': ...} с данными для
+    уведомления или None, если назначить не удалось. Уведомление дезинсектору ставится
+    в outbox в той же транзакции.
+
+    attempts - сколько кандидатов из кучи емкости попробовать: кандидата из кучи мог уже
+    заполнить другой процесс. Без кучи попытка одна: подзапрос выбирает кандидата в том же
+    UPDATE, и если тот ничего не занял, свободных мест нет.
+    """
+    capacity_heap = get_capacity_heap()
+    for _ in range(attempts if capacity_heap else 1):
+        candidate = capacity_heap.candidate() if capacity_heap else None
+        if capacity_heap and candidate is None:
+            break
+
+        disinsector_id = reserve_capacity(candidate)
+        if disinsector_id is None:
+            db.session.rollback()
+            if capacity_heap:
+                # Кандидат из кучи уже заполнен другим процессом: пробуем следующего
+                capacity_heap.rejected(candidate)
+            continue
+
+        claimed = db.session.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.disinsector_id.is_(None))
+            .values(disinsector_id=disinsector_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            # Заявку уже назначил кто-то другой (например, пакетное назначение) - резерв отменяется
+            db.session.rollback()
+            logger.warning(f"Заявка {order_id} уже назначена или не найдена.", extra={'order_id': order_id})
+            ORDER_ASSIGNMENTS.inc(source='single', outcome='already_assigned')
+            return None
+
+        order = Order.query.options(joinedload(Order.client)).filter(Order.id == order_id).one()
+        # Имя и контакты дезинсектора берутся из кэша процесса, а не отдельным запросом
+        assignment = {'disinsector': get_disinsector_profile(disinsector_id), 'order': order_summary(order)}
+        record_order_stats([(disinsector_id, order.order_status, 1)])
+        # Уведомление фиксируется вместе с назначением и отправляется relay после коммита
+        enqueue_order_notification(disinsector_id, assignment['order'])
+        db.session.commit()
+        if capacity_heap:
+            capacity_heap.reserved(disinsector_id)
+        ORDER_ASSIGNMENTS.inc(source='single', outcome='assigned')
+        return assignment
+
+    logger.warning(f"Заявка {order_id}: Нет доступных дезинсекторов для назначения.", extra={'order_id': order_id})
+    ORDER_ASSIGNMENTS.inc(source='single', outcome='no_capacity')
+    return None
+
+
+def backlog_orders_query(limit=None):
+    """
+    Новые заявки без дезинсектора вместе с клиентами, в порядке поступления.
+    """
+    query = (
+        Order.query
+        .join(Order.client)
+        .options(contains_eager(Order.client))
+        .filter(Order.disinsector_id.is_(None), Order.order_status == STATUS_NEW)
+        .order_by(Order.created_at, Order.id)
+    )
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def dispatch_backlog(limit=None):
+    """
+    Назначает накопившиеся неназначенные заявки одним проходом.
+
+    Загружает все новые заявки без дезинсектора (вместе с клиентами) и всех дезинсекторов
+    со свободной емкостью двумя запросами, распределяет их в памяти и сохраняет одним коммитом.
+    Пакетные уведомления ставятся в outbox в той же транзакции. Возвращает словарь
+    {disinsector_id: {...}} с назначенными заявками; данные собираются до коммита,
+    чтобы не перечитывать истекшие после него объекты.
+    """
+    disinsectors = available_disinsectors_query().order_by(Disinsector.last_assigned).all()
+    if not disinsectors:
+        return {}
+    orders = backlog_orders_query(limit).all()
+    if not orders:
+        return {}
+
+    plan = plan_assignments(orders, disinsectors)
+    now = datetime.utcnow()
+    assignments = {}
+    for order, disinsector in plan:
+        if disinsector.id not in assignments:
+            assignments[disinsector.id] = {**disinsector_summary(disinsector), 'orders': []}
+        assignments[disinsector.id]['orders'].append(order_summary(order))
+
+    try:
+        # Емкость резервируется одним условным UPDATE на дезинсектора: если за время
+        # расчета ее занял другой процесс, его заявки остаются в очереди до следующего прохода.
+        for disinsector_id in list(assignments):
+            count = len(assignments[disinsector_id]['orders'])
+            reserved = db.session.execute(
+                update(Disinsector)
+                .where(Disinsector.id == disinsector_id, Disinsector.load + count <= Disinsector.max_load)
+                .values(load=Disinsector.load + count, last_assigned=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not reserved:
+                del assignments[disinsector_id]
+
+        rows = [
+            {'order_id': order['id'], 'new_disinsector_id': disinsector_id}
+            for disinsector_id, assignment in assignments.items()
+            for order in assignment['orders']
+        ]
+        if rows:
+            claimed = db.session.execute(
+                update(Order.__table__)
+                .where(Order.id == bindparam('order_id'), Order.disinsector_id.is_(None))
+                .values(disinsector_id=bindparam('new_disinsector_id')),
+                rows,
+            ).rowcount
+            if claimed != len(rows):
+                # Часть заявок успели назначить параллельно - повторим на следующем проходе
+                db.session.rollback()
+                logger.warning("Пакетное назначение прервано: часть заявок уже назначена другим процессом.")
+                ORDER_ASSIGNMENTS.inc(len(rows), source='backlog', outcome='already_assigned')
+                return {}
+            record_order_stats(
+                (disinsector_id, STATUS_NEW, len(assignment['orders']))
+                for disinsector_id, assignment in assignments.items()
+            )
+            for disinsector_id, assignment in assignments.items():
+                enqueue_backlog_notification(disinsector_id, assignment['orders'])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Ошибка при пакетном назначении заявок: {e}")
+        ORDER_ASSIGNMENTS.inc(len(orders), source='backlog', outcome='error')
+        return {}
+
+    capacity_heap = get_capacity_heap()
+    if capacity_heap:
+        capacity_heap.invalidate()
+
+    # Счетчики - в заявках: назначенные и оставшиеся в очереди из-за нехватки емкости
+    ORDER_ASSIGNMENTS.inc(len(rows), source='backlog', outcome='assigned')
+    if len(orders) > len(rows):
+        ORDER_ASSIGNMENTS.inc(len(orders) - len(rows), source='backlog', outcome='no_capacity')
+    logger.info(
+        f"Пакетное назначение: {len(rows)} из {len(orders)} заявок распределены "
+        f"между {len(assignments)} дезинсекторами."
+    )
+    return assignments
+
+
+async def assign_and_notify_disinsector(order_id):
+    """
+    Назначает дезинсектора для заявки из кода ботов (в пуле run_db). Уведомление ставится
+    в outbox вместе с назначением и отправляется relay. Возвращает данные назначенного
+    дезинсектора или None.
+
+    Relay работает в другом процессе (бот дезинсекторов или outbox_relay.py), и разбудить его
+    отсюда нельзя: уведомление уходит не позже чем через OUTBOX_POLL_INTERVAL секунд.
+    """
+    try:
+        assignment = await run_db(assign_order, order_id)
+    except Exception as e:
+        logger.error(f"Ошибка при назначении дезинсектора для заявки {order_id}: {e}", extra={'order_id': order_id})
+        return None
+
+    if not assignment:
+        return None
+
+    return assignment['disinsector']
@@ -2,12 +2,12 @@
 
 from flask import Blueprint, render_template, redirect, url_for, session, flash, request, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
+from app.entity_cache import invalidate_disinsector
 from app.model import Admin, Disinsector
 from app import db
 from sqlalchemy.exc import IntegrityError
 from app.forms import RegisterDisinsectorForm, RegisterAdminForm, LoginAdminForm
 from app.utils import send_telegram_message
-import requests
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -104,6 +104,8 @@ def register_disinsector():
             try:
                 db.session.add(new_disinsector)
                 db.session.commit()
+                # Кэш профилей в этом процессе не должен отдавать устаревшие данные по этому id
+                invalidate_disinsector(new_disinsector.id)
                 flash(f"Дезинсектор {name} успешно зарегистрирован!", 'success')
                 current_app.logger.info(f"Дезинсектор с email {email} успешно зарегистрирован.")
                 # Отправка сообщения только если telegram_user_id установлен
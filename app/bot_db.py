@@ -0,0 +1,60 @@
+# app/bot_db.py
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from database import db
+
+_app = None
+_executor = None
+
+
+def init_bot_db(app, max_workers=None):
+    """
+    Подготавливает доступ к базе для ботов: ограниченный пул потоков под синхронные
+    запросы Flask-SQLAlchemy, чтобы они не выполнялись в event loop.
+    """
+    global _app, _executor
+    _app = app
+    _executor = ThreadPoolExecutor(
+        max_workers=max_workers or Config.BOT_DB_WORKERS,
+        thread_name_prefix='bot-db',
+    )
+
+
+def shutdown_bot_db():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def _call_in_app_context(func, args, kwargs):
+    # Каждый вызов получает свой app context, а значит и свою scoped-сессию,
+    # которая закрывается при выходе из контекста.
+    with _app.app_context():
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Выполняет синхронную функцию работы с базой в пуле потоков и ждет результат, не блокируя loop.
+
+    Функция должна возвращать простые данные (id, словари), а не ORM-объекты:
+    сессия закрывается сразу после вызова.
+    """
+    if _executor is None:
+        raise RuntimeError("Доступ к базе для ботов не инициализирован: вызовите init_bot_db(app).")
+    loop = asyncio.get_running_loop()
+    # Контекст (в том числе текущий апдейт для метрик) переносится в поток, как в asyncio.to_thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _executor, functools.partial(context.run, _call_in_app_context, func, args, kwargs)
+    )
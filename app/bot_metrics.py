@@ -0,0 +1,119 @@
+# app/bot_metrics.py
+
+import hmac
+import logging
+import time
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramConflictError, TelegramForbiddenError, TelegramNetworkError, TelegramNotFound,
+    TelegramRetryAfter, TelegramServerError, TelegramUnauthorizedError,
+)
+
+from app.metrics import (
+    BOT_HANDLER_SECONDS, BOT_UPDATE_DB_QUERIES, BOT_UPDATE_DB_SECONDS, CONTENT_TYPE, FSM_DIALOGS, REGISTRY,
+    TELEGRAM_ERRORS, TELEGRAM_REQUEST_SECONDS, unit_of_work,
+)
+from config import Config
+
+logger = logging.getLogger('bot_metrics')
+
+# Исключения aiogram -> метка error (код ответа Bot API)
+_ERROR_CODES = (
+    (TelegramRetryAfter, '429'),
+    (TelegramBadRequest, '400'),
+    (TelegramUnauthorizedError, '401'),
+    (TelegramForbiddenError, '403'),
+    (TelegramNotFound, '404'),
+    (TelegramConflictError, '409'),
+    (TelegramServerError, '5xx'),
+    (TelegramNetworkError, 'network'),
+)
+
+
+def error_code(exc):
+    for exc_type, code in _ERROR_CODES:
+        if isinstance(exc, exc_type):
+            return code
+    return type(exc).__name__
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Время обработчика и число SQL-запросов, сделанных за апдейт (включая run_db);
+    запросы апдейта проверяются на N+1 (app.query_monitor). Регистрируется на наблюдателях
+    message/callback_query, чтобы знать имя обработчика.
+    """
+    def __init__(self, bot_name):
+        self.bot_name = bot_name
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            with unit_of_work(f'{self.bot_name}.{name}') as unit:
+                result = await handler(event, data)
+            outcome = 'ok'
+            return result
+        finally:
+            BOT_HANDLER_SECONDS.observe(time.perf_counter() - started, bot=self.bot_name, handler=name, outcome=outcome)
+            BOT_UPDATE_DB_QUERIES.observe(unit.queries, bot=self.bot_name, handler=name)
+            BOT_UPDATE_DB_SECONDS.observe(unit.seconds, bot=self.bot_name, handler=name)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Задержка и ошибки каждого запроса к Bot API (getUpdates тоже: его время - длина long polling).
+    """
+    async def __call__(self, make_request, bot, method):
+        api_method = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(method=api_method, error=error_code(e))
+            raise
+        finally:
+            TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - started, method=api_method)
+
+
+async def start_metrics_server(host, port, refreshers=()):
+    """
+    HTTP-слушатель /metrics для процесса бота. refreshers - корутинные функции, которые
+    обновляют снимковые метрики (например, число диалогов FSM) перед выдачей.
+    Возвращает AppRunner, его нужно закрыть через cleanup().
+    """
+    async def handle(request):
+        if Config.METRICS_TOKEN and not hmac.compare_digest(
+            request.headers.get('Authorization', ''), f'Bearer {Config.METRICS_TOKEN}'
+        ):
+            return web.Response(status=401, text='Unauthorized\n')
+        for refresh in refreshers:
+            try:
+                await refresh()
+            except Exception as e:
+                logger.error(f"Не удалось обновить метрики: {e}")
+        return web.Response(body=REGISTRY.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    web_app = web.Application()
+    web_app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(web_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
+
+
+def fsm_refresher(storage):
+    """
+    Обновляет FSM_DIALOGS по хранилищу, если оно умеет считать состояния (app.fsm_storage).
+    """
+    async def refresh():
+        if hasattr(storage, 'state_counts'):
+            counts = await storage.state_counts()
+            FSM_DIALOGS.replace({(state,): count for state, count in counts.items()})
+    return refresh
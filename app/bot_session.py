@@ -0,0 +1,24 @@
+# app/bot_session.py
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from app.bot_metrics import TelegramMetricsMiddleware
+from config import Config
+
+
+def create_bot_session(long_polls=0):
+    """
+    Создает HTTP-сессию (пул соединений) для ботов процесса: у ботов дезинсекторов она
+    общая на всех, клиентский бот создает свою.
+
+    Каждый long polling getUpdates держит соединение до timeout, поэтому пул - это
+    long_polls соединений под них плюс TELEGRAM_POOL_LIMIT под исходящие вызовы
+    (sendMessage и т.п.): иначе при числе токенов больше лимита ответы ждут, пока
+    освободится соединение после getUpdates.
+    """
+    session = AiohttpSession(limit=long_polls + Config.TELEGRAM_POOL_LIMIT)
+    if Config.TELEGRAM_API_URL:
+        session.api = TelegramAPIServer.from_base(Config.TELEGRAM_API_URL)
+    session.middleware(TelegramMetricsMiddleware())
+    return session
@@ -0,0 +1,136 @@
+# app/dashboard_cache.py
+
+import hashlib
+import os
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from flask import Response, current_app, request
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+from sqlalchemy import func
+from werkzeug.http import is_resource_modified
+
+from app.entity_cache import LRUTTLCache
+from app.model import Order
+from app.order_feed import EPOCH
+from config import Config
+from database import db
+
+# В закэшированных строках вместо CSRF-токена стоит метка, токен сессии подставляется при отдаче
+CSRF_PLACEHOLDER = '__csrf_token__'
+
+# Шаблоны страниц: при их изменении меняются ETag, чтобы браузеры не держали старую разметку
+DASHBOARD_TEMPLATES = (
+    'admin_dashboard.html', '_admin_orders.html',
+    'disinsector_dashboard.html', '_disinsector_orders.html',
+)
+
+# Ключ записи содержит версию данных, поэтому после изменения заявок старые записи
+# просто перестают запрашиваться и вытесняются по LRU/TTL
+fragments = LRUTTLCache('dashboard_fragments', Config.DASHBOARD_FRAGMENT_CACHE_SIZE, Config.DASHBOARD_FRAGMENT_CACHE_TTL)
+
+
+def orders_version_query(disinsector_id=None):
+    if disinsector_id is None:
+        return db.session.query(func.max(Order.updated_at))
+    return (
+        db.session.query(func.max(Order.updated_at), func.count(Order.id))
+        .filter(Order.disinsector_id == disinsector_id)
+    )
+
+
+def orders_version(disinsector_id=None):
+    """
+    Версия данных дашборда. Для админ-панели - max(updated_at) по всем заявкам (один шаг
+    по индексу): заявка, сменившая статус, уходит из фильтра, и max по самому фильтру
+    этого бы не заметил. Для дезинсектора - max(updated_at) и число его заявок по
+    ix_orders_disinsector_updated_at_id. Заявки не удаляются, любая запись меняет updated_at.
+    """
+    return tuple(orders_version_query(disinsector_id).one())
+
+
+def is_settled(version, lag):
+    """
+    Версия устоялась, если последнее изменение старше lag секунд. updated_at ставится до
+    коммита, и транзакция, закоммиченная позже, может не сдвинуть max; такие свежие
+    версии не кэшируются и не отдаются с валидаторами.
+    """
+    latest = version[0]
+    return latest is None or datetime.utcnow() - latest >= timedelta(seconds=lag)
+
+
+def _templates_stamp(searchpath):
+    stamps = [os.stat(os.path.join(searchpath, name)).st_mtime_ns for name in DASHBOARD_TEMPLATES]
+    return hashlib.sha1(repr(stamps).encode()).hexdigest()[:12]
+
+
+_cached_templates_stamp = lru_cache(maxsize=8)(_templates_stamp)
+
+
+def templates_version():
+    """
+    Версия шаблонов дашбордов по времени изменения файлов. Без перезагрузки шаблонов они
+    не меняются до перезапуска, и stat делается один раз; в debug или с TEMPLATES_AUTO_RELOAD
+    файлы проверяются на каждом запросе, как это делает сам Jinja.
+    """
+    searchpath = current_app.jinja_loader.searchpath[0]
+    if current_app.jinja_env.auto_reload:
+        return _templates_stamp(searchpath)
+    return _cached_templates_stamp(searchpath)
+
+
+def page_validators(scope, version):
+    """
+    (etag, last_modified) страницы дашборда или (None, None), если версия не устоялась.
+
+    ETag слабый: в разметке есть CSRF-токен и курсор SSE, байты страниц разные, но
+    равнозначные. Токен Flask-WTF живет WTF_CSRF_TIME_LIMIT секунд, поэтому в ETag
+    входит номер полупериода: страница из кэша браузера не старше половины срока токена.
+    """
+    if not is_settled(version, current_app.config['SSE_LAG']):
+        return None, None
+    period = (current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600) or 0) // 2
+    now = datetime.utcnow()
+    bucket = int((now - EPOCH).total_seconds() // period) if period else 0
+    key = repr((scope, version, sorted(request.args.items(multi=True)), bucket, templates_version()))
+    etag = hashlib.sha1(key.encode()).hexdigest()
+    last_modified = max(version[0] or EPOCH, EPOCH + timedelta(seconds=bucket * period))
+    return etag, last_modified
+
+
+def conditional_page(scope, version, render):
+    """
+    Ответ со страницей дашборда: 304 без отрисовки, если у браузера актуальная версия,
+    иначе render(cacheable) с ETag и Last-Modified. cacheable=False для неустоявшейся версии.
+    """
+    etag, last_modified = page_validators(scope, version)
+    if etag is not None and not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        response = Response(render(etag is not None), mimetype='text/html')
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+    # Браузер хранит страницу, но перед показом всегда переспрашивает сервер
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def rows_fragment(key, load, render_rows, cacheable=True):
+    """
+    Отрисованные строки таблицы заявок: (Markup, page). load() читает страницу из базы и
+    возвращает (orders, page), render_rows(orders, token) рисует строки. Строки берутся из
+    кэша процесса по key (в нем версия данных), CSRF-токен сессии подставляется при отдаче.
+    """
+    # Правка шаблона строк тоже делает старые записи ненужными
+    key = (key, templates_version())
+    cached = fragments.get(key) if cacheable else None
+    if cached is None:
+        orders, page = load()
+        cached = (str(render_rows(orders, CSRF_PLACEHOLDER)), page)
+        if cacheable:
+            fragments.set(key, cached)
+    html, page = cached
+    return Markup(html.replace(CSRF_PLACEHOLDER, generate_csrf())), page
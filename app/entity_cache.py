@@ -0,0 +1,223 @@
+# app/entity_cache.py
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from app.metrics import CallbackMetric
+from app.model import Client, Disinsector
+from config import Config
+from database import db
+
+logger = logging.getLogger('entity_cache')
+
+
+class LRUTTLCache:
+    """
+    Потокобезопасный кэш процесса с ограничением размера (LRU) и временем жизни записей.
+
+    Обращения идут из потоков run_db, поэтому все операции под блокировкой.
+    maxsize=0 отключает кэш: get всегда промахивается, set ничего не сохраняет.
+    Все созданные кэши попадают в instances и отдаются в метриках процесса.
+    """
+    instances = []
+
+    def __init__(self, name, maxsize=10000, ttl=300, clock=time.monotonic):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        LRUTTLCache.instances.append(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, self._clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def peek(self, key):
+        """
+        Значение без учета в статистике и без продления LRU (для инвалидации).
+        """
+        with self._lock:
+            item = self._data.get(key)
+            return item[0] if item is not None else None
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+# Профили дезинсекторов (только неизменяемые в работе поля, без load) и индекс по Telegram
+disinsector_profiles = LRUTTLCache('disinsector_profiles', Config.ENTITY_CACHE_SIZE, Config.ENTITY_CACHE_TTL)
+disinsector_ids_by_telegram = LRUTTLCache('disinsector_telegram_ids', Config.ENTITY_CACHE_SIZE, Config.ENTITY_CACHE_TTL)
+# id клиента по нормализованному телефону (только цифры)
+client_ids_by_phone = LRUTTLCache('client_phones', Config.ENTITY_CACHE_SIZE, Config.ENTITY_CACHE_TTL)
+
+CACHES = (disinsector_profiles, disinsector_ids_by_telegram, client_ids_by_phone)
+
+PROFILE_COLUMNS = (Disinsector.id, Disinsector.name, Disinsector.token, Disinsector.telegram_user_id)
+
+
+def profile_by_telegram_query(telegram_user_id):
+    return db.session.query(*PROFILE_COLUMNS).filter(Disinsector.telegram_user_id == telegram_user_id)
+
+
+def client_id_query(phone):
+    return db.session.query(Client.id).filter(Client.phone == phone)
+
+
+def _remember_profile(profile):
+    disinsector_profiles.set(profile['id'], profile)
+    if profile['telegram_user_id']:
+        disinsector_ids_by_telegram.set(profile['telegram_user_id'], profile['id'])
+
+
+def get_disinsector_profiles(disinsector_ids):
+    """
+    Профили дезинсекторов {id: {'id', 'name', 'token', 'telegram_user_id'}}.
+    Отсутствующие в кэше загружаются одним запросом; несуществующих id в ответе нет.
+    """
+    profiles = {}
+    missing = []
+    for disinsector_id in set(disinsector_ids):
+        profile = disinsector_profiles.get(disinsector_id)
+        if profile is None:
+            missing.append(disinsector_id)
+        else:
+            profiles[disinsector_id] = dict(profile)
+    if missing:
+        for row in db.session.query(*PROFILE_COLUMNS).filter(Disinsector.id.in_(missing)):
+            profile = dict(row._mapping)
+            _remember_profile(profile)
+            profiles[profile['id']] = dict(profile)
+    return profiles
+
+
+def get_disinsector_profile(disinsector_id):
+    return get_disinsector_profiles([disinsector_id]).get(disinsector_id)
+
+
+def get_disinsector_id_by_telegram_user(telegram_user_id):
+    disinsector_id = disinsector_ids_by_telegram.get(telegram_user_id)
+    if disinsector_id is not None:
+        return disinsector_id
+    row = profile_by_telegram_query(telegram_user_id).first()
+    if row is None:
+        return None
+    _remember_profile(dict(row._mapping))
+    return row.id
+
+
+def invalidate_disinsector(disinsector_id=None, telegram_user_id=None):
+    """
+    Сбрасывает закэшированный профиль после изменения дезинсектора. Вызывать после коммита.
+    Сброс действует только в текущем процессе, в остальных запись устареет через ENTITY_CACHE_TTL.
+    """
+    if disinsector_id is not None:
+        profile = disinsector_profiles.peek(disinsector_id)
+        if profile is not None and profile['telegram_user_id']:
+            disinsector_ids_by_telegram.pop(profile['telegram_user_id'])
+        disinsector_profiles.pop(disinsector_id)
+    if telegram_user_id is not None:
+        disinsector_ids_by_telegram.pop(telegram_user_id)
+
+
+def get_client_id(phone):
+    """
+    id клиента по нормализованному телефону или None. Отсутствие клиента не кэшируется.
+    """
+    client_id = client_ids_by_phone.get(phone)
+    if client_id is not None:
+        return client_id
+    client_id = client_id_query(phone).scalar()
+    if client_id is not None:
+        client_ids_by_phone.set(phone, client_id)
+    return client_id
+
+
+def remember_client(phone, client_id):
+    """
+    Запоминает только что созданного клиента. Вызывать после коммита.
+    """
+    client_ids_by_phone.set(phone, client_id)
+
+
+def invalidate_client(phone):
+    client_ids_by_phone.pop(phone)
+
+
+def cache_stats():
+    return {cache.name: cache.stats() for cache in CACHES}
+
+
+def _cache_metric(field):
+    return lambda: {(cache.name,): cache.stats()[field] for cache in LRUTTLCache.instances}
+
+
+CallbackMetric('cache_entries', 'Записей в кэше процесса', ('cache',), _cache_metric('size'))
+CallbackMetric('cache_hits_total', 'Попадания в кэш', ('cache',), _cache_metric('hits'), kind='counter')
+CallbackMetric('cache_misses_total', 'Промахи кэша', ('cache',), _cache_metric('misses'), kind='counter')
+CallbackMetric('cache_evictions_total', 'Вытеснения из кэша по размеру', ('cache',), _cache_metric('evictions'),
+               kind='counter')
+
+
+async def cache_stats_loop(log=None, interval=None):
+    """
+    Периодически пишет статистику попаданий кэшей процесса в лог log (по умолчанию свой).
+    """
+    log = log or logger
+    interval = interval or Config.ENTITY_CACHE_STATS_INTERVAL
+    while True:
+        await asyncio.sleep(interval)
+        for name, stats in cache_stats().items():
+            log.info(
+                f"Кэш {name}: {stats['size']}/{stats['maxsize']} записей, попаданий {stats['hit_rate']:.1%} "
+                f"({stats['hits']}/{stats['hits'] + stats['misses']}), вытеснено {stats['evictions']}, "
+                f"устарело {stats['expirations']}"
+            )
@@ -0,0 +1,261 @@
+# app/fsm_storage.py
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+from config import Config
+
+logger = logging.getLogger('fsm_storage')
+
+
+class _Record:
+    __slots__ = ('state', 'data', 'touched')
+
+    def __init__(self, state=None, data=None):
+        self.state = state
+        self.data = data or {}
+        self.touched = time.monotonic()
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM для aiogram в локальном файле SQLite: диалоги переживают перезапуск бота.
+
+    Горячие диалоги держатся в памяти (LRU, простаивающие дольше idle_ttl вытесняются).
+    Изменения не пишутся на диск сразу: они копятся и сохраняются одной транзакцией раз
+    в flush_interval секунд или при накоплении flush_batch измененных диалогов, поэтому
+    серия update_data одного диалога превращается в одну запись. При остановке бота
+    (close) все накопленное сбрасывается; при аварийном завершении теряется не больше
+    flush_interval секунд изменений.
+
+    Ключ включает id бота, поэтому одно хранилище подходит для всех ботов дезинсекторов.
+    Кэш локален для процесса: диалоги одного бота должен обслуживать один процесс.
+    """
+
+    def __init__(self, path, flush_interval=1.0, flush_batch=500, max_cached=10000, idle_ttl=3600):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_cached = max_cached
+        self.idle_ttl = idle_ttl
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+        self._cache = OrderedDict()  # ключ -> _Record, от давно не использованных к недавним
+        self._pending = {}  # ключ -> _Record, еще не записанные на диск
+        self._connection = None
+        # Соединение sqlite3 используется только из этого потока
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fsm-storage')
+        self._flush_task = None
+        self._flush_wakeup = None
+        self._closed = False
+        self.stats = {'hits': 0, 'misses': 0, 'flushes': 0, 'rows_written': 0}
+
+    # --- работа с файлом базы (в потоке хранилища) ---
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=Config.SQLITE_BUSY_TIMEOUT / 1000)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS fsm_state ("
+                "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _load(self, key):
+        row = self._connect().execute("SELECT state, data FROM fsm_state WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _write(self, upserts, deletes):
+        connection = self._connect()
+        with connection:
+            if upserts:
+                connection.executemany(
+                    "INSERT INTO fsm_state (key, state, data, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, "
+                    "updated_at = excluded.updated_at",
+                    upserts,
+                )
+            if deletes:
+                connection.executemany("DELETE FROM fsm_state WHERE key = ?", deletes)
+
+    def _state_counts(self, pending_keys):
+        connection = self._connect()
+        counts = dict(connection.execute(
+            "SELECT state, count(*) FROM fsm_state WHERE state IS NOT NULL GROUP BY state"
+        ).fetchall())
+        # Записанные на диск состояния диалогов, измененных после записи, вычитаются
+        for start in range(0, len(pending_keys), 500):
+            chunk = pending_keys[start:start + 500]
+            rows = connection.execute(
+                f"SELECT state FROM fsm_state WHERE state IS NOT NULL AND key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for state, in rows:
+                counts[state] -= 1
+        return counts
+
+    def _disconnect(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # --- кэш и отложенная запись ---
+
+    async def _record(self, key):
+        key = self.key_builder.build(key)
+        record = self._cache.get(key)
+        if record is not None:
+            self.stats['hits'] += 1
+            self._cache.move_to_end(key)
+        else:
+            self.stats['misses'] += 1
+            record = self._pending.get(key)
+            if record is None:
+                loaded = await self._run(self._load, key)
+                # Пока шло чтение, ключ мог загрузить параллельный апдейт - берем его запись
+                record = self._cache.get(key) or self._pending.get(key) or _Record(*(loaded or ()))
+            self._cache[key] = record
+            self._evict()
+        record.touched = time.monotonic()
+        return key, record
+
+    def _evict(self):
+        # Вытесняются и измененные записи: они остаются в _pending до записи на диск
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+        deadline = time.monotonic() - self.idle_ttl
+        while self._cache:
+            key, record = next(iter(self._cache.items()))
+            if record.touched >= deadline:
+                break
+            del self._cache[key]
+
+    def _mark_dirty(self, key, record):
+        if self._closed:
+            raise RuntimeError("Хранилище FSM уже закрыто.")
+        self._pending[key] = record
+        if self._flush_task is None:
+            self._flush_wakeup = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        if len(self._pending) >= self.flush_batch:
+            self._flush_wakeup.set()
+
+    async def _flush_loop(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Не удалось сохранить состояния FSM: {e}")
+            self._evict()
+
+    async def flush(self):
+        """
+        Записывает все накопленные изменения одной транзакцией.
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        now = time.time()
+        upserts, deletes = [], []
+        for key, record in pending.items():
+            if record.state is None and not record.data:
+                deletes.append((key,))
+            else:
+                upserts.append((key, record.state, json.dumps(record.data, ensure_ascii=False), now))
+        try:
+            await self._run(self._write, upserts, deletes)
+        except Exception:
+            # Возвращаем несохраненное, более свежие изменения из _pending не затираем
+            for key, record in pending.items():
+                self._pending.setdefault(key, record)
+            raise
+        self.stats['flushes'] += 1
+        self.stats['rows_written'] += len(pending)
+
+    async def state_counts(self):
+        """
+        Число диалогов в каждом состоянии {state: count} с учетом еще не записанных изменений.
+        """
+        pending = dict(self._pending)
+        counts = await self._run(self._state_counts, list(pending))
+        for record in pending.values():
+            if record.state is not None:
+                counts[record.state] = counts.get(record.state, 0) + 1
+        return {state: count for state, count in counts.items() if count > 0}
+
+    # --- интерфейс BaseStorage ---
+
+    async def set_state(self, key, state=None):
+        key, record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(key, record)
+
+    async def get_state(self, key):
+        _, record = await self._record(key)
+        return record.state
+
+    async def set_data(self, key, data):
+        if not isinstance(data, dict):
+            raise TypeError(f"Данные FSM должны быть словарем, получено {type(data).__name__}")
+        key, record = await self._record(key)
+        record.data = data.copy()
+        self._mark_dirty(key, record)
+
+    async def get_data(self, key):
+        _, record = await self._record(key)
+        return record.data.copy()
+
+    async def update_data(self, key, data):
+        key, record = await self._record(key)
+        record.data.update(data)
+        self._mark_dirty(key, record)
+        return record.data.copy()
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_task is not None:
+            # Будим цикл записи и ждем, пока он сохранит накопленное и завершится
+            self._flush_wakeup.set()
+            await self._flush_task
+            self._flush_task = None
+        try:
+            await self.flush()
+        finally:
+            await self._run(self._disconnect)
+            self._executor.shutdown(wait=True)
+
+
+def create_fsm_storage(path=None):
+    """
+    Хранилище FSM для ботов по настройкам Config.
+    """
+    return SQLiteStorage(
+        path or Config.FSM_STORAGE_PATH,
+        flush_interval=Config.FSM_FLUSH_INTERVAL,
+        flush_batch=Config.FSM_FLUSH_BATCH,
+        max_cached=Config.FSM_CACHE_SIZE,
+        idle_ttl=Config.FSM_IDLE_TTL,
+    )
@@ -0,0 +1,167 @@
+# app/logging_setup.py
+
+import atexit
+import json
+import logging
+import os
+import queue
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+from config import Config
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Поля единицы работы (chat_id, disinsector_id, ...), которые попадают в каждую запись.
+# run_db копирует контекст в поток, поэтому записи из пула базы их тоже получают.
+log_context = ContextVar('log_context', default={})
+
+# Стандартные атрибуты LogRecord; все остальные (extra=..., поля контекста) выводятся в JSON
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+# Логгеры, которые пишут строку на каждый апдейт или HTTP-запрос: в файл - только предупреждения
+_NOISY_LOGGERS = ('aiogram.event', 'aiohttp.access')
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Одна запись - одна строка JSON: время UTC, уровень, логгер, сообщение, сервис
+    и дополнительные поля (order_id, chat_id, ...).
+    """
+    def __init__(self, service=None):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if self.service:
+            entry['service'] = self.service
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NoisyLoggersFilter(logging.Filter):
+    """
+    Пропускает из _NOISY_LOGGERS (и их потомков) только предупреждения и ошибки.
+    Ставится на файловый обработчик: в консоли эти записи остаются на уровне процесса.
+    """
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        return not any(record.name == name or record.name.startswith(name + '.') for name in _NOISY_LOGGERS)
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Кладет запись в очередь, не трогая диск: форматирование и запись делает поток QueueListener.
+    В вызывающем потоке только подставляются поля log_context и готовится текст сообщения.
+    """
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        for key, value in log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        # Аргументы подставляются здесь: объекты из них могут измениться, пока запись ждет в очереди
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _file_handler(path):
+    if Config.LOG_ROTATION == 'time':
+        return TimedRotatingFileHandler(
+            path, when=Config.LOG_ROTATE_WHEN, backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8', delay=True,
+        )
+    return RotatingFileHandler(
+        path, maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8', delay=True,
+    )
+
+
+def configure_logging(service, log_file=None, level=None):
+    """
+    Настраивает логирование процесса: корневой логгер пишет в очередь, а отдельный поток
+    сбрасывает записи в файл (JSON, с ротацией) и в консоль. Повторные вызовы ничего не
+    меняют: процесс настраивает тот, кто вызвал первым (бот раньше create_db_app).
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return False
+
+    handlers = []
+    path = log_file or os.path.join(Config.LOG_DIR, f'{service}.log')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    file_handler = _file_handler(path)
+    file_handler.setFormatter(JsonFormatter(service))
+    file_handler.addFilter(NoisyLoggersFilter())
+    handlers.append(file_handler)
+    if Config.LOG_CONSOLE:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(
+            JsonFormatter(service) if Config.LOG_CONSOLE_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+        )
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = ContextQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level or Config.LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return True
+
+
+def shutdown_logging():
+    """
+    Дописывает записи из очереди и закрывает файлы.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    listener, _listener, _queue_handler = _listener, None, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+async def log_context_middleware(handler, event, data):
+    """
+    Внешний middleware aiogram: chat_id, user_id и disinsector_id апдейта во всех записях его обработки.
+    """
+    fields = {}
+    chat = data.get('event_chat')
+    if chat is not None:
+        fields['chat_id'] = chat.id
+    user = data.get('event_from_user')
+    if user is not None:
+        fields['user_id'] = user.id
+    if data.get('disinsector_id') is not None:
+        fields['disinsector_id'] = data['disinsector_id']
+    token = log_context.set(fields)
+    try:
+        return await handler(event, data)
+    finally:
+        log_context.reset(token)
@@ -1,75 +1,224 @@
 # app/main.py
 
-from flask import Blueprint, render_template, redirect, url_for, session, flash, request, jsonify
+from datetime import datetime
+
+from flask import (
+    Blueprint, Response, render_template, redirect, url_for, session, flash, request, jsonify, current_app,
+    get_template_attribute, stream_with_context,
+)
 from app import csrf
-from app.model import Order, Client, Disinsector
+from app.dashboard_cache import conditional_page, orders_version, rows_fragment
+from app.entity_cache import get_disinsector_profile
+from app.model import Client, Disinsector
+from app.order_export import EXPORT_FORMATS, EXPORT_WRITERS, iter_export_rows
+from app.order_feed import initial_change_cursor, order_events
+from app.order_queries import (
+    ALL_STATUSES, SORT_NEWEST, SORT_OLDEST, disinsector_orders_query, fetch_orders_page, parse_date,
+)
+from app.order_stats import disinsector_report
+from app.order_status import ORDER_STATUSES, change_order_status
+from app.query_monitor import query_budget
 from database import db
 from sqlalchemy import func
-from sqlalchemy.orm import joinedload
-import requests
 import logging
 
 main_bp = Blueprint('main', __name__)
 logger = logging.getLogger('main')
-logger.setLevel(logging.INFO)
-
-file_handler = logging.FileHandler('main.log')
-stream_handler = logging.StreamHandler()
-
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-stream_handler.setFormatter(formatter)
-
-logger.addHandler(file_handler)
-logger.addHandler(stream_handler)
 
 @main_bp.route('/')
 def index():
     return render_template('index.html')
 
 @main_bp.route('/admin/dashboard', methods=['GET'])
+@query_budget(4)
 def admin_dashboard():
     if 'admin_id' in session:
-        status = request.args.get('status', 'Все')
-        try:
-            query = db.session.query(Order).options(
-                joinedload(Order.client),
-                joinedload(Order.disinsector)
+        status = request.args.get('status', ALL_STATUSES)
+        if status not in ORDER_STATUSES:
+            status = ALL_STATUSES
+        sort = request.args.get('sort', SORT_NEWEST)
+        if sort not in (SORT_NEWEST, SORT_OLDEST):
+            sort = SORT_NEWEST
+        cursor = request.args.get('after')
+        date_from = parse_date(request.args.get('date_from'))
+        date_to = parse_date(request.args.get('date_to'))
+        page_size = current_app.config['ADMIN_PAGE_SIZE']
+
+        def load():
+            # Только нужные колонки и одна страница по курсору вместо всех заявок целиком
+            orders, next_cursor = fetch_orders_page(
+                status=status,
+                sort=sort,
+                cursor=cursor,
+                page_size=page_size,
+                date_from=date_from,
+                date_to=date_to,
+            )
+            return orders, {'count': len(orders), 'next_cursor': next_cursor}
+
+        def render(cacheable):
+            orders_html, page = rows_fragment(
+                ('admin', status, sort, cursor, date_from, date_to, page_size, version),
+                load,
+                lambda orders, token: get_template_attribute('_admin_orders.html', 'order_rows')(
+                    orders, ORDER_STATUSES, token),
+                cacheable,
+            )
+            return render_template(
+                'admin_dashboard.html',
+                orders_html=orders_html,
+                page=page,
+                status=status,
+                sort=sort,
+                cursor=cursor,
+                statuses=ORDER_STATUSES,
+                date_from=date_from.isoformat() if date_from else None,
+                date_to=date_to.isoformat() if date_to else None,
+                events_cursor=initial_change_cursor(current_app.config['SSE_LAG']),
             )
-            if status != 'Все':
-                query = query.filter_by(order_status=status)
-            orders = query.all()
+
+        try:
+            # Пока заявки не менялись, браузер получает 304, а строки таблицы берутся из кэша
+            version = orders_version()
+            return conditional_page(('admin', session['admin_id']), version, render)
         except Exception as e:
             logger.error(f"Ошибка при получении заявок для админ-дэшборда: {e}")
             flash("Произошла ошибка при загрузке заявок.", 'danger')
             return redirect(url_for('main.index'))
-        return render_template('admin_dashboard.html', orders=orders)
+    else:
+        flash("Пожалуйста, войдите как администратор.", 'warning')
+        return redirect(url_for('auth.admin_login'))
+
+def order_events_response(disinsector_id=None):
+    """
+    SSE-поток изменений заявок. Курсор берется из Last-Event-ID (переподключение)
+    или из параметра cursor, который страница получила при рендере.
+    """
+    config = current_app.config
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    events = order_events(
+        cursor,
+        disinsector_id=disinsector_id,
+        poll_interval=config['SSE_POLL_INTERVAL'],
+        heartbeat=config['SSE_HEARTBEAT'],
+        max_duration=config['SSE_MAX_DURATION'],
+        batch_size=config['SSE_BATCH'],
+        lag=config['SSE_LAG'],
+    )
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@main_bp.route('/admin/orders/events', methods=['GET'])
+def admin_order_events():
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return order_events_response()
+
+@main_bp.route('/admin/orders/export', methods=['GET'])
+def export_orders():
+    if 'admin_id' not in session:
+        flash("Пожалуйста, войдите как администратор.", 'warning')
+        return redirect(url_for('auth.admin_login'))
+
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        flash("Неизвестный формат выгрузки.", 'danger')
+        return redirect(url_for('main.admin_dashboard'))
+    status = request.args.get('status', ALL_STATUSES)
+    if status not in ORDER_STATUSES:
+        status = ALL_STATUSES
+    rows = iter_export_rows(
+        status=status,
+        date_from=parse_date(request.args.get('date_from')),
+        date_to=parse_date(request.args.get('date_to')),
+        batch_size=current_app.config['EXPORT_BATCH_SIZE'],
+    )
+
+    def generate():
+        try:
+            yield from EXPORT_WRITERS[export_format](rows)
+        except Exception as e:
+            # Заголовки уже отправлены: остается только оборвать выгрузку и записать ошибку
+            logger.error(f"Ошибка при выгрузке заявок: {e}")
+            raise
+
+    filename = f"orders_{datetime.utcnow():%Y%m%d_%H%M%S}.{export_format}"
+    # Файл отдается по мере чтения курсора, целиком в памяти он не собирается
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+@main_bp.route('/admin/reports', methods=['GET'])
+@query_budget(3)
+def admin_reports():
+    if 'admin_id' in session:
+        try:
+            # Счетчики считает база (или берутся из сводной таблицы), заявки в память не загружаются
+            report = disinsector_report()
+        except Exception as e:
+            logger.error(f"Ошибка при построении отчета по дезинсекторам: {e}")
+            flash("Произошла ошибка при построении отчета.", 'danger')
+            return redirect(url_for('main.admin_dashboard'))
+        return render_template('admin_reports.html', report=report)
     else:
         flash("Пожалуйста, войдите как администратор.", 'warning')
         return redirect(url_for('auth.admin_login'))
 
 @main_bp.route('/disinsector/dashboard')
+@query_budget(4)
 def disinsector_dashboard():
     if 'disinsector_id' in session:
         disinsector_id = session['disinsector_id']
+
+        def load():
+            orders = disinsector_orders_query(disinsector_id).all()
+            return orders, {'count': len(orders)}
+
+        def render(cacheable):
+            orders_html, page = rows_fragment(
+                ('disinsector', disinsector_id, version),
+                load,
+                get_template_attribute('_disinsector_orders.html', 'order_rows'),
+                cacheable,
+            )
+            return render_template(
+                'disinsector_dashboard.html',
+                disinsector=disinsector,
+                orders_html=orders_html,
+                page=page,
+                events_cursor=initial_change_cursor(current_app.config['SSE_LAG']),
+            )
+
         try:
-            disinsector = Disinsector.query.get(disinsector_id)
+            disinsector = get_disinsector_profile(disinsector_id)
             if not disinsector:
                 flash("Дезинсектор не найден.", 'danger')
                 return redirect(url_for('auth.disinsector_login'))
-            orders = Order.query.filter_by(disinsector_id=disinsector_id).all()
+            version = orders_version(disinsector_id)
+            return conditional_page(('disinsector', disinsector_id, disinsector['name']), version, render)
         except Exception as e:
             logger.error(f"Ошибка при загрузке дезинсектор-дэшборда: {e}")
             flash("Произошла ошибка при загрузке заявок.", 'danger')
             return redirect(url_for('main.index'))
-        return render_template('disinsector_dashboard.html', disinsector=disinsector, orders=orders)
     else:
         flash("Пожалуйста, войдите как дезинсектор.", 'warning')
         return redirect(url_for('auth.disinsector_login'))
 
+@main_bp.route('/disinsector/orders/events', methods=['GET'])
+def disinsector_order_events():
+    if 'disinsector_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return order_events_response(disinsector_id=session['disinsector_id'])
+
 # Функция назначения заявки дезинсектору
 
 @main_bp.route('/update_order_status', methods=['POST'])
+@query_budget(6)
 def update_order_status():
     if 'disinsector_id' in session:
         order_id = request.form.get('order_id')
@@ -85,15 +234,16 @@ def update_order_status():
                 flash("Дезинсектор не найден.", 'danger')
                 return redirect(url_for('auth.disinsector_login'))
 
-            order = Order.query.filter_by(id=order_id, disinsector_id=disinsector.id).first()
-            if order:
-                order.order_status = new_status
-                db.session.commit()
+            # Смена статуса вместе с пересчетом загрузки дезинсектора
+            if change_order_status(order_id, new_status, disinsector_id=disinsector.id):
                 flash("Статус заявки обновлен.", 'success')
             else:
                 flash("Заявка не найдена или у вас нет прав на её изменение.", 'danger')
+        except ValueError:
+            flash("Неверные данные.", 'danger')
         except Exception as e:
-            logger.error(f"Ошибка при обновлении статуса заявки {order_id}: {e}")
+            db.session.rollback()
+            logger.error(f"Ошибка при обновлении статуса заявки {order_id}: {e}", extra={'order_id': order_id})
             flash("Произошла ошибка при обновлении статуса заявки.", 'danger')
 
         return redirect(url_for('main.disinsector_dashboard'))
@@ -0,0 +1,323 @@
+# app/metrics.py
+
+import bisect
+import collections
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+
+from app import query_monitor
+
+# Границы корзин гистограмм задержек (секунды) и числа запросов к базе
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """
+    Метрики процесса в текстовом формате Prometheus. Каждый процесс (веб-воркер, бот)
+    отдает свои значения, Prometheus различает их по instance.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, pairs, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(pairs)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: нужны метки {self.labelnames}, переданы {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _pairs(self, key):
+        return list(zip(self.labelnames, key))
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [('', self._pairs(key), value) for key, value in items]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def replace(self, values):
+        """
+        Заменяет все значения сразу: {кортеж значений меток: значение}. Для снимков
+        вроде числа диалогов в каждом состоянии, где пропавшие метки должны исчезнуть.
+        """
+        with self._lock:
+            self._values = {tuple(str(item) for item in key): value for key, value in values.items()}
+
+
+class CallbackMetric(Metric):
+    """
+    Значения читаются функцией collect() в момент выдачи метрик: {кортеж меток: значение}.
+    """
+    def __init__(self, name, documentation, labelnames, collect, kind='gauge', registry=REGISTRY):
+        self.kind = kind
+        self.collect = collect
+        super().__init__(name, documentation, labelnames, registry)
+
+    def samples(self):
+        return [('', self._pairs(tuple(str(item) for item in key)), value) for key, value in self.collect().items()]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Счетчики по корзинам (не накопительные), сумма и число наблюдений
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        samples = []
+        for key, (counts, total, count) in items:
+            pairs = self._pairs(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', pairs + [('le', _format_value(float(bound)))], cumulative))
+            samples.append(('_sum', pairs, total))
+            samples.append(('_count', pairs, count))
+        return samples
+
+
+# --- серии приложения ---
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса Flask до отправки заголовков',
+    ('route', 'method', 'status'),
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL-запросов на один HTTP-запрос', ('route',), QUERY_COUNT_BUCKETS,
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds', 'Время в базе на один HTTP-запрос', ('route',),
+)
+BOT_HANDLER_SECONDS = Histogram(
+    'bot_handler_duration_seconds', 'Время работы обработчика aiogram', ('bot', 'handler', 'outcome'),
+)
+BOT_UPDATE_DB_QUERIES = Histogram(
+    'bot_update_db_queries', 'SQL-запросов на один апдейт', ('bot', 'handler'), QUERY_COUNT_BUCKETS,
+)
+BOT_UPDATE_DB_SECONDS = Histogram(
+    'bot_update_db_seconds', 'Время в базе на один апдейт', ('bot', 'handler'),
+)
+DB_QUERY_SECONDS = Histogram(
+    'db_query_duration_seconds', 'Время выполнения SQL-запросов процесса',
+)
+TELEGRAM_REQUEST_SECONDS = Histogram(
+    'telegram_api_request_duration_seconds', 'Время запроса к Telegram Bot API', ('method',),
+    LATENCY_BUCKETS + (30.0, 60.0),
+)
+TELEGRAM_ERRORS = Counter(
+    'telegram_api_errors_total', 'Ошибки Telegram Bot API по коду ответа (network - сетевые)', ('method', 'error'),
+)
+ORDER_ASSIGNMENTS = Counter(
+    'order_assignments_total', 'Исходы назначения заявок', ('source', 'outcome'),
+)
+BOT_WEBHOOK_UPDATES = Counter(
+    'bot_webhook_updates_total', 'Апдейты webhook по исходу (accepted, rejected, failed, dropped)', ('bot', 'outcome'),
+)
+BOT_UPDATE_QUEUE_SECONDS = Histogram(
+    'bot_update_queue_wait_seconds', 'Сколько апдейт ждал в очереди до начала обработки', ('bot',),
+)
+FSM_DIALOGS = Gauge(
+    'fsm_dialogs', 'Диалогов FSM в каждом состоянии', ('state',),
+)
+
+
+class UnitStats:
+    """
+    Единица работы (HTTP-запрос или апдейт бота): число и время SQL-запросов, их формы
+    для поиска N+1 и бюджет запросов (app.query_monitor).
+    """
+    __slots__ = ('name', 'budget', 'queries', 'seconds', 'shapes')
+
+    def __init__(self, name=None, budget=None):
+        self.name = name
+        self.budget = budget
+        self.queries = 0
+        self.seconds = 0.0
+        self.shapes = collections.Counter()
+
+
+# Текущая единица работы; run_db копирует контекст в поток, поэтому запросы из пула учитываются
+current_unit = ContextVar('metrics_unit', default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['metrics_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('metrics_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    DB_QUERY_SECONDS.observe(elapsed)
+    unit = current_unit.get()
+    if unit is not None:
+        unit.queries += 1
+        unit.seconds += elapsed
+    query_monitor.observe_query(unit, statement, parameters, executemany, elapsed)
+
+
+def install_db_metrics(engine):
+    """
+    Подключает учет SQL-запросов к движку (повторный вызов ничего не меняет).
+    """
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+@contextmanager
+def unit_of_work(name, budget=None):
+    """
+    Учет запросов блока кода: все запросы внутри (и в run_db) попадают в одну единицу работы,
+    на выходе она проверяется на бюджет и N+1 (в строгом режиме - QueryBudgetExceeded).
+    """
+    unit = UnitStats(name, budget)
+    token = current_unit.set(unit)
+    try:
+        yield unit
+    finally:
+        current_unit.reset(token)
+    query_monitor.check_unit(unit)
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_unit = UnitStats(request.endpoint or 'unmatched', query_monitor.request_budget())
+    g.metrics_token = current_unit.set(g.metrics_unit)
+
+
+def _finish_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        # Правило маршрута, а не путь: id в URL не должны плодить серии
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, route=route, method=request.method, status=response.status_code,
+        )
+        unit = g.metrics_unit
+        HTTP_REQUEST_DB_QUERIES.observe(unit.queries, route=route)
+        HTTP_REQUEST_DB_SECONDS.observe(unit.seconds, route=route)
+        query_monitor.check_unit(unit)
+    return response
+
+
+def _reset_request(exc):
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        current_unit.reset(token)
+
+
+def metrics_view():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def init_app(app, engine):
+    """
+    Гистограммы задержек и SQL-запросов по маршрутам и страница /metrics. Те же хуки ведут
+    единицу работы для app.query_monitor, поэтому ставятся, если включено хотя бы одно из двух.
+    """
+    metrics_enabled = app.config.get('METRICS_ENABLED', True)
+    if not metrics_enabled and not query_monitor.enabled():
+        return
+    install_db_metrics(engine)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_reset_request)
+    if metrics_enabled:
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
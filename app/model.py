@@ -1,8 +1,22 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Index, and_
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import db
 
+# Статусы заявки
+STATUS_NEW = 'Новая'
+STATUS_IN_PROGRESS = 'В процессе'
+STATUS_DONE = 'Выполнено'
+ORDER_STATUSES = (STATUS_NEW, STATUS_IN_PROGRESS, STATUS_DONE)
+
+# Статусы фоновых задач по заявкам и исходящих сообщений
+JOB_ASSIGN = 'assign'
+JOB_DISPATCH_BACKLOG = 'dispatch_backlog'  # освободилась емкость: пакетно назначить очередь
+JOB_PENDING = 'pending'
+JOB_PROCESSING = 'processing'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
 class Admin(db.Model):
     __tablename__ = 'admins'
     id = Column(Integer, primary_key=True, index=True)
@@ -26,6 +40,13 @@ class Disinsector(db.Model):
 
     orders = relationship('Order', back_populates='disinsector')
 
+    __table_args__ = (
+        # Поиск свободного дезинсектора при назначении заявки: load < max_load сравнивает две
+        # колонки и не сужает поиск, поэтому индекс идет в порядке last_assigned до первого
+        # дезинсектора со свободным местом, проверяя емкость по самому индексу
+        Index('ix_disinsectors_capacity', 'last_assigned', 'load', 'max_load'),
+    )
+
     def __repr__(self):
         return f'<Disinsector {self.name}>'
 class Client(db.Model):
@@ -37,6 +58,11 @@ class Client(db.Model):
 
     orders = relationship("Order", back_populates="client")
 
+    __table_args__ = (
+        # Поиск клиента по телефону при каждом приеме заявки
+        Index('ix_clients_phone', 'phone'),
+    )
+
     def __repr__(self):
         return f'<Client {self.name}>'
 
@@ -45,7 +71,7 @@ class Order(db.Model):
     id = Column(Integer, primary_key=True, index=True)
     disinsector_id = Column(Integer, ForeignKey('disinsectors.id'), nullable=True)
     client_id = Column(Integer, ForeignKey('clients.id'), nullable=False)
-    order_status = Column(String(50), default='Новая')
+    order_status = Column(String(50), default=STATUS_NEW)
     object_type = Column(String(50), nullable=False)
     insect_quantity = Column(String(50), nullable=False)
     disinsect_experience = Column(Boolean, nullable=False)
@@ -54,10 +80,96 @@ class Order(db.Model):
     poison_type = Column(String(100), nullable=True)
     insect_type = Column(String(100), nullable=True)
     client_area = Column(String(100), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Маркер изменения для потока обновлений дашбордов
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     disinsector = relationship("Disinsector", back_populates="orders")
     client = relationship("Client", back_populates="orders")
 
+    __table_args__ = (
+        # Keyset-пагинация админ-панели: все заявки и с фильтром по статусу
+        Index('ix_orders_created_at_id', 'created_at', 'id'),
+        Index('ix_orders_status_created_at_id', 'order_status', 'created_at', 'id'),
+        # Заявки дезинсектора (с фильтром по статусу) и очередь неназначенных заявок
+        Index('ix_orders_disinsector_status', 'disinsector_id', 'order_status'),
+        # Поток изменений дашбордов: все заявки и заявки дезинсектора после курсора
+        Index('ix_orders_updated_at_id', 'updated_at', 'id'),
+        Index('ix_orders_disinsector_updated_at_id', 'disinsector_id', 'updated_at', 'id'),
+    )
+
     def __repr__(self):
         return f'<Order {self.id}>'
+
+class DisinsectorOrderStats(db.Model):
+    """
+    Сводка для отчетов: число заявок дезинсектора в каждом статусе.
+    Обновляется инкрементально при назначении и смене статуса заявки.
+    """
+    __tablename__ = 'disinsector_order_stats'
+    disinsector_id = Column(Integer, ForeignKey('disinsectors.id'), primary_key=True)
+    order_status = Column(String(50), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DisinsectorOrderStats {self.disinsector_id} {self.order_status}: {self.order_count}>'
+
+class OrderJob(db.Model):
+    """
+    Очередь фоновой обработки заявок (назначение и уведомление дезинсектора,
+    пакетное назначение после освобождения емкости). Задача пишется в той же транзакции,
+    что и заявка, поэтому не теряется при сбое.
+    """
+    __tablename__ = 'order_jobs'
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey('orders.id'), nullable=False)
+    kind = Column(String(30), nullable=False, default=JOB_ASSIGN)
+    status = Column(String(20), nullable=False, default=JOB_PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # не раньше этого времени
+    locked_until = Column(DateTime, nullable=True)  # аренда задачи обработчиком
+    last_error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Выборка готовых к обработке задач
+        Index('ix_order_jobs_status_available_at', 'status', 'available_at'),
+        Index('ix_order_jobs_order_id', 'order_id'),
+        # Не больше одной ожидающей задачи пакетного назначения: освобождение емкости при уже
+        # стоящей в очереди задаче ничего не добавляет (enqueue_backlog_dispatch)
+        Index(
+            'ix_order_jobs_pending_dispatch', 'kind', unique=True,
+            sqlite_where=and_(kind == JOB_DISPATCH_BACKLOG, status == JOB_PENDING),
+            postgresql_where=and_(kind == JOB_DISPATCH_BACKLOG, status == JOB_PENDING),
+        ),
+    )
+
+    def __repr__(self):
+        return f'<OrderJob {self.id} {self.kind} {self.status}>'
+
+class OutboxMessage(db.Model):
+    """
+    Исходящее уведомление дезинсектору. Пишется в той же транзакции, что и назначение,
+    отправляется отдельным relay. idempotency_key не дает поставить одно уведомление дважды.
+    """
+    __tablename__ = 'outbox_messages'
+    id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String(200), unique=True, nullable=False)
+    disinsector_id = Column(Integer, ForeignKey('disinsectors.id'), nullable=False)
+    text = Column(Text, nullable=False)
+    keyboard = Column(String(50), nullable=True)  # имя клавиатуры из keyboards.py
+    status = Column(String(20), nullable=False, default=JOB_PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_outbox_messages_status_available_at', 'status', 'available_at'),
+    )
+
+    def __repr__(self):
+        return f'<OutboxMessage {self.idempotency_key} {self.status}>'
@@ -0,0 +1,175 @@
+# app/order_export.py
+
+import csv
+import io
+import zipfile
+from xml.sax.saxutils import escape
+
+from app.model import Client, Disinsector, Order
+from app.order_queries import ALL_STATUSES, order_list_query
+
+EXPORT_CSV = 'csv'
+EXPORT_XLSX = 'xlsx'
+EXPORT_FORMATS = {
+    EXPORT_CSV: 'text/csv; charset=utf-8',
+    EXPORT_XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Колонки выгрузки: (заголовок, выражение)
+EXPORT_COLUMNS = (
+    ('Номер заявки', Order.id),
+    ('Создана', Order.created_at),
+    ('Статус', Order.order_status),
+    ('Тип объекта', Order.object_type),
+    ('Количество насекомых', Order.insect_quantity),
+    ('Опыт дезинсекции', Order.disinsect_experience),
+    ('Имя клиента', Client.name),
+    ('Телефон клиента', Client.phone),
+    ('Адрес клиента', Client.address),
+    ('Дезинсектор', Disinsector.name),
+    ('Email дезинсектора', Disinsector.email),
+)
+EXPORT_HEADERS = [title for title, _ in EXPORT_COLUMNS]
+
+
+def iter_export_rows(status=ALL_STATUSES, date_from=None, date_to=None, batch_size=1000):
+    """
+    Строки выгрузки заявок по фильтрам админ-панели в порядке создания.
+
+    Результат читается с курсора пачками по batch_size (yield_per и stream_results),
+    поэтому память не зависит от числа заявок.
+    """
+    query = (
+        order_list_query(status, columns=[column for _, column in EXPORT_COLUMNS],
+                         date_from=date_from, date_to=date_to)
+        .order_by(Order.created_at, Order.id)
+        .yield_per(batch_size)
+    )
+    for row in query:
+        yield tuple(row)
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'да' if value else 'нет'
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def csv_chunks(rows, flush_every=500):
+    """
+    CSV кусками по flush_every строк. BOM в начале нужен, чтобы Excel открыл файл в UTF-8.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_HEADERS)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([_cell_text(value) for value in row])
+        if count % flush_every == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkWriter(io.RawIOBase):
+    """
+    Несдвигаемый поток для zipfile: накапливает записанные байты до очередной выдачи.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Заявки" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        value = _cell_text(value)
+        if isinstance(value, (int, float)):
+            cells.append(f'<c t="n"><v>{value}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+
+def xlsx_chunks(rows, flush_every=500):
+    """
+    XLSX потоком без сторонних библиотек: лист пишется строками прямо в zip-архив,
+    готовые сжатые байты отдаются каждые flush_every строк. Строки хранятся
+    inline-строками, поэтому таблица общих строк в памяти не копится.
+    """
+    output = _ChunkWriter()
+    with zipfile.ZipFile(output, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(EXPORT_HEADERS).encode('utf-8'))
+            for count, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row).encode('utf-8'))
+                if count % flush_every == 0:
+                    yield output.take()
+            sheet.write(b'</sheetData></worksheet>')
+    yield output.take()
+
+
+EXPORT_WRITERS = {
+    EXPORT_CSV: csv_chunks,
+    EXPORT_XLSX: xlsx_chunks,
+}
@@ -0,0 +1,153 @@
+# app/order_feed.py
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, tuple_
+
+from app.model import Client, Disinsector, Order
+from app.order_queries import decode_cursor
+from database import db
+
+EPOCH = datetime(1970, 1, 1)
+
+# Колонки, которые отправляются в потоке изменений дашбордов
+FEED_COLUMNS = (
+    Order.id,
+    Order.created_at,
+    Order.updated_at,
+    Order.order_status,
+    Order.disinsector_id,
+    Client.name.label('client_name'),
+    Client.phone.label('client_phone'),
+    Client.address.label('client_address'),
+    Disinsector.name.label('disinsector_name'),
+)
+
+
+def encode_change_cursor(updated_at, order_id):
+    return f"{updated_at.isoformat()}_{order_id}"
+
+
+def initial_change_cursor(lag=1.0):
+    """
+    Курсор, с которого страница начинает слушать изменения. Берется с отставанием lag:
+    изменения последних секунд придут еще раз, но не потеряются.
+    """
+    return encode_change_cursor(datetime.utcnow() - timedelta(seconds=lag), 0)
+
+
+def latest_change_query():
+    return db.session.query(func.max(Order.updated_at))
+
+
+class ChangeMarker:
+    """
+    Время последнего изменения заявок, общее для всех потоков SSE процесса.
+
+    max(updated_at) читается по индексу не чаще раза в max_age секунд, сколько бы
+    дашбордов ни было открыто; пока изменений нет, другие запросы не выполняются.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._latest = None
+
+    def latest(self, max_age):
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= max_age:
+                self._latest = latest_change_query().scalar()
+                self._checked_at = now
+            return self._latest
+
+
+change_marker = ChangeMarker()
+
+
+def changes_query(position, horizon, disinsector_id=None):
+    """
+    Заявки с (updated_at, id) после position и не новее horizon, в порядке изменения.
+    """
+    query = (
+        db.session.query(*FEED_COLUMNS)
+        .select_from(Order)
+        .join(Client, Order.client_id == Client.id)
+        .outerjoin(Disinsector, Order.disinsector_id == Disinsector.id)
+        .filter(tuple_(Order.updated_at, Order.id) > tuple_(*position), Order.updated_at <= horizon)
+    )
+    if disinsector_id is not None:
+        query = query.filter(Order.disinsector_id == disinsector_id)
+    return query.order_by(Order.updated_at, Order.id)
+
+
+def fetch_changes(cursor, disinsector_id=None, limit=200, lag=1.0):
+    """
+    Заявки, измененные после курсора (updated_at, id), в порядке изменения.
+
+    Берутся только изменения старше lag секунд: updated_at ставится до коммита, и
+    транзакция, закоммиченная позже более новой, иначе осталась бы за курсором.
+    Если прочитано все до этой границы, курсор сдвигается к ней, чтобы следующие
+    опросы не перечитывали чужие изменения. Возвращает (rows, next_cursor).
+    """
+    position = decode_cursor(cursor) or (EPOCH, 0)
+    horizon = datetime.utcnow() - timedelta(seconds=lag)
+    rows = changes_query(position, horizon, disinsector_id).limit(limit).all()
+    if len(rows) == limit:
+        return rows, encode_change_cursor(rows[-1].updated_at, rows[-1].id)
+    next_position = max([position, (horizon, 0)] + [(row.updated_at, row.id) for row in rows[-1:]])
+    return rows, encode_change_cursor(*next_position)
+
+
+def _row_payload(row):
+    payload = dict(row._mapping)
+    for key in ('created_at', 'updated_at'):
+        payload[key] = payload[key].isoformat()
+    return payload
+
+
+def format_event(event, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def order_events(cursor, disinsector_id=None, poll_interval=1.0, heartbeat=15, max_duration=300,
+                 batch_size=200, lag=1.0):
+    """
+    Поток Server-Sent Events с новыми и измененными заявками после курсора.
+
+    Событие orders содержит список измененных заявок, его id - новый курсор: браузер
+    присылает его в Last-Event-ID при переподключении. Запрос изменений выполняется,
+    только если общий маркер изменений новее курсора, поэтому нагрузка на базу зависит
+    от частоты изменений, а не от числа открытых страниц. Через max_duration секунд
+    поток закрывается, браузер переподключается с последним курсором через poll_interval.
+    При max_duration=0 поток - короткий опрос: одна проверка изменений на запрос.
+    """
+    yield f"retry: {int(poll_interval * 1000)}\n\n"
+    started = last_sent = time.monotonic()
+    while True:
+        position = decode_cursor(cursor) or (EPOCH, 0)
+        latest = change_marker.latest(poll_interval)
+        rows = []
+        if latest is not None and latest > position[0]:
+            rows, cursor = fetch_changes(cursor, disinsector_id, batch_size, lag)
+        # Закрываем транзакцию чтения, чтобы не удерживать снимок базы между опросами
+        db.session.rollback()
+
+        if rows:
+            yield format_event('orders', [_row_payload(row) for row in rows], cursor)
+            last_sent = time.monotonic()
+            if len(rows) == batch_size:
+                continue
+        elif time.monotonic() - last_sent >= heartbeat:
+            yield ": ping\n\n"
+            last_sent = time.monotonic()
+        if time.monotonic() - started >= max_duration:
+            return
+        time.sleep(poll_interval)
@@ -0,0 +1,161 @@
+# app/order_import.py
+
+import csv
+import io
+import json
+import logging
+import re
+from itertools import islice
+
+from sqlalchemy import insert, select
+
+from app.model import Client, Order, STATUS_NEW
+from database import db
+
+logger = logging.getLogger('order_import')
+
+REQUIRED_ORDER_FIELDS = ('client_name', 'phone_number', 'address', 'object_type', 'insect_quantity')
+TRUE_VALUES = {'1', 'true', 'yes', 'да', 'y'}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def iter_ndjson(stream):
+    """
+    Читает NDJSON построчно из бинарного потока, не загружая тело целиком.
+    Возвращает пары (номер строки, словарь или None при ошибке разбора).
+    """
+    for line_number, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8'), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def iter_csv(stream):
+    """
+    Читает CSV с заголовком из бинарного потока построчно.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def parse_order_row(row):
+    """
+    Проверяет строку импорта. Возвращает (поля, None) или (None, текст ошибки).
+    """
+    if row is None:
+        return None, 'invalid json object'
+    missing = [field for field in REQUIRED_ORDER_FIELDS if not str(row.get(field) or '').strip()]
+    if missing:
+        return None, f'Missing fields: {", ".join(missing)}'
+    # Телефон храним так же, как клиентский бот: только цифры
+    phone = re.sub(r'\D', '', str(row['phone_number']))
+    if not re.fullmatch(r'\d{10,15}', phone):
+        return None, 'invalid phone_number'
+    experience = row.get('disinsect_experience', False)
+    if isinstance(experience, str):
+        experience = experience.strip().lower() in TRUE_VALUES
+    return {
+        'client_name': str(row['client_name']).strip(),
+        'phone': phone,
+        'address': str(row['address']).strip(),
+        'object_type': str(row['object_type']).strip(),
+        'insect_quantity': str(row['insect_quantity']).strip(),
+        'disinsect_experience': bool(experience),
+    }, None
+
+
+def _client_ids(rows):
+    """
+    id клиентов по телефонам пачки: существующие находит одним запросом,
+    недостающих создает одним многострочным INSERT.
+    """
+    phones = {row['phone'] for row in rows}
+    client_ids = dict(db.session.execute(select(Client.phone, Client.id).where(Client.phone.in_(phones))).all())
+
+    new_clients = {}
+    for row in rows:
+        if row['phone'] not in client_ids and row['phone'] not in new_clients:
+            new_clients[row['phone']] = {'name': row['client_name'], 'phone': row['phone'], 'address': row['address']}
+    if new_clients:
+        created = db.session.execute(
+            insert(Client).returning(Client.phone, Client.id),
+            list(new_clients.values()),
+        )
+        client_ids.update(created.all())
+    return client_ids
+
+
+def _import_chunk(rows):
+    client_ids = _client_ids(rows)
+    db.session.execute(
+        insert(Order),
+        [
+            {
+                'client_id': client_ids[row['phone']],
+                'object_type': row['object_type'],
+                'insect_quantity': row['insect_quantity'],
+                'disinsect_experience': row['disinsect_experience'],
+                'order_status': STATUS_NEW,
+            }
+            for row in rows
+        ],
+    )
+    return len(rows)
+
+
+def import_orders(rows, chunk_size=1000, max_rows=None, max_errors=1000):
+    """
+    Массовый импорт заявок в одной транзакции.
+
+    rows - итерируемое из (номер строки, словарь); читается лениво, пачками по chunk_size.
+    Для каждой пачки клиенты ищутся и создаются по телефону set-запросами, заявки
+    вставляются одним многострочным INSERT. Строки с ошибками пропускаются; при ошибке
+    базы откатывается весь импорт. Новые заявки остаются неназначенными - их распределяет
+    пакетное назначение очереди.
+
+    Результат по каждой строке не накапливается, чтобы память не росла с размером импорта:
+    возвращается {'imported', 'failed', 'errors'}, где errors - первые max_errors ошибок
+    {'row', 'error'} в порядке строк.
+    """
+    imported = 0
+    errors = []
+    failed = 0
+    total = 0
+    rows = iter(rows)
+    try:
+        while True:
+            batch = list(islice(rows, chunk_size))
+            if not batch:
+                break
+            total += len(batch)
+            if max_rows and total > max_rows:
+                raise ImportFormatError(f'Too many rows: limit is {max_rows}')
+
+            chunk = []
+            for line, row in batch:
+                fields, error = parse_order_row(row)
+                if error:
+                    failed += 1
+                    if len(errors) < max_errors:
+                        errors.append({'row': line, 'error': error})
+                else:
+                    chunk.append(fields)
+            if chunk:
+                imported += _import_chunk(chunk)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Импортировано заявок: {imported}, строк с ошибками: {failed}")
+    return {'imported': imported, 'failed': failed, 'errors': errors}
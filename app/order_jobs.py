@@ -0,0 +1,200 @@
+# app/order_jobs.py
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, or_, select, update
+
+from app.model import (
+    Disinsector, Order, OrderJob,
+    JOB_ASSIGN, JOB_DISPATCH_BACKLOG, JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_PROCESSING,
+)
+from database import db, dialect_insert
+
+logger = logging.getLogger('order_jobs')
+
+# Состояние назначения заявки для API
+ASSIGNMENT_ASSIGNED = 'assigned'
+ASSIGNMENT_QUEUED = 'queued'
+ASSIGNMENT_PROCESSING = 'processing'
+ASSIGNMENT_WAITING = 'waiting'  # свободных дезинсекторов не было, заявка ждет пакетного назначения
+ASSIGNMENT_FAILED = 'failed'
+
+
+def enqueue_order_job(order_id, kind=JOB_ASSIGN):
+    """
+    Добавляет задачу в текущую транзакцию. Коммитит вызывающий код вместе с заявкой.
+    """
+    job = OrderJob(order_id=order_id, kind=kind, status=JOB_PENDING, available_at=datetime.utcnow())
+    db.session.add(job)
+    return job
+
+
+def _pending_dispatch():
+    return and_(OrderJob.kind == JOB_DISPATCH_BACKLOG, OrderJob.status == JOB_PENDING)
+
+
+def enqueue_backlog_dispatch(order_id):
+    """
+    Ставит задачу пакетного назначения в текущую транзакцию, если такая задача еще не ждет
+    в очереди (частичный уникальный индекс ix_order_jobs_pending_dispatch): один проход
+    dispatch_backlog разберет емкость, освобожденную всеми изменениями до него.
+    """
+    statement = dialect_insert(OrderJob).on_conflict_do_nothing(
+        index_elements=[OrderJob.kind], index_where=_pending_dispatch(),
+    )
+    now = datetime.utcnow()
+    db.session.execute(statement, {
+        'order_id': order_id,
+        'kind': JOB_DISPATCH_BACKLOG,
+        'status': JOB_PENDING,
+        'attempts': 0,
+        'available_at': now,
+        'created_at': now,
+    })
+
+
+def claim_order_jobs_statement(now, limit=20, lease_seconds=60):
+    """
+    Условный UPDATE ... RETURNING, берущий в аренду до limit готовых задач.
+    """
+    ready = (
+        select(OrderJob.id)
+        .where(or_(
+            and_(OrderJob.status == JOB_PENDING, OrderJob.available_at <= now),
+            and_(OrderJob.status == JOB_PROCESSING, OrderJob.locked_until < now),
+        ))
+        .order_by(OrderJob.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(OrderJob)
+        .where(OrderJob.id.in_(ready.scalar_subquery()))
+        .values(
+            status=JOB_PROCESSING,
+            locked_until=now + timedelta(seconds=lease_seconds),
+            attempts=OrderJob.attempts + 1,
+        )
+        .returning(OrderJob.id, OrderJob.order_id, OrderJob.kind, OrderJob.attempts)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def claim_order_jobs(limit=20, lease_seconds=60):
+    """
+    Забирает до limit готовых задач одним условным UPDATE и коммитит.
+
+    Задача берется в аренду на lease_seconds: если обработчик упал, не завершив ее,
+    после истечения аренды задачу заберет другой. Возвращает список словарей
+    {'id', 'order_id', 'kind', 'attempts'}.
+    """
+    rows = db.session.execute(claim_order_jobs_statement(datetime.utcnow(), limit, lease_seconds)).all()
+    db.session.commit()
+    return [dict(row._mapping) for row in sorted(rows, key=lambda row: row.id)]
+
+
+def finish_order_job(job_id, error=None, max_attempts=5):
+    """
+    Завершает задачу. При ошибке задача возвращается в очередь с растущей задержкой,
+    после max_attempts попыток помечается как failed.
+    """
+    job = db.session.get(OrderJob, job_id)
+    if job is None:
+        return
+    now = datetime.utcnow()
+    job.locked_until = None
+    if error is None:
+        job.status = JOB_DONE
+        job.finished_at = now
+        job.last_error = None
+    elif job.attempts >= max_attempts:
+        job.status = JOB_FAILED
+        job.finished_at = now
+        job.last_error = str(error)[:500]
+        logger.error(
+            f"Задача {job_id} по заявке {job.order_id} отклонена после {job.attempts} попыток: {error}",
+            extra={'order_id': job.order_id},
+        )
+    elif job.kind == JOB_DISPATCH_BACKLOG and db.session.query(OrderJob.id).filter(_pending_dispatch()).first():
+        # Повтор не нужен: в очереди уже ждет другая задача пакетного назначения
+        job.status = JOB_DONE
+        job.finished_at = now
+        job.last_error = str(error)[:500]
+    else:
+        job.status = JOB_PENDING
+        job.available_at = now + timedelta(seconds=min(2 ** job.attempts, 300))
+        job.last_error = str(error)[:500]
+        logger.warning(
+            f"Задача {job_id} по заявке {job.order_id} будет повторена: {error}", extra={'order_id': job.order_id},
+        )
+    db.session.commit()
+
+
+def prune_order_jobs(older_than_days, batch=1000):
+    """
+    Удаляет выполненные задачи, завершенные раньше older_than_days дней назад. Удаление идет
+    пачками по batch в отдельных транзакциях, чтобы не держать блокировку записи SQLite.
+    Задачи failed не удаляются: их разбирают вручную. Возвращает число удаленных задач.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    expired = (
+        select(OrderJob.id)
+        .where(OrderJob.status == JOB_DONE, OrderJob.finished_at < cutoff)
+        .limit(batch)
+        .scalar_subquery()
+    )
+    deleted = 0
+    while True:
+        count = db.session.execute(
+            delete(OrderJob).where(OrderJob.id.in_(expired)).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        deleted += count
+        if count < batch:
+            return deleted
+
+
+def assignment_job_query(order_id):
+    """
+    Последняя задача назначения заявки.
+    """
+    return (
+        db.session.query(OrderJob.status, OrderJob.attempts, OrderJob.last_error)
+        .filter(OrderJob.order_id == order_id, OrderJob.kind == JOB_ASSIGN)
+        .order_by(OrderJob.id.desc())
+    )
+
+
+def order_assignment_status(order_id):
+    """
+    Состояние заявки для опроса через API. None, если заявки нет.
+    """
+    order = (
+        db.session.query(Order.id, Order.order_status, Order.disinsector_id, Disinsector.name)
+        .outerjoin(Disinsector, Order.disinsector_id == Disinsector.id)
+        .filter(Order.id == order_id)
+        .first()
+    )
+    if order is None:
+        return None
+
+    job = assignment_job_query(order_id).first()
+    if order.disinsector_id:
+        assignment = ASSIGNMENT_ASSIGNED
+    elif job is not None and job.status == JOB_PENDING:
+        assignment = ASSIGNMENT_QUEUED
+    elif job is not None and job.status == JOB_PROCESSING:
+        assignment = ASSIGNMENT_PROCESSING
+    elif job is not None and job.status == JOB_FAILED:
+        assignment = ASSIGNMENT_FAILED
+    else:
+        assignment = ASSIGNMENT_WAITING
+
+    return {
+        'order_id': order.id,
+        'order_status': order.order_status,
+        'assignment': assignment,
+        'attempts': job.attempts if job else 0,
+        'disinsector': {'id': order.disinsector_id, 'name': order.name} if order.disinsector_id else None,
+    }
@@ -0,0 +1,124 @@
+# app/order_queries.py
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
+
+from app.model import Client, Disinsector, Order, STATUS_NEW
+from database import db
+
+ALL_STATUSES = 'Все'
+SORT_NEWEST = 'desc'
+SORT_OLDEST = 'asc'
+
+# Колонки, которые показывает таблица заявок в админ-панели
+ORDER_LIST_COLUMNS = (
+    Order.id,
+    Order.created_at,
+    Order.order_status,
+    Client.name.label('client_name'),
+    Client.phone.label('client_phone'),
+    Client.address.label('client_address'),
+    Disinsector.name.label('disinsector_name'),
+)
+
+
+def parse_date(value):
+    """
+    Дата фильтра в формате YYYY-MM-DD или None, если значение пустое или неверное.
+    """
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def order_list_query(status=ALL_STATUSES, columns=ORDER_LIST_COLUMNS, date_from=None, date_to=None):
+    """
+    Проекция заявок с данными клиента и дезинсектора без загрузки ORM-объектов.
+
+    date_from и date_to ограничивают дату создания заявки, обе границы включительно.
+    """
+    query = (
+        db.session.query(*columns)
+        .select_from(Order)
+        .join(Client, Order.client_id == Client.id)
+        .outerjoin(Disinsector, Order.disinsector_id == Disinsector.id)
+    )
+    if status and status != ALL_STATUSES:
+        query = query.filter(Order.order_status == status)
+    if date_from:
+        query = query.filter(Order.created_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query = query.filter(Order.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return query
+
+
+def oldest_new_order_query(disinsector_id):
+    """
+    id самой ранней новой заявки дезинсектора (их может быть несколько при max_load > 1).
+    """
+    return (
+        db.session.query(Order.id)
+        .filter(Order.disinsector_id == disinsector_id, Order.order_status == STATUS_NEW)
+        .order_by(Order.created_at, Order.id)
+        .limit(1)
+    )
+
+
+def disinsector_orders_query(disinsector_id):
+    """
+    Заявки дезинсектора для кабинета вместе с клиентами (одним запросом, без запроса на строку).
+    """
+    return Order.query.options(joinedload(Order.client)).filter(Order.disinsector_id == disinsector_id)
+
+
+def encode_cursor(row):
+    return f"{row.created_at.isoformat()}_{row.id}"
+
+
+def decode_cursor(cursor):
+    """
+    Разбирает курсор вида '<created_at>_<id>'. Возвращает (created_at, id) или None.
+    """
+    if not cursor:
+        return None
+    try:
+        created_at, order_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        return None
+
+
+def orders_page_query(status=ALL_STATUSES, sort=SORT_NEWEST, cursor=None, page_size=50, date_from=None, date_to=None):
+    """
+    Запрос страницы заявок после курсора: page_size + 1 строк, лишняя показывает, есть ли следующая.
+    """
+    key = tuple_(Order.created_at, Order.id)
+    query = order_list_query(status, date_from=date_from, date_to=date_to)
+
+    position = decode_cursor(cursor)
+    if sort == SORT_OLDEST:
+        if position:
+            query = query.filter(key > tuple_(*position))
+        query = query.order_by(Order.created_at.asc(), Order.id.asc())
+    else:
+        if position:
+            query = query.filter(key < tuple_(*position))
+        query = query.order_by(Order.created_at.desc(), Order.id.desc())
+    return query.limit(page_size + 1)
+
+
+def fetch_orders_page(status=ALL_STATUSES, sort=SORT_NEWEST, cursor=None, page_size=50, date_from=None, date_to=None):
+    """
+    Страница заявок с keyset-пагинацией по (created_at, id).
+
+    В отличие от OFFSET стоимость страницы не зависит от ее номера и общего числа заявок:
+    запрос идет по индексу от позиции курсора. Возвращает (rows, next_cursor).
+    """
+    rows = orders_page_query(status, sort, cursor, page_size, date_from, date_to).all()
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
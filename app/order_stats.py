@@ -0,0 +1,103 @@
+# app/order_stats.py
+
+from collections import Counter
+
+from flask import current_app
+from sqlalchemy import delete, func, insert
+
+from app.model import Disinsector, DisinsectorOrderStats, Order, STATUS_DONE, STATUS_IN_PROGRESS, STATUS_NEW
+from database import db, dialect_insert
+
+
+def summary_table_enabled():
+    return current_app.config.get('REPORTS_SUMMARY_TABLE', False)
+
+
+def _upsert_statement():
+    statement = dialect_insert(DisinsectorOrderStats)
+    return statement.on_conflict_do_update(
+        index_elements=[DisinsectorOrderStats.disinsector_id, DisinsectorOrderStats.order_status],
+        set_={'order_count': DisinsectorOrderStats.order_count + statement.excluded.order_count},
+    )
+
+
+def order_counts_query():
+    """
+    Число заявок по (disinsector_id, order_status) одним GROUP BY по ix_orders_disinsector_status.
+    """
+    return (
+        db.session.query(Order.disinsector_id, Order.order_status, func.count(Order.id))
+        .filter(Order.disinsector_id.isnot(None))
+        .group_by(Order.disinsector_id, Order.order_status)
+    )
+
+
+def record_order_stats(changes):
+    """
+    Применяет изменения к сводной таблице в текущей транзакции.
+
+    changes - итерируемое из (disinsector_id, order_status, delta). Одинаковые пары
+    схлопываются, затем выполняется один upsert на все строки. Если сводная таблица
+    выключена (REPORTS_SUMMARY_TABLE), ничего не делает.
+    """
+    if not summary_table_enabled():
+        return
+    totals = Counter()
+    for disinsector_id, order_status, delta in changes:
+        if disinsector_id is not None and delta:
+            totals[(disinsector_id, order_status)] += delta
+    rows = [
+        {'disinsector_id': disinsector_id, 'order_status': order_status, 'order_count': delta}
+        for (disinsector_id, order_status), delta in totals.items()
+        if delta
+    ]
+    if rows:
+        db.session.execute(_upsert_statement(), rows)
+
+
+def rebuild_order_stats():
+    """
+    Полностью пересобирает сводную таблицу одним GROUP BY по заявкам.
+    """
+    db.session.execute(delete(DisinsectorOrderStats))
+    db.session.execute(
+        insert(DisinsectorOrderStats).from_select(
+            ['disinsector_id', 'order_status', 'order_count'],
+            order_counts_query().statement,
+        )
+    )
+    db.session.commit()
+
+
+def disinsector_report():
+    """
+    Отчет по дезинсекторам: всего заявок и разбивка по статусам.
+
+    Счетчики берутся из сводной таблицы (если она включена) или одним запросом
+    GROUP BY disinsector_id, order_status, поэтому стоимость отчета зависит от числа
+    дезинсекторов, а не заявок.
+    """
+    if summary_table_enabled():
+        counts = db.session.query(
+            DisinsectorOrderStats.disinsector_id,
+            DisinsectorOrderStats.order_status,
+            DisinsectorOrderStats.order_count,
+        )
+    else:
+        counts = order_counts_query()
+
+    by_disinsector = {}
+    for disinsector_id, order_status, order_count in counts:
+        by_disinsector.setdefault(disinsector_id, Counter())[order_status] += order_count
+
+    report = []
+    for disinsector_id, name in db.session.query(Disinsector.id, Disinsector.name).order_by(Disinsector.name):
+        statuses = by_disinsector.get(disinsector_id, Counter())
+        report.append({
+            'name': name,
+            'total': sum(statuses.values()),
+            'done': statuses[STATUS_DONE],
+            'in_progress': statuses[STATUS_IN_PROGRESS],
+            'new': statuses[STATUS_NEW],
+        })
+    return report
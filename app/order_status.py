@@ -0,0 +1,136 @@
+# app/order_status.py
+
+import logging
+
+from sqlalchemy import case, func, update
+
+from app.model import Disinsector, Order, ORDER_STATUSES, STATUS_IN_PROGRESS, STATUS_NEW
+from app.order_jobs import enqueue_backlog_dispatch
+from app.order_stats import record_order_stats
+from database import db
+
+logger = logging.getLogger('order_status')
+
+# Заявки в этих статусах занимают емкость назначенного дезинсектора
+ACTIVE_STATUSES = (STATUS_NEW, STATUS_IN_PROGRESS)
+
+
+def load_delta(old_status, new_status):
+    """
+    Насколько меняется load дезинсектора при переходе заявки из old_status в new_status.
+    """
+    was_active = old_status in ACTIVE_STATUSES
+    is_active = new_status in ACTIVE_STATUSES
+    return int(is_active) - int(was_active)
+
+
+def change_order_status(order_id, new_status, disinsector_id=None, **values):
+    """
+    Единая точка смены статуса заявки для веб-кабинетов и ботов.
+
+    В той же транзакции корректирует load назначенного дезинсектора: при завершении заявки
+    место освобождается, при возврате в работу - снова занимается. Освобождение места
+    ставит в order_jobs задачу пакетного назначения: ее заберет бот дезинсекторов, даже если
+    статус сменили в другом процессе (веб-кабинет). Смена статуса делается
+    условным UPDATE по старому статусу и назначенному дезинсектору, чтобы параллельные изменения
+    (в том числе переназначение) не посчитались дважды и load не изменился у другого дезинсектора.
+    disinsector_id ограничивает изменение заявками этого дезинсектора. values - дополнительные
+    поля заявки, которые нужно сохранить вместе со статусом.
+
+    Возвращает словарь {'order_id', 'disinsector_id', 'old_status', 'new_status', 'freed'}
+    или None, если заявка не найдена.
+    """
+    if new_status not in ORDER_STATUSES:
+        raise ValueError(f"Неизвестный статус заявки: {new_status}")
+
+    query = db.session.query(Order.disinsector_id, Order.order_status).filter(Order.id == order_id)
+    if disinsector_id is not None:
+        query = query.filter(Order.disinsector_id == disinsector_id)
+
+    for _ in range(3):
+        row = query.first()
+        if row is None:
+            return None
+        assigned_to, old_status = row
+
+        changed = db.session.execute(
+            update(Order)
+            .where(
+                Order.id == order_id,
+                Order.order_status == old_status,
+                Order.disinsector_id.is_(None) if assigned_to is None else Order.disinsector_id == assigned_to,
+            )
+            .values(order_status=new_status, **values)
+            .execution_options(synchronize_session='fetch')
+        ).rowcount
+        if changed:
+            break
+        # Статус или дезинсектор успели измениться параллельно - перечитываем и пробуем еще раз
+        db.session.rollback()
+    else:
+        raise RuntimeError(f"Не удалось изменить статус заявки {order_id}: она постоянно меняется параллельно.")
+
+    record_order_stats([(assigned_to, old_status, -1), (assigned_to, new_status, 1)])
+
+    delta = load_delta(old_status, new_status) if assigned_to else 0
+    if delta > 0:
+        db.session.execute(
+            update(Disinsector)
+            .where(Disinsector.id == assigned_to)
+            .values(load=Disinsector.load + 1)
+            .execution_options(synchronize_session='fetch')
+        )
+    elif delta < 0:
+        db.session.execute(
+            update(Disinsector)
+            .where(Disinsector.id == assigned_to)
+            .values(load=case((Disinsector.load > 0, Disinsector.load - 1), else_=0))
+            .execution_options(synchronize_session='fetch')
+        )
+        enqueue_backlog_dispatch(order_id)
+
+    db.session.commit()
+
+    if delta:
+        # Импорт здесь, чтобы не создавать цикл между модулями назначения и статусов
+        from app.assignment import get_capacity_heap
+        capacity_heap = get_capacity_heap()
+        if capacity_heap:
+            if delta < 0:
+                capacity_heap.released(assigned_to)
+            else:
+                capacity_heap.invalidate()
+
+    logger.info(f"Заявка {order_id}: статус '{old_status}' -> '{new_status}'", extra={'order_id': order_id})
+    return {
+        'order_id': order_id,
+        'disinsector_id': assigned_to,
+        'old_status': old_status,
+        'new_status': new_status,
+        'freed': delta < 0,
+    }
+
+
+def reconcile_loads():
+    """
+    Пересчитывает load всех дезинсекторов по фактическим активным заявкам.
+
+    Один сгруппированный запрос считает активные заявки, затем обновляются только
+    расходящиеся строки. Возвращает число исправленных дезинсекторов.
+    """
+    active_counts = dict(
+        db.session.query(Order.disinsector_id, func.count(Order.id))
+        .filter(Order.disinsector_id.isnot(None), Order.order_status.in_(ACTIVE_STATUSES))
+        .group_by(Order.disinsector_id)
+    )
+    corrections = [
+        {'id': disinsector_id, 'load': active_counts.get(disinsector_id, 0)}
+        for disinsector_id, load in db.session.query(Disinsector.id, Disinsector.load)
+        if (load or 0) != active_counts.get(disinsector_id, 0)
+    ]
+    if corrections:
+        db.session.execute(update(Disinsector), corrections)
+        for correction in corrections:
+            logger.warning(f"Дезинсектор {correction['id']}: load исправлен на {correction['load']}")
+    db.session.commit()
+    return len(corrections)
@@ -0,0 +1,198 @@
+# app/outbox.py
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, or_, select, update
+
+from app.entity_cache import get_disinsector_profiles
+from app.model import OutboxMessage, JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_PROCESSING
+from database import db, dialect_insert
+
+logger = logging.getLogger('outbox')
+
+KEYBOARD_ACCEPT_ORDER = 'accept_order'
+
+# Будит relay сразу после коммита назначения, не дожидаясь очередного опроса. Событие
+# живет здесь, а не в outbox_relay: назначающему коду не нужны модули Telegram.
+# Действует только внутри процесса relay (бот дезинсекторов с OUTBOX_RELAY_IN_BOT);
+# назначения из других процессов relay видит при опросе раз в OUTBOX_POLL_INTERVAL.
+outbox_ready = asyncio.Event()
+
+
+def wake_outbox_relay():
+    outbox_ready.set()
+
+
+def new_order_text(order):
+    return (
+        f"🔔 Новая заявка №{order['id']}.\n"
+        f"Имя: {order['client_name']}\n"
+        f"Адрес: {order['address']}\n"
+        f"Телефон: {order['phone']}\n"
+        f"Объект: {order['object_type']}\n"
+    )
+
+
+def backlog_text(orders):
+    lines = [f"🔔 Вам назначено новых заявок: {len(orders)}."]
+    for order in orders:
+        lines.append(
+            f"\n№{order['id']}\n"
+            f"Имя: {order['client_name']}\n"
+            f"Адрес: {order['address']}\n"
+            f"Телефон: {order['phone']}\n"
+            f"Объект: {order['object_type']}"
+        )
+    return "\n".join(lines)
+
+
+def add_outbox_message(idempotency_key, disinsector_id, text, keyboard=None):
+    """
+    Добавляет уведомление в outbox в текущей транзакции (коммитит вызывающий код).
+    Повторная постановка с тем же idempotency_key ничего не делает.
+    """
+    statement = dialect_insert(OutboxMessage).on_conflict_do_nothing(index_elements=[OutboxMessage.idempotency_key])
+    now = datetime.utcnow()
+    db.session.execute(statement, {
+        'idempotency_key': idempotency_key,
+        'disinsector_id': disinsector_id,
+        'text': text,
+        'keyboard': keyboard,
+        'status': JOB_PENDING,
+        'attempts': 0,
+        'available_at': now,
+        'created_at': now,
+    })
+
+
+def enqueue_order_notification(disinsector_id, order):
+    """
+    Уведомление о назначенной заявке с кнопкой "Ок" для принятия.
+    """
+    add_outbox_message(
+        f"order-assigned:{order['id']}:{disinsector_id}",
+        disinsector_id,
+        new_order_text(order),
+        keyboard=KEYBOARD_ACCEPT_ORDER,
+    )
+
+
+def enqueue_backlog_notification(disinsector_id, orders):
+    """
+    Одно уведомление со всеми заявками, назначенными дезинсектору пакетом.
+    """
+    order_ids = sorted(order['id'] for order in orders)
+    add_outbox_message(
+        f"orders-assigned:{disinsector_id}:{order_ids[0]}:{len(order_ids)}",
+        disinsector_id,
+        backlog_text(orders),
+    )
+
+
+def claim_outbox_statement(now, limit=50, lease_seconds=120):
+    """
+    Условный UPDATE ... RETURNING, берущий в аренду до limit готовых сообщений.
+    """
+    ready = (
+        select(OutboxMessage.id)
+        .where(or_(
+            and_(OutboxMessage.status == JOB_PENDING, OutboxMessage.available_at <= now),
+            and_(OutboxMessage.status == JOB_PROCESSING, OutboxMessage.locked_until < now),
+        ))
+        .order_by(OutboxMessage.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(ready.scalar_subquery()))
+        .values(
+            status=JOB_PROCESSING,
+            locked_until=now + timedelta(seconds=lease_seconds),
+            attempts=OutboxMessage.attempts + 1,
+        )
+        .returning(
+            OutboxMessage.id, OutboxMessage.idempotency_key, OutboxMessage.disinsector_id,
+            OutboxMessage.text, OutboxMessage.keyboard, OutboxMessage.attempts,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def claim_outbox_messages(limit=50, lease_seconds=120):
+    """
+    Забирает до limit готовых к отправке сообщений в аренду одним условным UPDATE и коммитит.
+
+    Токен и chat_id берутся у дезинсектора на момент отправки. Возвращает список словарей
+    {'id', 'idempotency_key', 'text', 'keyboard', 'attempts', 'token', 'chat_id'}.
+    """
+    rows = db.session.execute(claim_outbox_statement(datetime.utcnow(), limit, lease_seconds)).all()
+    db.session.commit()
+    if not rows:
+        return []
+
+    recipients = get_disinsector_profiles(row.disinsector_id for row in rows)
+    messages = []
+    for row in sorted(rows, key=lambda row: row.id):
+        recipient = recipients.get(row.disinsector_id, {})
+        messages.append({**row._mapping, 'token': recipient.get('token'), 'chat_id': recipient.get('telegram_user_id')})
+    return messages
+
+
+def record_outbox_results(sent_ids, failures, max_attempts=8):
+    """
+    Фиксирует результаты отправки пачки одной транзакцией.
+
+    failures - список (id, текст ошибки, permanent). Постоянные ошибки и исчерпанные
+    попытки переводят сообщение в failed, остальные возвращаются в очередь с
+    экспоненциальной задержкой.
+    """
+    now = datetime.utcnow()
+    if sent_ids:
+        db.session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(sent_ids))
+            .values(status=JOB_DONE, sent_at=now, locked_until=None, last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+    for message_id, error, permanent in failures:
+        message = db.session.get(OutboxMessage, message_id)
+        if message is None:
+            continue
+        message.locked_until = None
+        message.last_error = str(error)[:500]
+        if permanent or message.attempts >= max_attempts:
+            message.status = JOB_FAILED
+            logger.error(f"Уведомление {message.idempotency_key} не доставлено: {error}")
+        else:
+            message.status = JOB_PENDING
+            message.available_at = now + timedelta(seconds=min(2 ** message.attempts, 300))
+            logger.warning(f"Уведомление {message.idempotency_key} будет отправлено повторно: {error}")
+    db.session.commit()
+
+
+def prune_outbox_messages(older_than_days, batch=1000):
+    """
+    Удаляет отправленные сообщения старше older_than_days дней пачками по batch. Вместе со
+    строкой уходит и защита idempotency_key, поэтому срок хранения должен быть больше окна,
+    в котором то же уведомление может быть поставлено повторно. failed не удаляются.
+    Возвращает число удаленных сообщений.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    expired = (
+        select(OutboxMessage.id)
+        .where(OutboxMessage.status == JOB_DONE, OutboxMessage.sent_at < cutoff)
+        .limit(batch)
+        .scalar_subquery()
+    )
+    deleted = 0
+    while True:
+        count = db.session.execute(
+            delete(OutboxMessage).where(OutboxMessage.id.in_(expired)).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        deleted += count
+        if count < batch:
+            return deleted
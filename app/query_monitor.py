@@ -0,0 +1,131 @@
+# app/query_monitor.py
+
+import logging
+import re
+from functools import lru_cache
+
+from flask import current_app, request
+
+logger = logging.getLogger('query_monitor')
+
+# Настройки задает init_app; слушатели движка (app.metrics) читают их из всех потоков
+_settings = {
+    'enabled': False,
+    'slow_query_ms': 200,
+    'n_plus_one_threshold': 10,
+    'strict': False,
+}
+
+_IN_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_SPACES = re.compile(r'\s+')
+_PARAMS_LIMIT = 500
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """
+    Единица работы сделала больше запросов, чем разрешено, или повторила запрос одной
+    формы N раз (N+1). Бросается только в строгом режиме (QUERY_BUDGET_STRICT).
+    """
+
+
+def enabled():
+    return _settings['enabled']
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement):
+    """
+    Форма запроса: параметры уже вынесены в ?, списки IN (?, ?, ...) разной длины сводятся к одному.
+    """
+    return _IN_LIST.sub('(?...)', _SPACES.sub(' ', statement).strip())
+
+
+def _format_parameters(parameters, executemany):
+    if executemany:
+        text = f"{len(parameters)} наборов, первый {parameters[0]!r}" if parameters else '[]'
+    else:
+        text = repr(parameters)
+    return text if len(text) <= _PARAMS_LIMIT else text[:_PARAMS_LIMIT] + '...'
+
+
+def observe_query(unit, statement, parameters, executemany, elapsed):
+    """
+    Вызывается учетом запросов app.metrics после каждого запроса: форма запроса в единицу
+    работы (unit может быть None вне запроса/апдейта) и лог медленного запроса.
+    """
+    if not _settings['enabled']:
+        return
+    if unit is not None:
+        unit.shapes[statement_shape(statement)] += 1
+    slow_ms = _settings['slow_query_ms']
+    elapsed_ms = elapsed * 1000
+    if slow_ms and elapsed_ms >= slow_ms:
+        logger.warning(
+            f"Медленный запрос {elapsed_ms:.0f} мс ({unit.name if unit else 'вне запроса'}): "
+            f"{_SPACES.sub(' ', statement)} параметры {_format_parameters(parameters, executemany)}"
+        )
+
+
+def problems(unit):
+    """
+    Список нарушений единицы работы: превышение бюджета и повторяющиеся формы запросов.
+    """
+    found = []
+    if unit.budget is not None and unit.queries > unit.budget:
+        found.append(f"{unit.queries} SQL-запросов при бюджете {unit.budget}")
+    threshold = _settings['n_plus_one_threshold']
+    if threshold:
+        for shape, count in unit.shapes.most_common():
+            if count < threshold:
+                break
+            found.append(f"возможный N+1: {count} одинаковых запросов {shape[:300]}")
+    return found
+
+
+def check_unit(unit):
+    """
+    Пишет нарушения в лог; в строгом режиме бросает QueryBudgetExceeded.
+    """
+    if not _settings['enabled']:
+        return
+    found = problems(unit)
+    if not found:
+        return
+    message = f"{unit.name}: " + '; '.join(found)
+    if _settings['strict']:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def query_budget(limit):
+    """
+    Декоратор представления: не больше limit SQL-запросов на HTTP-запрос.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def request_budget():
+    """
+    Бюджет текущего HTTP-запроса: @query_budget представления или QUERY_BUDGET_DEFAULT.
+    """
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', None)
+    if budget is None:
+        budget = current_app.config.get('QUERY_BUDGET_DEFAULT') or None
+    return budget
+
+
+def init_app(app):
+    """
+    Лог медленных запросов, поиск N+1 и бюджеты запросов по маршрутам. Своих слушателей
+    нет: запросы считает единица работы app.metrics и передает их сюда.
+    """
+    _settings.update(
+        enabled=app.config.get('QUERY_MONITOR_ENABLED', True),
+        slow_query_ms=app.config.get('SLOW_QUERY_MS', _settings['slow_query_ms']),
+        n_plus_one_threshold=app.config.get('N_PLUS_ONE_THRESHOLD', _settings['n_plus_one_threshold']),
+        strict=app.config.get('QUERY_BUDGET_STRICT', False),
+    )
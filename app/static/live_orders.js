@@ -0,0 +1,59 @@
+// app/static/live_orders.js
+// Обновление таблицы заявок без перезагрузки страницы: сервер присылает по SSE только
+// новые и измененные заявки, строки таблицы обновляются на месте.
+(function () {
+    var table = document.getElementById('orders-table');
+    if (!table || !window.EventSource) {
+        return;
+    }
+    var template = document.getElementById('order-row-template');
+    var empty = document.getElementById('orders-empty');
+    var statusFilter = table.dataset.statusFilter || '';
+    var insertNew = table.dataset.insertNew === 'true';
+    // Новыми для страницы считаются заявки, созданные после ее рендера (если задано)
+    var newSince = table.dataset.newSince || '';
+
+    function fill(row, order) {
+        row.dataset.orderId = order.id;
+        row.querySelectorAll('[data-field]').forEach(function (cell) {
+            var value = order[cell.dataset.field];
+            cell.textContent = value === null || value === undefined ? (cell.dataset.empty || '') : value;
+        });
+        var orderInput = row.querySelector('input[name="order_id"]');
+        if (orderInput) {
+            orderInput.value = order.id;
+        }
+        var select = row.querySelector('select[name="new_status"]');
+        if (select && document.activeElement !== select) {
+            select.value = order.order_status;
+        }
+    }
+
+    function apply(order) {
+        var row = table.querySelector('tr[data-order-id="' + order.id + '"]');
+        if (!row) {
+            if (!insertNew || !template) {
+                return;
+            }
+            if (statusFilter && order.order_status !== statusFilter) {
+                return;
+            }
+            if (newSince && order.created_at < newSince) {
+                return;
+            }
+            row = template.content.firstElementChild.cloneNode(true);
+            var header = table.rows[0];
+            header.parentNode.insertBefore(row, header.nextSibling);
+            table.hidden = false;
+            if (empty) {
+                empty.hidden = true;
+            }
+        }
+        fill(row, order);
+    }
+
+    var source = new EventSource(table.dataset.eventsUrl);
+    source.addEventListener('orders', function (event) {
+        JSON.parse(event.data).forEach(apply);
+    });
+})();
@@ -0,0 +1,251 @@
+# app/telegram_sender.py
+
+import asyncio
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import aiohttp
+
+from app.metrics import TELEGRAM_ERRORS, TELEGRAM_REQUEST_SECONDS
+from config import Config
+
+logger = logging.getLogger('telegram_sender')
+
+TELEGRAM_API_URL = 'https://api.telegram.org'
+
+
+class TelegramDeliveryError(Exception):
+    def __init__(self, message, error_code=None):
+        super().__init__(message)
+        self.error_code = error_code
+
+    @property
+    def permanent(self):
+        # 400/403 (чат не найден, бот заблокирован и т.п.) - повтор не поможет
+        return self.error_code is not None and 400 <= self.error_code < 500 and self.error_code != 429
+
+
+class RateLimiter:
+    """
+    Token bucket: не более rate событий в секунду с запасом burst.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class TelegramSender:
+    """
+    Единая очередь исходящих сообщений Telegram.
+
+    Работает в собственном потоке со своим event loop и одной aiohttp-сессией (keep-alive пул),
+    поэтому enqueue() можно вызывать и из синхронных Flask-view, и из обработчиков aiogram.
+    Соблюдает лимит на бота (у каждого токена свой token bucket, как и лимит Telegram) и лимит
+    на чат, повторяет отправку после 429 (retry_after), 5xx и ответов не в JSON (HTML-страница
+    502/504 от прокси). Сообщения в один чат уходят строго по порядку.
+    """
+    def __init__(self, api_url=None, global_rate=None, chat_rate=None, max_retries=None, pool_limit=None):
+        self.api_url = (api_url or Config.TELEGRAM_API_URL or TELEGRAM_API_URL).rstrip('/')
+        self.global_rate = global_rate or Config.TELEGRAM_GLOBAL_RATE
+        self.chat_interval = 1 / (chat_rate or Config.TELEGRAM_CHAT_RATE)
+        self.max_retries = max_retries if max_retries is not None else Config.TELEGRAM_MAX_RETRIES
+        self.pool_limit = pool_limit or Config.TELEGRAM_POOL_LIMIT
+
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._limiters = {}  # token -> RateLimiter
+        self._lanes = {}  # (token, chat_id) -> deque сообщений
+        self._chat_next_at = {}  # (token, chat_id) -> когда можно писать в чат снова
+        self._token_paused_until = {}  # token -> конец паузы после 429
+        self._idle = None
+        self._started = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._run_loop, name='telegram-sender', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    def enqueue(self, token, chat_id, text, **params):
+        """
+        Ставит сообщение в очередь и сразу возвращает concurrent.futures.Future
+        с ответом Bot API (или TelegramDeliveryError).
+        """
+        self.start()
+        future = Future()
+        payload = {'chat_id': chat_id, 'text': text, 'parse_mode': 'HTML', **params}
+        self._loop.call_soon_threadsafe(self._accept, token, payload, future)
+        return future
+
+    async def send(self, token, chat_id, text, **params):
+        """
+        Асинхронный вариант enqueue() для кода на asyncio: ждет доставки, не блокируя loop.
+        """
+        return await asyncio.wrap_future(self.enqueue(token, chat_id, text, **params))
+
+    def _accept(self, token, payload, future):
+        key = (token, payload['chat_id'])
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+            self._idle.clear()
+            self._loop.create_task(self._drain_chat(key, lane))
+        lane.append((payload, future))
+
+    async def _drain_chat(self, key, lane):
+        token = key[0]
+        try:
+            while lane:
+                payload, future = lane[0]
+                delay = max(
+                    self._chat_next_at.get(key, 0),
+                    self._token_paused_until.get(token, 0),
+                ) - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                try:
+                    result = await self._deliver(token, payload)
+                    if not future.done():
+                        future.set_result(result)
+                except Exception as e:
+                    logger.error(f"Не удалось отправить сообщение в чат {payload['chat_id']}: {e}")
+                    if not future.done():
+                        future.set_exception(e)
+                lane.popleft()
+                self._chat_next_at[key] = time.monotonic() + self.chat_interval
+        finally:
+            del self._lanes[key]
+            self._prune_chat_timers()
+            if not self._lanes:
+                self._idle.set()
+
+    def _prune_chat_timers(self):
+        if len(self._chat_next_at) < 10000:
+            return
+        now = time.monotonic()
+        self._chat_next_at = {key: at for key, at in self._chat_next_at.items() if at > now}
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_limit, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+        return self._session
+
+    def _limiter(self, token):
+        limiter = self._limiters.get(token)
+        if limiter is None:
+            limiter = self._limiters[token] = RateLimiter(self.global_rate)
+        return limiter
+
+    async def _deliver(self, token, payload):
+        url = f"{self.api_url}/bot{token}/sendMessage"
+        session = await self._get_session()
+        backoff = 1
+        for attempt in range(self.max_retries + 1):
+            await self._limiter(token).acquire()
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=payload) as response:
+                    try:
+                        data = await response.json(content_type=None)
+                    except ValueError:
+                        # Не Bot API, а промежуточный сервер (HTML 502/504): повторяем как 5xx
+                        data = {
+                            'ok': False,
+                            'error_code': max(response.status, 502),
+                            'description': f"ответ не в JSON (HTTP {response.status})",
+                        }
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - started, method='sendMessage')
+                TELEGRAM_ERRORS.inc(method='sendMessage', error='network')
+                if attempt == self.max_retries:
+                    raise TelegramDeliveryError(f"Сетевая ошибка: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - started, method='sendMessage')
+
+            if data.get('ok'):
+                return data.get('result')
+
+            error_code = data.get('error_code') or response.status
+            TELEGRAM_ERRORS.inc(method='sendMessage', error=error_code)
+            description = data.get('description', '')
+            if error_code == 429:
+                retry_after = (data.get('parameters') or {}).get('retry_after', backoff)
+                logger.warning(f"Telegram ограничил частоту запросов, повтор через {retry_after} с")
+                self._token_paused_until[token] = time.monotonic() + retry_after
+                if attempt == self.max_retries:
+                    break
+                await asyncio.sleep(retry_after)
+                continue
+            if error_code >= 500 and attempt < self.max_retries:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            raise TelegramDeliveryError(f"{error_code}: {description}", error_code=error_code)
+        raise TelegramDeliveryError(f"Исчерпаны попытки отправки в чат {payload['chat_id']}", error_code=429)
+
+    def stop(self, timeout=10):
+        """
+        Дожидается отправки уже поставленных сообщений и останавливает поток.
+        """
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(timeout), self._loop).result(timeout + 5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+
+    async def _shutdown(self, timeout):
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не дождались отправки {len(self._lanes)} очередей сообщений при остановке.")
+        if self._session is not None:
+            await self._session.close()
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    """
+    Общий для процесса TelegramSender, создается и запускается при первом обращении.
+    """
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                _sender = TelegramSender().start()
+                atexit.register(_sender.stop)
+    return _sender
@@ -0,0 +1,163 @@
+# app/update_queue.py
+
+import asyncio
+import logging
+import time
+import weakref
+from collections import deque
+
+from aiogram.types import Update
+
+from app.metrics import BOT_UPDATE_QUEUE_SECONDS, BOT_WEBHOOK_UPDATES, CallbackMetric
+
+logger = logging.getLogger('update_queue')
+
+# Поля события с автором, если у события нет чата (inline-запросы и т.п.)
+_USER_FIELDS = ('from', 'user')
+
+
+def update_chat_key(update):
+    """
+    Ключ упорядочивания по сырому JSON апдейта: id чата, если его нет - id пользователя.
+    Апдейты без чата и пользователя упорядочивать не нужно (None).
+    """
+    for field, event in update.items():
+        if field == 'update_id' or not isinstance(event, dict):
+            continue
+        chat = event.get('chat') or (event.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+        for user_field in _USER_FIELDS:
+            if event.get(user_field):
+                return event[user_field]['id']
+    return None
+
+
+class UpdateQueue:
+    """
+    Ограниченная очередь апдейтов webhook с пулом обработчиков.
+
+    Не больше workers апдейтов обрабатываются одновременно, и в каждом чате - по одному
+    в порядке поступления: шаги анкеты одного клиента не гонятся за состояние FSM.
+    Чаты обслуживаются по кругу, поэтому поток апдейтов одного чата не задерживает
+    остальных. Когда в очереди max_pending апдейтов, put ждет место не дольше timeout
+    и возвращает False - webhook отвечает ошибкой, и Telegram повторит доставку позже.
+    """
+    instances = weakref.WeakSet()
+
+    def __init__(self, dispatcher, bot, name, workers=32, max_pending=1000):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0  # в очереди и в обработке
+        self.in_flight = 0
+        self._chats = {}  # ключ чата -> deque[(апдейт, время постановки)]
+        self._ready = asyncio.Queue()  # ключи чатов, у которых есть апдейт и нет обработчика
+        self._space = asyncio.Condition()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = []
+        self._closed = False
+        UpdateQueue.instances.add(self)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def put_nowait(self, update):
+        """
+        Ставит сырой апдейт (dict) в очередь; False, если очередь полна или закрыта.
+        """
+        if self._closed or self.pending >= self.max_pending:
+            BOT_WEBHOOK_UPDATES.inc(bot=self.name, outcome='rejected')
+            return False
+        key = update_chat_key(update)
+        if key is None:
+            key = object()
+        chat = self._chats.get(key)
+        if chat is None:
+            chat = self._chats[key] = deque()
+            self._ready.put_nowait(key)
+        chat.append((update, time.perf_counter()))
+        self.pending += 1
+        self._idle.clear()
+        BOT_WEBHOOK_UPDATES.inc(bot=self.name, outcome='accepted')
+        return True
+
+    async def put(self, update, timeout=1.0):
+        """
+        Как put_nowait, но при полной очереди ждет освобождения места до timeout секунд.
+        """
+        if self.pending >= self.max_pending and not self._closed:
+            async with self._space:
+                try:
+                    await asyncio.wait_for(
+                        self._space.wait_for(lambda: self.pending < self.max_pending or self._closed), timeout,
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        return self.put_nowait(update)
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            chat = self._chats[key]
+            update, queued = chat.popleft()
+            self.in_flight += 1
+            try:
+                await self._process(update, queued)
+            finally:
+                self.in_flight -= 1
+                # Следующий апдейт чата - в конец круга, после уже ожидающих чатов
+                if chat:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._chats[key]
+                await self._release()
+
+    async def _process(self, update, queued):
+        BOT_UPDATE_QUEUE_SECONDS.observe(time.perf_counter() - queued, bot=self.name)
+        try:
+            await self.dispatcher.feed_update(self.bot, Update.model_validate(update, context={'bot': self.bot}))
+        except Exception as e:
+            BOT_WEBHOOK_UPDATES.inc(bot=self.name, outcome='failed')
+            logger.exception(f"Ошибка обработки апдейта {update.get('update_id')} ({self.name}): {e}")
+
+    async def _release(self):
+        self.pending -= 1
+        if not self.pending:
+            self._idle.set()
+        async with self._space:
+            self._space.notify()
+
+    async def drain(self, timeout):
+        """
+        Перестает принимать апдейты, ждет до timeout секунд, пока обработаются принятые,
+        и останавливает обработчики. Возвращает число необработанных (потерянных) апдейтов.
+        """
+        self._closed = True
+        async with self._space:
+            self._space.notify_all()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        dropped = self.pending
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if dropped:
+            BOT_WEBHOOK_UPDATES.inc(dropped, bot=self.name, outcome='dropped')
+            logger.warning(f"Очередь {self.name}: не обработано {dropped} апдейтов за {timeout} с остановки")
+        return dropped
+
+
+def _queue_metric(field):
+    return lambda: {(queue.name,): getattr(queue, field) for queue in UpdateQueue.instances}
+
+
+CallbackMetric('bot_update_queue_pending', 'Апдейтов в очереди webhook (включая обрабатываемые)', ('bot',),
+               _queue_metric('pending'))
+CallbackMetric('bot_update_queue_in_flight', 'Апдейтов в обработке', ('bot',), _queue_metric('in_flight'))
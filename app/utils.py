@@ -1,17 +1,19 @@
-import requests
+
 import logging
 
 logger = logging.getLogger('utils')
 
-def send_telegram_message(token, chat_id, text):
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
+def send_telegram_message(token, chat_id, text, **params):
+    """
+    Ставит сообщение в общую очередь отправки и сразу возвращает управление.
+    Возвращает concurrent.futures.Future с результатом доставки.
+    """
+    # Отправитель (и aiohttp) загружается при первой отправке, а не при старте веб-приложения
+    from app.telegram_sender import get_sender
+
     try:
-        response = requests.post(url, json=payload)
-        if response.status_code != 200:
-            logger.error(f"Не удалось отправить сообщение через Telegram: {response.text}")
+        return get_sender().enqueue(token, chat_id, text, **params)
     except Exception as e:
-        logger.error(f"Ошибка при отправке сообщения через Telegram: {e}")
-
-
+        logger.error(f"Ошибка при постановке сообщения Telegram в очередь: {e}")
+        return None
 
@@ -0,0 +1,131 @@
+# benchmarks/assignment_stress.py
+"""
+Стресс-проверка назначения заявок несколькими процессами одновременно.
+
+Каждый процесс создает заявки и сразу назначает их (как client_bot и /api/create_order),
+один из процессов параллельно гоняет пакетное назначение очереди. В конце проверяется,
+что ни у одного дезинсектора load не превысил max_load и что load совпадает с числом
+назначенных ему заявок. Код возврата 1, если инвариант нарушен, если вызов назначения
+упал с ошибкой (например, "database is locked") или если при свободной емкости осталась
+неназначенная заявка:
+    python -m benchmarks.assignment_stress --processes 8 --orders 200 --heap
+"""
+
+import argparse
+import multiprocessing
+import time
+
+from sqlalchemy import func
+
+from benchmarks.common import bench_config, drop_db, make_app, seed
+
+
+def worker(db_path, orders, use_heap, run_backlog, results):
+    from app import create_app
+    from app.assignment import assign_order, dispatch_backlog
+    from app.model import Order
+    from database import db
+
+    config = bench_config(db_path)
+    config.ASSIGNMENT_CAPACITY_HEAP = use_heap
+    app = create_app(config)
+
+    assigned = unassigned = errors = 0
+    with app.app_context():
+        for i in range(orders):
+            try:
+                order = Order(client_id=1 + i % 10, object_type='home', insect_quantity='less_50',
+                              disinsect_experience=False, order_status='Новая')
+                db.session.add(order)
+                db.session.commit()
+                if assign_order(order.id):
+                    assigned += 1
+                else:
+                    unassigned += 1
+                if run_backlog and i % 20 == 0:
+                    assigned += sum(len(a['orders']) for a in dispatch_backlog().values())
+            except Exception:
+                db.session.rollback()
+                errors += 1
+            finally:
+                db.session.remove()
+    results.put((assigned, unassigned, errors))
+
+
+def check(db_path):
+    from app import create_app
+    from app.model import Disinsector, Order
+    from database import db
+
+    app = create_app(bench_config(db_path))
+    with app.app_context():
+        counts = dict(
+            db.session.query(Order.disinsector_id, func.count(Order.id))
+            .filter(Order.disinsector_id.isnot(None))
+            .group_by(Order.disinsector_id)
+        )
+        violations = []
+        for disinsector in Disinsector.query.all():
+            actual = counts.get(disinsector.id, 0)
+            if disinsector.load > disinsector.max_load or disinsector.load != actual:
+                violations.append((disinsector.id, disinsector.load, disinsector.max_load, actual))
+        total_assigned = sum(counts.values())
+    return violations, total_assigned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--orders', type=int, default=200, help='заявок на процесс')
+    parser.add_argument('--disinsectors', type=int, default=20)
+    parser.add_argument('--max-load', type=int, default=5)
+    parser.add_argument('--heap', action='store_true', help='включить ASSIGNMENT_CAPACITY_HEAP')
+    args = parser.parse_args()
+
+    app = make_app()
+    db_path = app.config['BENCH_DB_PATH']
+    with app.app_context():
+        seed(disinsectors=args.disinsectors, orders=0, clients=10, max_load=args.max_load)
+
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(db_path, args.orders, args.heap, n == 0, results))
+        for n in range(args.processes)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    seconds = time.perf_counter() - start
+
+    violations, total_assigned = check(db_path)
+    drop_db(db_path)
+
+    capacity = args.disinsectors * args.max_load
+    orders = args.processes * args.orders
+    errors = sum(t[2] for t in totals)
+    print(f"процессов: {args.processes}, заявок: {orders}, емкость: {capacity}, "
+          f"куча: {'да' if args.heap else 'нет'}")
+    print(f"назначено: {total_assigned}, без назначения: {sum(t[1] for t in totals)}, "
+          f"ошибок: {errors}, время: {seconds:.2f} с")
+    failed = False
+    for disinsector_id, load, max_load, actual in violations:
+        print(f"НАРУШЕНИЕ: дезинсектор {disinsector_id}: load={load}, max_load={max_load}, заявок={actual}")
+        failed = True
+    if errors:
+        print(f"ОШИБКА: {errors} вызовов назначения завершились исключением")
+        failed = True
+    # Пока есть и заявки, и свободная емкость, каждая заявка должна быть назначена
+    if total_assigned < min(orders, capacity):
+        print(f"ОШИБКА: назначено {total_assigned}, ожидалось не меньше {min(orders, capacity)}")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+    print("перегрузок нет, load совпадает с числом назначенных заявок, ошибок нет")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/backlog_dispatch.py
+"""
+Пропускная способность пакетного назначения очереди заявок (заявок/сек).
+
+Сравнивает dispatch_backlog с прежним подходом "запрос и коммит на каждую заявку":
+    python -m benchmarks.backlog_dispatch --orders 10000 --disinsectors 200
+"""
+
+import argparse
+from datetime import datetime
+
+from app.assignment import available_disinsectors_query, dispatch_backlog
+from app.model import Disinsector, Order
+from benchmarks.common import drop_db, make_app, seed, timer
+from database import db
+
+
+def per_order_dispatch(limit):
+    # Старая схема assign_and_notify_disinsector, без отправки сообщений
+    orders = Order.query.filter(Order.disinsector_id.is_(None)).order_by(Order.id).limit(limit).all()
+    for order in orders:
+        available = available_disinsectors_query().order_by(Disinsector.last_assigned).all()
+        if not available:
+            break
+        disinsector = available[0]
+        order.disinsector_id = disinsector.id
+        disinsector.last_assigned = datetime.utcnow()
+        disinsector.load += 1
+        db.session.commit()
+    return len(orders)
+
+
+def run(orders, disinsectors, legacy_sample):
+    max_load = orders // disinsectors + 1
+    results = {}
+
+    app = make_app()
+    with app.app_context():
+        seed(disinsectors=disinsectors, orders=orders, max_load=max_load, assigned=False)
+        with timer() as t:
+            assignments = dispatch_backlog()
+        assigned = sum(len(a['orders']) for a in assignments.values())
+        results['batch'] = (assigned, t['seconds'], len(assignments))
+    drop_db(app.config['BENCH_DB_PATH'])
+
+    if legacy_sample:
+        app = make_app()
+        with app.app_context():
+            seed(disinsectors=disinsectors, orders=legacy_sample, max_load=max_load, assigned=False)
+            with timer() as t:
+                assigned = per_order_dispatch(legacy_sample)
+            results['per-order'] = (assigned, t['seconds'], assigned)
+        drop_db(app.config['BENCH_DB_PATH'])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--disinsectors', type=int, default=200)
+    parser.add_argument('--legacy-sample', type=int, default=1000,
+                        help='сколько заявок прогнать старым способом (0 - пропустить)')
+    args = parser.parse_args()
+
+    for name, (assigned, seconds, notified) in run(args.orders, args.disinsectors, args.legacy_sample).items():
+        print(f"{name:<10} назначено {assigned:>7} за {seconds:8.3f} с -> {assigned / seconds:10.0f} заявок/с, "
+              f"уведомлений: {notified}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# benchmarks/bulk_import.py
+"""
+Пропускная способность массового импорта заявок (/api/orders/bulk), строк/сек.
+
+Генерирует выгрузку колл-центра (часть телефонов повторяется, часть строк с ошибками),
+отправляет ее как NDJSON и как CSV и сравнивает с прежним путем /api/create_order:
+поиск клиента и два коммита на каждую заявку.
+    python -m benchmarks.bulk_import --rows 100000
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+
+from sqlalchemy import func
+
+from app.model import Client, Order
+from benchmarks.common import drop_db, make_app, timer
+from database import db
+
+FIELDS = ('client_name', 'phone_number', 'address', 'object_type', 'insect_quantity', 'disinsect_experience')
+
+
+def generate_rows(count, seed_value=7, invalid_every=1000):
+    rnd = random.Random(seed_value)
+    phones = max(1, count * 2 // 3)
+    for i in range(1, count + 1):
+        phone = f'+7 (900) {rnd.randint(1, phones):07d}'
+        row = {
+            'client_name': f'Лид {i}',
+            'phone_number': phone,
+            'address': f'ул. Импортная, д. {i}',
+            'object_type': rnd.choice(('home', 'apartment', 'office')),
+            'insect_quantity': rnd.choice(('less_50', '50_200', 'more_200')),
+            'disinsect_experience': rnd.random() < 0.3,
+        }
+        if invalid_every and i % invalid_every == 0:
+            row['phone_number'] = 'нет'
+        yield row
+
+
+def as_ndjson(rows):
+    return b''.join(json.dumps(row, ensure_ascii=False).encode() + b'\n' for row in rows)
+
+
+def as_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def per_row_import(rows):
+    # Прежняя схема /api/create_order: запрос клиента и по коммиту на клиента и на заявку
+    for row in rows:
+        client = Client.query.filter_by(phone=row['phone_number']).first()
+        if not client:
+            client = Client(name=row['client_name'], phone=row['phone_number'], address=row['address'])
+            db.session.add(client)
+            db.session.commit()
+        db.session.add(Order(client_id=client.id, object_type=row['object_type'],
+                             insect_quantity=row['insect_quantity'],
+                             disinsect_experience=row['disinsect_experience'], order_status='Новая'))
+        db.session.commit()
+
+
+def bulk_import(body, content_type):
+    app = make_app()
+    client = app.test_client()
+    try:
+        with timer() as result:
+            response = client.post('/api/orders/bulk', data=io.BytesIO(body), content_type=content_type,
+                                   headers={'X-API-Key': app.config['API_KEY']})
+        payload = response.get_json()
+        with app.app_context():
+            orders = db.session.query(func.count(Order.id)).scalar()
+            clients = db.session.query(func.count(Client.id)).scalar()
+    finally:
+        drop_db(app.config['BENCH_DB_PATH'])
+    return response.status_code, payload, orders, clients, result['seconds']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--legacy-sample', type=int, default=2000, help='строк для прежнего пути')
+    args = parser.parse_args()
+
+    rows = list(generate_rows(args.rows))
+    for name, body, content_type in (
+        ('ndjson', as_ndjson(rows), 'application/x-ndjson'),
+        ('csv', as_csv(rows), 'text/csv'),
+    ):
+        status, payload, orders, clients, seconds = bulk_import(body, content_type)
+        print(f"{name:>8}: HTTP {status}, строк {args.rows} ({len(body) / 1e6:.1f} МБ) за {seconds:6.2f} с -> "
+              f"{args.rows / seconds:8.0f} строк/с; заявок {orders}, клиентов {clients}, "
+              f"ошибок {payload['failed']}")
+
+    sample = rows[:args.legacy_sample]
+    app = make_app()
+    try:
+        with app.app_context(), timer() as result:
+            per_row_import(sample)
+    finally:
+        drop_db(app.config['BENCH_DB_PATH'])
+    print(f"{'per-row':>8}: строк {len(sample)} за {result['seconds']:6.2f} с -> "
+          f"{len(sample) / result['seconds']:8.0f} строк/с")
+
+
+if __name__ == '__main__':
+    main()
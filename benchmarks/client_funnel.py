@@ -0,0 +1,217 @@
+# benchmarks/client_funnel.py
+"""
+Сквозная нагрузка на воронку клиентского бота: сколько клиентов одновременно проходят анкету.
+
+Локальная заглушка Bot API (benchmarks.fake_telegram) отдает настоящему диспетчеру
+client_bot через getUpdates сценарные апдейты N виртуальных клиентов. Каждый клиент
+ждет ответа бота в свой чат и только тогда отправляет следующий шаг ClientForm:
+имя -> "Начать" -> объект -> количество -> опыт -> телефон -> адрес (создание и
+назначение заявки). Считаются пропускная способность и p50/p95/p99 задержки каждого
+шага. Сеть не нужна; если анкета не дошла до конца или заявок в базе меньше, чем
+завершенных анкет, код возврата 1 (для CI):
+    python -m benchmarks.client_funnel --users 10 50 200 --rounds 3
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.common import drop_db, make_app, percentile, seed
+from benchmarks.fake_telegram import FakeTelegramServer
+from config import Config
+
+BOT_TOKEN = '700001:BENCHCLIENT'
+ERROR_REPLY = 'Произошла ошибка'
+
+_ids = itertools.count(1)
+
+
+def _chat(chat_id):
+    return {'id': chat_id, 'type': 'private'}
+
+
+def _user(chat_id):
+    return {'id': chat_id, 'is_bot': False, 'first_name': 'Клиент'}
+
+
+def message(chat_id, text=None, contact=None):
+    update = {'message_id': next(_ids), 'date': int(time.time()), 'chat': _chat(chat_id), 'from': _user(chat_id)}
+    if text is not None:
+        update['text'] = text
+    if contact is not None:
+        update['contact'] = {'phone_number': contact, 'first_name': 'Клиент', 'user_id': chat_id}
+    return {'message': update}
+
+
+def callback(chat_id, data):
+    return {'callback_query': {
+        'id': str(next(_ids)),
+        'from': _user(chat_id),
+        'chat_instance': str(chat_id),
+        'data': data,
+        'message': {'message_id': next(_ids), 'date': int(time.time()), 'chat': _chat(chat_id), 'text': '...'},
+    }}
+
+
+def phone_step(chat_id, phone):
+    # Половина клиентов делится контактом, половина вводит номер текстом
+    if chat_id % 2:
+        return message(chat_id, contact=f'+{phone}')
+    return message(chat_id, text=f'+{phone[0]} ({phone[1:4]}) {phone[4:]}')
+
+
+# (шаг, апдейт клиента); ответ на каждый шаг - одно сообщение бота в чат клиента
+FUNNEL = (
+    ('start', lambda chat_id, phone: message(chat_id, '/start')),
+    ('name', lambda chat_id, phone: message(chat_id, f'Клиент {chat_id}')),
+    ('start_button', lambda chat_id, phone: callback(chat_id, 'start')),
+    ('object_type', lambda chat_id, phone: callback(chat_id, 'object_apartment')),
+    ('insect_quantity', lambda chat_id, phone: callback(chat_id, 'quantity_less_50')),
+    ('disinsect_experience', lambda chat_id, phone: callback(chat_id, 'experience_no')),
+    ('phone', phone_step),
+    ('address', lambda chat_id, phone: message(chat_id, f'ул. Тестовая, д. {chat_id % 1000 + 1}')),
+)
+
+
+class FunnelDriver:
+    """
+    Виртуальные клиенты поверх заглушки: шаг отправляется через push_update
+    (или deliver, например POST на webhook), задержка - время до sendMessage бота в этот чат.
+    """
+    def __init__(self, server, token, step_timeout, deliver=None):
+        self.server = server
+        self.token = token
+        self.step_timeout = step_timeout
+        self.deliver = deliver or self.push
+        self.latencies = defaultdict(list)
+        self.completed = 0
+        self.failed = 0
+        self._waiters = {}
+        server.listeners.append(self.on_call)
+
+    def on_call(self, token, method, params):
+        if token != self.token or method != 'sendMessage':
+            return
+        waiter = self._waiters.pop(int(params.get('chat_id', 0)), None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(params.get('text', ''))
+
+    async def push(self, update):
+        self.server.push_update(self.token, update)
+
+    async def step(self, chat_id, update):
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id] = waiter
+        started = time.perf_counter()
+        await self.deliver(update)
+        try:
+            text = await asyncio.wait_for(waiter, self.step_timeout)
+        finally:
+            self._waiters.pop(chat_id, None)
+        return text, time.perf_counter() - started
+
+    async def virtual_user(self, chat_id, rounds):
+        phone = f'7901{chat_id % 10 ** 7:07d}'
+        for _ in range(rounds):
+            try:
+                for name, build in FUNNEL:
+                    text, latency = await self.step(chat_id, build(chat_id, phone))
+                    self.latencies[name].append(latency)
+                    if text.startswith(ERROR_REPLY):
+                        raise RuntimeError(text)
+            except (asyncio.TimeoutError, RuntimeError):
+                self.failed += 1
+            else:
+                self.completed += 1
+
+
+async def run_level(server, users, rounds, step_timeout, base_chat_id, deliver=None):
+    from app.bot_db import run_db
+    from app.model import Order
+
+    def count_orders():
+        return Order.query.count()
+
+    driver = FunnelDriver(server, BOT_TOKEN, step_timeout, deliver)
+    orders_before = await run_db(count_orders)
+    started = time.perf_counter()
+    await asyncio.gather(*(driver.virtual_user(base_chat_id + i, rounds) for i in range(users)))
+    elapsed = time.perf_counter() - started
+    server.listeners.remove(driver.on_call)
+    orders = await run_db(count_orders) - orders_before
+
+    updates = sum(len(values) for values in driver.latencies.values())
+    print(f"\nклиентов {users}, анкет {users * rounds}: завершено {driver.completed}, ошибок {driver.failed}, "
+          f"заявок в базе {orders}; {elapsed:.2f} с -> {driver.completed / elapsed:.1f} анкет/с, "
+          f"{updates / elapsed:.0f} апдейтов/с")
+    print(f"{'шаг':<22}{'n':>7}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    for name, _ in FUNNEL:
+        values = driver.latencies[name]
+        if values:
+            p50, p95, p99 = (percentile(values, q) * 1000 for q in (50, 95, 99))
+            label = f'{name} (заявка)' if name == 'address' else name
+            print(f"{label:<22}{len(values):>7}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+    return driver.failed == 0 and orders == driver.completed
+
+
+async def run_all(user_levels, rounds, port, disinsectors, step_timeout):
+    server = FakeTelegramServer(port=port, long_poll_hold=10)
+    await server.start()
+    fsm_dir = tempfile.mkdtemp(prefix='bench_fsm_')
+    # Настройки читаются client_bot при импорте: бот, хранилище FSM и адрес Bot API
+    Config.CLIENT_BOT_TOKEN = BOT_TOKEN
+    Config.TELEGRAM_API_URL = server.base_url
+    Config.FSM_STORAGE_PATH = os.path.join(fsm_dir, 'fsm_state.db')
+    import client_bot
+    from app.bot_db import init_bot_db, shutdown_bot_db
+
+    # Каждая заявка пишет строку в лог, в замер это не должно попадать
+    client_bot.logger.setLevel(logging.WARNING)
+    logging.getLogger('aiogram').setLevel(logging.WARNING)
+
+    app = make_app()
+    ok = True
+    try:
+        with app.app_context():
+            seed(disinsectors=disinsectors, orders=0, max_load=10 ** 6)
+        init_bot_db(app)
+        polling = asyncio.create_task(
+            client_bot.dp.start_polling(client_bot.bot_client, handle_signals=False, close_bot_session=False)
+        )
+        for index, users in enumerate(user_levels):
+            ok &= await run_level(server, users, rounds, step_timeout, (index + 1) * 10 ** 6)
+        await client_bot.dp.stop_polling()
+        await polling
+    finally:
+        await client_bot.bot_client.session.close()
+        await client_bot.storage.close()
+        shutdown_bot_db()
+        drop_db(app.config['BENCH_DB_PATH'])
+        for name in os.listdir(fsm_dir):
+            os.unlink(os.path.join(fsm_dir, name))
+        os.rmdir(fsm_dir)
+        await server.stop()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[10, 50, 200], help='одновременных клиентов')
+    parser.add_argument('--rounds', type=int, default=3, help='анкет на клиента')
+    parser.add_argument('--disinsectors', type=int, default=20)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--step-timeout', type=float, default=30.0, help='сколько ждать ответа бота на шаг, с')
+    args = parser.parse_args()
+    ok = asyncio.run(run_all(args.users, args.rounds, args.port, args.disinsectors, args.step_timeout))
+    print("\nOK" if ok else "\nFAIL: не все анкеты завершились заявкой")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+# benchmarks/client_webhook.py
+"""
+Клиентский бот: long polling против webhook с очередью app.update_queue.
+
+Bot API заменяет заглушка benchmarks.fake_telegram. В режиме polling апдейты отдаются
+через getUpdates, в режиме webhook их POST-ом доставляет локальный заменитель Telegram:
+не больше --connections запросов одновременно (max_connections из setWebhook), апдейты
+одного чата по порядку, на 503 - повтор через --retry-delay. Для каждого режима:
+
+- funnel: N клиентов проходят анкету, каждый ждет ответа бота перед следующим шагом
+  (пропускная способность и задержки, как в benchmarks.client_funnel);
+- burst: каждый из M чатов отправляет все шаги анкеты подряд, не дожидаясь ответов
+  (быстрые нажатия или накопившиеся за простой апдейты). Считаются апдейты в секунду
+  и анкеты, дошедшие до заявки: шаги одного чата, обработанные вперемешку, ломают FSM.
+
+В режиме webhook burst заканчивается остановкой сразу после доставки последнего апдейта:
+принятые, но не обработанные апдейты должны дообработаться (graceful drain). Маленькая
+--max-pending включает отказы 503 и повторы. Код возврата 1, если в режиме webhook
+потерян апдейт или анкета не дошла до заявки (для CI):
+    python -m benchmarks.client_webhook --users 50 --burst-chats 300 --workers 32 --max-pending 200
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import aiohttp
+
+from benchmarks.client_funnel import BOT_TOKEN, ERROR_REPLY, FUNNEL, run_level
+from benchmarks.common import drop_db, make_app, seed
+from benchmarks.fake_telegram import FakeTelegramServer
+from config import Config
+
+WEBHOOK_SECRET = 'bench-secret'
+
+
+class WebhookSender:
+    """
+    Заменитель Telegram на стороне доставки: POST апдейтов на webhook бота с повторами.
+    """
+    def __init__(self, url, connections, retry_delay):
+        self.url = url
+        self.retry_delay = retry_delay
+        self.retries = 0
+        self._semaphore = asyncio.Semaphore(connections)
+        self._update_ids = itertools.count(1)
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(headers={'X-Telegram-Bot-Api-Secret-Token': WEBHOOK_SECRET})
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def deliver(self, update):
+        update = dict(update, update_id=next(self._update_ids))
+        while True:
+            async with self._semaphore:
+                async with self._session.post(self.url, json=update) as response:
+                    if response.status == 200:
+                        return
+                    if response.status != 503:
+                        raise RuntimeError(f"webhook ответил {response.status}")
+            self.retries += 1
+            await asyncio.sleep(self.retry_delay)
+
+
+class ReplyCounter:
+    """
+    Ответы бота (sendMessage) по чатам.
+    """
+    def __init__(self, server):
+        self.server = server
+        self.replies = defaultdict(list)
+        server.listeners.append(self.on_call)
+
+    def on_call(self, token, method, params):
+        if token == BOT_TOKEN and method == 'sendMessage':
+            self.replies[int(params.get('chat_id', 0))].append(params.get('text', ''))
+
+    def total(self):
+        return sum(len(texts) for texts in self.replies.values())
+
+    def completed(self, chat_ids):
+        return sum(
+            1 for chat_id in chat_ids
+            if len(self.replies[chat_id]) == len(FUNNEL) and not self.replies[chat_id][-1].startswith(ERROR_REPLY)
+        )
+
+    async def wait(self, expected, idle_timeout):
+        """
+        Ждет expected ответов или idle_timeout секунд без новых ответов.
+        """
+        last, last_change = self.total(), time.perf_counter()
+        while last < expected and time.perf_counter() - last_change < idle_timeout:
+            await asyncio.sleep(0.02)
+            if self.total() != last:
+                last, last_change = self.total(), time.perf_counter()
+
+    def close(self):
+        self.server.listeners.remove(self.on_call)
+
+
+def burst_updates(chat_ids):
+    return {chat_id: [build(chat_id, f'7902{chat_id % 10 ** 7:07d}') for _, build in FUNNEL] for chat_id in chat_ids}
+
+
+async def count_orders():
+    from app.bot_db import run_db
+    from app.model import Order
+    return await run_db(lambda: Order.query.count())
+
+
+def report_burst(mode, chat_count, elapsed, counter, chat_ids, orders, extra=''):
+    updates = chat_count * len(FUNNEL)
+    completed = counter.completed(chat_ids)
+    # Скорость считается по ответам бота: апдейт, потерянный в гонке за FSM, обработанным не считается
+    print(f"burst {mode:<8} чатов {chat_count}, апдейтов {updates}: {elapsed:.2f} с -> "
+          f"{counter.total() / elapsed:.0f} ответов/с; ответов {counter.total()}/{updates}, "
+          f"анкет до заявки {completed}/{chat_count}, заявок {orders}{extra}")
+    return completed, orders
+
+
+async def run_polling(client_bot, server, args):
+    polling = asyncio.create_task(
+        client_bot.dp.start_polling(client_bot.bot_client, handle_signals=False, close_bot_session=False)
+    )
+    try:
+        print("\n=== polling ===")
+        await run_level(server, args.users, 1, args.step_timeout, 1 * 10 ** 6)
+
+        chat_ids = range(2 * 10 ** 6, 2 * 10 ** 6 + args.burst_chats)
+        counter = ReplyCounter(server)
+        orders_before = await count_orders()
+        started = time.perf_counter()
+        for updates in burst_updates(chat_ids).values():
+            for update in updates:
+                server.push_update(BOT_TOKEN, update)
+        await counter.wait(len(chat_ids) * len(FUNNEL), args.idle_timeout)
+        elapsed = time.perf_counter() - started
+        if counter.total() < len(chat_ids) * len(FUNNEL):
+            elapsed -= args.idle_timeout
+        report_burst('polling', len(chat_ids), elapsed, counter, chat_ids, await count_orders() - orders_before)
+        counter.close()
+    finally:
+        await client_bot.dp.stop_polling()
+        await polling
+
+
+async def run_webhook(client_bot, server, args):
+    from app.fsm_storage import create_fsm_storage
+
+    # Остановка polling закрыла хранилище FSM (shutdown диспетчера), для webhook нужно новое
+    if 'polling' in args.modes:
+        client_bot.dp.fsm.storage = create_fsm_storage()
+    stop = asyncio.Event()
+    webhook = asyncio.create_task(client_bot.run_webhook(stop))
+    # setWebhook вызывается после запуска сервера: по нему видно, что можно слать апдейты
+    while not server.calls_of('setWebhook'):
+        await asyncio.sleep(0.01)
+    url = f"http://127.0.0.1:{args.webhook_port}{Config.CLIENT_WEBHOOK_PATH}"
+    ok = True
+    try:
+        async with WebhookSender(url, args.connections, args.retry_delay) as sender:
+            print(f"\n=== webhook (обработчиков {args.workers}, очередь {args.max_pending}) ===")
+            ok &= await run_level(server, args.users, 1, args.step_timeout, 3 * 10 ** 6, sender.deliver)
+
+            chat_ids = range(4 * 10 ** 6, 4 * 10 ** 6 + args.burst_chats)
+            counter = ReplyCounter(server)
+            orders_before = await count_orders()
+            sender.retries = 0
+            started = time.perf_counter()
+
+            async def send_chat(updates):
+                for update in updates:
+                    await sender.deliver(update)
+
+            await asyncio.gather(*(send_chat(updates) for updates in burst_updates(chat_ids).values()))
+            delivered = time.perf_counter() - started
+            # Остановка сразу после доставки: принятое должно дообработаться
+            stop.set()
+            dropped = await webhook
+            elapsed = time.perf_counter() - started
+            completed, orders = report_burst(
+                'webhook', len(chat_ids), elapsed, counter, chat_ids, await count_orders() - orders_before,
+                f"\n               доставка {delivered:.2f} с, повторов после 503: {sender.retries}, "
+                f"не обработано при остановке: {dropped}",
+            )
+            counter.close()
+            ok &= dropped == 0 and completed == len(chat_ids) == orders
+    finally:
+        stop.set()
+        await asyncio.gather(webhook, return_exceptions=True)
+    return ok
+
+
+async def run_all(args):
+    server = FakeTelegramServer(port=args.port, long_poll_hold=10)
+    await server.start()
+    fsm_dir = tempfile.mkdtemp(prefix='bench_fsm_')
+    # Настройки читаются client_bot при импорте и при запуске webhook
+    Config.CLIENT_BOT_TOKEN = BOT_TOKEN
+    Config.TELEGRAM_API_URL = server.base_url
+    Config.FSM_STORAGE_PATH = os.path.join(fsm_dir, 'fsm_state.db')
+    Config.WEBHOOK_BASE_URL = f'http://127.0.0.1:{args.webhook_port}'
+    Config.WEBHOOK_SECRET = WEBHOOK_SECRET
+    Config.CLIENT_WEBHOOK_HOST = '127.0.0.1'
+    Config.CLIENT_WEBHOOK_PORT = args.webhook_port
+    Config.CLIENT_WEBHOOK_WORKERS = args.workers
+    Config.CLIENT_WEBHOOK_MAX_PENDING = args.max_pending
+    Config.CLIENT_WEBHOOK_DRAIN_TIMEOUT = args.drain_timeout
+    import client_bot
+    from app.bot_db import init_bot_db, shutdown_bot_db
+
+    client_bot.logger.setLevel(logging.WARNING)
+    logging.getLogger('aiogram').setLevel(logging.WARNING)
+
+    app = make_app()
+    try:
+        with app.app_context():
+            seed(disinsectors=args.disinsectors, orders=0, max_load=10 ** 6)
+        init_bot_db(app)
+        if 'polling' in args.modes:
+            await run_polling(client_bot, server, args)
+        ok = await run_webhook(client_bot, server, args) if 'webhook' in args.modes else True
+    finally:
+        await client_bot.bot_client.session.close()
+        await client_bot.dp.fsm.storage.close()
+        shutdown_bot_db()
+        drop_db(app.config['BENCH_DB_PATH'])
+        for name in os.listdir(fsm_dir):
+            os.unlink(os.path.join(fsm_dir, name))
+        os.rmdir(fsm_dir)
+        await server.stop()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=('polling', 'webhook'), default=['polling', 'webhook'])
+    parser.add_argument('--users', type=int, default=50, help='клиентов в сценарии funnel')
+    parser.add_argument('--burst-chats', type=int, default=300, help='чатов в сценарии burst')
+    parser.add_argument('--workers', type=int, default=32, help='CLIENT_WEBHOOK_WORKERS')
+    parser.add_argument('--max-pending', type=int, default=200, help='CLIENT_WEBHOOK_MAX_PENDING')
+    parser.add_argument('--connections', type=int, default=40, help='одновременных POST заменителя Telegram')
+    parser.add_argument('--retry-delay', type=float, default=0.2, help='пауза перед повтором после 503, с')
+    parser.add_argument('--drain-timeout', type=float, default=30.0, help='CLIENT_WEBHOOK_DRAIN_TIMEOUT')
+    parser.add_argument('--idle-timeout', type=float, default=3.0, help='polling: сколько ждать новых ответов, с')
+    parser.add_argument('--step-timeout', type=float, default=30.0)
+    parser.add_argument('--disinsectors', type=int, default=20)
+    parser.add_argument('--port', type=int, default=8081, help='порт заглушки Bot API')
+    parser.add_argument('--webhook-port', type=int, default=8082)
+    args = parser.parse_args()
+    ok = asyncio.run(run_all(args))
+    print("\nOK" if ok else "\nFAIL: webhook потерял апдейты или анкеты не дошли до заявки")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+# benchmarks/common.py
+"""
+Общие помощники бенчмарков: приложение на отдельной базе и быстрое наполнение данными.
+"""
+
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert
+
+from config import Config
+from database import db
+
+STATUSES = ('Новая', 'В процессе', 'Выполнено')
+
+
+def bench_config(db_path):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        WTF_CSRF_ENABLED = False
+        TESTING = True
+    return BenchConfig
+
+
+def make_app(db_path=None):
+    """
+    Приложение на временной (или указанной) базе SQLite с созданными таблицами.
+    """
+    from app import create_app
+
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='bench_', suffix='.db')
+        os.close(fd)
+        os.unlink(db_path)
+    app = create_app(bench_config(db_path))
+    with app.app_context():
+        db.create_all()
+    app.config['BENCH_DB_PATH'] = db_path
+    return app
+
+
+def drop_db(db_path):
+    """
+    Удаляет временную базу вместе с файлами WAL.
+    """
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
+
+
+def seed(disinsectors=10, orders=1000, clients=None, max_load=5, load=0, assigned=True,
+         status_weights=(1, 1, 1), seed_value=42, unassigned_share=0.0):
+    """
+    Наполняет текущую базу синтетическими данными пакетными INSERT.
+
+    assigned=False оставляет все заявки новыми и без дезинсектора (очередь на назначение),
+    unassigned_share - доля таких заявок среди назначенных.
+    """
+    from app.model import Client, Disinsector, Order
+
+    rnd = random.Random(seed_value)
+    clients = clients or max(1, orders // 2)
+    now = datetime.utcnow()
+
+    db.session.execute(insert(Disinsector), [
+        {
+            'name': f'Дезинсектор {i}',
+            'email': f'disinsector{i}@example.com',
+            'password': 'x',
+            'token': f'{100000 + i}:BENCH{i:06d}',
+            'telegram_user_id': 500000 + i,
+            'load': load,
+            'max_load': max_load,
+            'last_assigned': now - timedelta(minutes=i),
+        }
+        for i in range(1, disinsectors + 1)
+    ])
+    db.session.execute(insert(Client), [
+        {'name': f'Клиент {i}', 'phone': f'7900{i:07d}', 'address': f'ул. Тестовая, д. {i}'}
+        for i in range(1, clients + 1)
+    ])
+
+    batch = []
+    for i in range(1, orders + 1):
+        if assigned and not (unassigned_share and rnd.random() < unassigned_share):
+            status = rnd.choices(STATUSES, weights=status_weights)[0]
+            disinsector_id = rnd.randint(1, disinsectors) if disinsectors else None
+        else:
+            status, disinsector_id = 'Новая', None
+        batch.append({
+            'client_id': rnd.randint(1, clients),
+            'disinsector_id': disinsector_id,
+            'order_status': status,
+            'object_type': rnd.choice(('home', 'apartment', 'office')),
+            'insect_quantity': rnd.choice(('less_50', '50_200', 'more_200')),
+            'disinsect_experience': rnd.random() < 0.3,
+            'created_at': now - timedelta(seconds=orders - i),
+        })
+        if len(batch) >= 10000:
+            db.session.execute(insert(Order), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Order), batch)
+    db.session.commit()
+
+
+class QueryCounter:
+    """
+    Считает SQL-запросы движка и время их выполнения (из всех потоков).
+    """
+    def __init__(self, engine):
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.seconds = 0.0
+        event.listen(engine, 'before_cursor_execute', self.before)
+        event.listen(engine, 'after_cursor_execute', self.after)
+
+    def before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    def after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop('query_started', time.perf_counter())
+        with self.lock:
+            self.queries += 1
+            self.seconds += elapsed
+
+
+@contextmanager
+def timer():
+    result = {}
+    start = time.perf_counter()
+    yield result
+    result['seconds'] = time.perf_counter() - start
+
+
+def percentile(values, q):
+    """
+    Перцентиль q (0-100) методом ближайшего ранга; None для пустого списка.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
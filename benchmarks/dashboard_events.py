@@ -0,0 +1,135 @@
+# benchmarks/dashboard_events.py
+"""
+Нагрузка на базу от открытых дашбордов: обновление страницы против потока SSE.
+
+clients дезинсекторов держат открытым личный кабинет: в режиме refresh каждый
+перезагружает страницу раз в refresh секунд, в режиме sse слушает
+/disinsector/orders/events. Параллельно заявки меняются с частотой changes в секунду.
+Замер идет после первой загрузки страниц, отдельно без изменений и с изменениями.
+Считаются SQL-запросы, время в базе, отданные байты и строки заявок:
+    python -m benchmarks.dashboard_events --orders 20000 --clients 20 --seconds 10
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from sqlalchemy import update
+
+from app.model import Order, ORDER_STATUSES
+from benchmarks.common import QueryCounter, drop_db, make_app, seed
+from database import db
+
+
+def change_orders(app, rate, seconds, orders):
+    # Оператор в отдельном потоке меняет статусы случайных заявок
+    if rate <= 0:
+        time.sleep(seconds)
+        return 0
+    rnd = random.Random(1)
+    deadline = time.monotonic() + seconds
+    changed = 0
+    with app.app_context():
+        while time.monotonic() < deadline:
+            db.session.execute(
+                update(Order)
+                .where(Order.id == rnd.randint(1, orders))
+                .values(order_status=rnd.choice(ORDER_STATUSES))
+            )
+            db.session.commit()
+            changed += 1
+            time.sleep(1 / rate)
+    return changed
+
+
+def open_dashboard(app, disinsector_id, ready, start):
+    # Первая загрузка страницы одинакова в обоих режимах и в замер не входит
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['disinsector_id'] = disinsector_id
+    page = client.get('/disinsector/dashboard').data.decode()
+    ready.wait()
+    start.wait()
+    return client, page
+
+
+def refresh_client(app, disinsector_id, refresh, seconds, stats, ready, start):
+    client, _ = open_dashboard(app, disinsector_id, ready, start)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        time.sleep(refresh)
+        response = client.get('/disinsector/dashboard')
+        stats['bytes'] += len(response.data)
+        stats['rows'] += response.data.count(b'data-order-id=') - 1
+
+
+def sse_client(app, disinsector_id, seconds, stats, ready, start):
+    client, page = open_dashboard(app, disinsector_id, ready, start)
+    cursor = page.split('cursor=', 1)[1].split('"', 1)[0]
+    response = client.get(f'/disinsector/orders/events?cursor={cursor}', buffered=False)
+    for chunk in response.response:
+        stats['bytes'] += len(chunk)
+        stats['rows'] += chunk.count(b'"id": ')
+    response.close()
+
+
+def run(mode, orders, disinsectors, clients, seconds, refresh, changes):
+    app = make_app()
+    app.config.update(SSE_POLL_INTERVAL=1.0, SSE_LAG=0.5)
+    try:
+        with app.app_context():
+            seed(disinsectors=disinsectors, orders=orders, max_load=orders)
+            counter = QueryCounter(db.engine)
+        time.sleep(app.config['SSE_LAG'])
+
+        app.config['SSE_MAX_DURATION'] = seconds
+        stats = [{'bytes': 0, 'rows': 0} for _ in range(clients)]
+        ready, start = threading.Barrier(clients + 1), threading.Barrier(clients + 1)
+        threads = []
+        for i in range(clients):
+            if mode == 'refresh':
+                target, args = refresh_client, (app, i % disinsectors + 1, refresh, seconds, stats[i], ready, start)
+            else:
+                target, args = sse_client, (app, i % disinsectors + 1, seconds, stats[i], ready, start)
+            threads.append(threading.Thread(target=target, args=args))
+        writer_result = {}
+        writer = threading.Thread(target=lambda: writer_result.update(changed=change_orders(app, changes, seconds, orders)))
+
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        queries_before, seconds_before = counter.queries, counter.seconds
+        start.wait()
+        writer.start()
+        for thread in threads + [writer]:
+            thread.join()
+        # Запросы оператора в нагрузку дашбордов не входят: по одному UPDATE на изменение
+        queries = counter.queries - queries_before - writer_result['changed']
+        db_seconds = counter.seconds - seconds_before
+    finally:
+        drop_db(app.config['BENCH_DB_PATH'])
+
+    sent = sum(s['bytes'] for s in stats)
+    rows = sum(s['rows'] for s in stats)
+    print(f"{mode:>8}: клиентов {clients}, изменений {writer_result['changed']} за {seconds} с -> "
+          f"запросов {queries} ({queries / seconds:.0f}/с), время в базе {db_seconds:.2f} с, "
+          f"отдано {sent / 1e6:.2f} МБ, строк заявок {rows}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--disinsectors', type=int, default=20)
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--refresh', type=float, default=2.0, help='период обновления страницы, с')
+    parser.add_argument('--changes', type=float, default=5.0, help='изменений заявок в секунду')
+    args = parser.parse_args()
+    for changes in (0, args.changes):
+        for mode in ('refresh', 'sse'):
+            run(mode, args.orders, args.disinsectors, args.clients, args.seconds, args.refresh, changes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# benchmarks/dashboard_render.py
+"""
+Повторные открытия дашбордов: условные GET (304) и кэш строк таблиц против полной отрисовки.
+
+Администратор листает первые страницы по фильтрам статуса, дезинсекторы обновляют
+личный кабинет; браузер присылает If-None-Match с прошлым ETag. Между проходами
+часть заявок меняется (--changes за проход). Сначала проверяется, что после изменения
+страница показывает новый статус, затем замеряются время ответа, SQL-запросы и доля 304:
+    python -m benchmarks.dashboard_render --orders 20000 --rounds 20
+"""
+
+import argparse
+import random
+import time
+
+from sqlalchemy import update
+
+from app import dashboard_cache
+from app.model import Order, ORDER_STATUSES, STATUS_DONE
+from benchmarks.common import QueryCounter, drop_db, make_app, seed, timer
+from database import db
+
+LAG = 0.2
+
+
+def change_orders(app, count, orders, rnd):
+    with app.app_context():
+        for _ in range(count):
+            db.session.execute(
+                update(Order).where(Order.id == rnd.randint(1, orders)).values(order_status=rnd.choice(ORDER_STATUSES))
+            )
+        db.session.commit()
+    # Изменения должны устояться, иначе страница отдается без валидаторов и без кэша
+    time.sleep(LAG)
+
+
+def login(app, key, value):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session[key] = value
+    return client
+
+
+def check_fresh(app):
+    # После смены статуса кабинет и админ-панель не должны отдавать 304 или старые строки
+    admin, disinsector = login(app, 'admin_id', 1), login(app, 'disinsector_id', 1)
+    with app.app_context():
+        order_id = (db.session.query(Order.id).filter_by(disinsector_id=1)
+                    .order_by(Order.created_at.desc(), Order.id.desc()).limit(1).scalar())
+    urls = ((admin, f'/admin/dashboard?status={STATUS_DONE}'), (disinsector, '/disinsector/dashboard'))
+    etags = {}
+    for client, url in urls:
+        etags[url] = client.get(url).headers['ETag']
+        if client.get(url, headers={'If-None-Match': etags[url]}).status_code != 304:
+            return False
+    with app.app_context():
+        db.session.execute(update(Order).where(Order.id == order_id).values(order_status=STATUS_DONE))
+        db.session.commit()
+    time.sleep(LAG)
+    marker = f'data-order-id="{order_id}"'.encode()
+    for client, url in urls:
+        response = client.get(url, headers={'If-None-Match': etags[url]})
+        row = response.data.split(marker, 1)[-1].split(b'</tr>', 1)[0]
+        if response.status_code != 200 or f'"order_status">{STATUS_DONE}<'.encode() not in row:
+            return False
+    return b'__csrf_token__' not in response.data
+
+
+def run(cached, orders, disinsectors, rounds, changes):
+    dashboard_cache.fragments.maxsize = 256 if cached else 0
+    dashboard_cache.fragments.clear()
+    dashboard_cache.fragments.hits = dashboard_cache.fragments.misses = 0
+    app = make_app()
+    app.config['SSE_LAG'] = LAG
+    try:
+        with app.app_context():
+            seed(disinsectors=disinsectors, orders=orders, max_load=orders)
+            counter = QueryCounter(db.engine)
+        time.sleep(LAG)
+        if cached:
+            print(f"проверка свежести после изменения: {'OK' if check_fresh(app) else 'FAIL'}")
+
+        # Второй администратор открывает те же страницы без кэша браузера: ему помогает только кэш строк
+        admin, other_admin = login(app, 'admin_id', 1), login(app, 'admin_id', 2)
+        cabinets = [login(app, 'disinsector_id', i + 1) for i in range(disinsectors)]
+        admin_urls = ['/admin/dashboard'] + [f'/admin/dashboard?status={s}' for s in ORDER_STATUSES]
+        pages = [(client, url) for client in (admin, other_admin) for url in admin_urls]
+        pages += [(cabinet, '/disinsector/dashboard') for cabinet in cabinets]
+        etags = {}
+        rnd = random.Random(5)
+        requests = not_modified = 0
+        queries_before, seconds = counter.queries, 0.0
+        for round_no in range(rounds):
+            if round_no and changes:
+                queries_changes = counter.queries
+                change_orders(app, changes, orders, rnd)
+                queries_before += counter.queries - queries_changes
+            for client, url in pages:
+                key = (id(client), url)
+                headers = {'If-None-Match': etags[key]} if cached and key in etags else {}
+                with timer() as t:
+                    response = client.get(url, headers=headers)
+                seconds += t['seconds']
+                requests += 1
+                not_modified += response.status_code == 304
+                if response.headers.get('ETag') and client is not other_admin:
+                    etags[key] = response.headers['ETag']
+        queries = counter.queries - queries_before
+    finally:
+        drop_db(app.config['BENCH_DB_PATH'])
+
+    stats = dashboard_cache.fragments.stats()
+    print(f"{'кэш' if cached else 'без кэша':>9}, изменений за проход {changes:3d}: {requests} запросов страниц, "
+          f"{seconds / requests * 1000:6.2f} мс на ответ, SQL {queries / requests:.2f} на ответ, "
+          f"304 {not_modified / requests:.0%}, попаданий в кэш строк {stats['hit_rate']:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--disinsectors', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--changes', type=int, default=5, help='изменений заявок между проходами')
+    args = parser.parse_args()
+    for changes in (0, args.changes):
+        for cached in (False, True):
+            run(cached, args.orders, args.disinsectors, args.rounds, changes)
+
+
+if __name__ == '__main__':
+    main()
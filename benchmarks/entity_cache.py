@@ -0,0 +1,108 @@
+# benchmarks/entity_cache.py
+"""
+Запросы к базе на горячих путях ботов с кэшем профилей и клиентов и без него.
+
+Прогоняет в одном процессе:
+- поиск клиента по телефону при приеме заявок (часть клиентов обращается повторно);
+- назначение заявок (assign_order) и разбор outbox relay;
+- повторный /start уже привязанных дезинсекторов (bind_telegram_user).
+    python -m benchmarks.entity_cache --lookups 20000 --orders 2000
+"""
+
+import argparse
+import logging
+import random
+
+from app import entity_cache
+from app.assignment import assign_order
+from app.model import Order
+from app.outbox import claim_outbox_messages, record_outbox_results
+from benchmarks.common import QueryCounter, drop_db, make_app, seed, timer
+from database import db
+from disinsector_bot import bind_telegram_user
+
+
+def set_cache_size(maxsize):
+    for cache in entity_cache.CACHES:
+        cache.maxsize = maxsize
+        cache.clear()
+        cache.hits = cache.misses = cache.evictions = cache.expirations = 0
+
+
+def phases(lookups, orders, disinsectors, clients):
+    rnd = random.Random(3)
+    # Повторные обращения: 80% заявок от 20% клиентов
+    regulars = max(1, clients // 5)
+    phones = [
+        f'7900{(rnd.randint(1, regulars) if rnd.random() < 0.8 else rnd.randint(1, clients)):07d}'
+        for _ in range(lookups)
+    ]
+    order_ids = [order_id for order_id, in db.session.query(Order.id).order_by(Order.id).limit(orders)]
+
+    def intake():
+        for phone in phones:
+            entity_cache.get_client_id(phone)
+        return len(phones)
+
+    def assign():
+        return sum(1 for order_id in order_ids if assign_order(order_id))
+
+    def relay():
+        relayed = 0
+        while True:
+            messages = claim_outbox_messages(limit=50)
+            if not messages:
+                return relayed
+            record_outbox_results([message['id'] for message in messages], [])
+            relayed += len(messages)
+
+    def restart():
+        for i in range(lookups // 10):
+            disinsector_id = i % disinsectors + 1
+            bind_telegram_user(disinsector_id, 500000 + disinsector_id)
+        return lookups // 10
+
+    return (
+        ('поиск клиента по телефону', intake),
+        ('assign_order', assign),
+        ('разбор outbox', relay),
+        ('повторный /start', restart),
+    )
+
+
+def run(cached, lookups, orders, disinsectors, clients):
+    set_cache_size(10000 if cached else 0)
+    app = make_app()
+    try:
+        with app.app_context():
+            seed(disinsectors=disinsectors, orders=orders, clients=clients, max_load=orders, assigned=False)
+            counter = QueryCounter(db.engine)
+            for name, phase in phases(lookups, orders, disinsectors, clients):
+                queries_before = counter.queries
+                with timer() as t:
+                    count = phase()
+                queries = counter.queries - queries_before
+                print(f"{'кэш' if cached else 'без кэша':>9} {name:<26}: {count:6d} операций, "
+                      f"{queries:6d} запросов ({queries / max(count, 1):.2f} на операцию), {t['seconds']:6.2f} с")
+    finally:
+        drop_db(app.config['BENCH_DB_PATH'])
+    if cached:
+        for name, stats in entity_cache.cache_stats().items():
+            print(f"          {name}: попаданий {stats['hit_rate']:.1%}, записей {stats['size']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--disinsectors', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=10000)
+    args = parser.parse_args()
+    # bind_telegram_user пишет в лог каждый /start
+    logging.getLogger('disinsector_bot').setLevel(logging.WARNING)
+    for cached in (False, True):
+        run(cached, args.lookups, args.orders, args.disinsectors, args.clients)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/fake_telegram.py
+"""
+Локальная заглушка Telegram Bot API для бенчмарков и ручных проверок.
+
+Отвечает на запросы вида /bot<token>/<method>, запоминает все вызовы и
+держит getUpdates открытым, как настоящий long polling. Апдейты, поставленные
+через push_update, сразу отдаются ожидающему getUpdates. Может отвечать 429
+на каждый N-й sendMessage, чтобы проверить обработку retry_after.
+
+Запуск отдельным процессом:
+    python -m benchmarks.fake_telegram --port 8081
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+
+class FakeTelegramServer:
+    def __init__(self, host='127.0.0.1', port=8081, long_poll_hold=1.0, flood_every=0, retry_after=1):
+        self.host = host
+        self.port = port
+        self.long_poll_hold = long_poll_hold
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.flood_responses = 0
+        self.calls = []  # (время, токен, метод, параметры)
+        self.listeners = []  # listener(token, method, params) на каждый вызов
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._updates = defaultdict(list)  # токен -> неподтвержденные апдейты
+        self._updates_ready = defaultdict(asyncio.Event)
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def calls_of(self, method):
+        return [call for call in self.calls if call[2] == method]
+
+    def push_update(self, token, update):
+        """
+        Ставит апдейт (без update_id) в очередь getUpdates бота token. Возвращает update_id.
+        """
+        update = dict(update, update_id=next(self._update_ids))
+        self._updates[token].append(update)
+        self._updates_ready[token].set()
+        return update['update_id']
+
+    async def get_updates(self, token, params):
+        offset = int(params.get('offset') or 0)
+        if offset:
+            # Как в Bot API: offset подтверждает все апдейты до него
+            self._updates[token] = [update for update in self._updates[token] if update['update_id'] >= offset]
+        if not self._updates[token]:
+            self._updates_ready[token].clear()
+            timeout = min(float(params.get('timeout') or 0), self.long_poll_hold)
+            try:
+                await asyncio.wait_for(self._updates_ready[token].wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[token][:int(params.get('limit') or 100)]
+
+    async def handle(self, request):
+        token = request.match_info['token']
+        method = request.match_info['method']
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        self.calls.append((time.monotonic(), token, method, params))
+        for listener in self.listeners:
+            listener(token, method, params)
+        return await self.dispatch(token, method, params)
+
+    async def dispatch(self, token, method, params):
+        if method == 'getUpdates':
+            return self.ok(await self.get_updates(token, params))
+        if method == 'getMe':
+            bot_id = int(token.split(':', 1)[0])
+            return self.ok({'id': bot_id, 'is_bot': True, 'first_name': 'bench', 'username': f'bench_{bot_id}_bot'})
+        if method == 'sendMessage':
+            if self.flood_every and len(self.calls_of('sendMessage')) % self.flood_every == 0:
+                self.flood_responses += 1
+                return web.json_response({
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.retry_after}',
+                    'parameters': {'retry_after': self.retry_after},
+                }, status=429)
+            return self.ok({
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                'text': params.get('text', ''),
+            })
+        return self.ok(True)
+
+    @staticmethod
+    def ok(result):
+        return web.json_response({'ok': True, 'result': result})
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_route('POST', '/bot{token}/{method}', self.handle)
+        app.router.add_route('GET', '/bot{token}/{method}', self.handle)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заглушка Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--long-poll-hold', type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = FakeTelegramServer(args.host, args.port, args.long_poll_hold)
+    web.run_app(server.make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
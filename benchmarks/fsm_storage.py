@@ -0,0 +1,130 @@
+# benchmarks/fsm_storage.py
+"""
+Накладные расходы хранилища FSM на один апдейт диалога.
+
+Прогоняет много диалогов анкеты клиента (set_state + update_data на каждом шаге, get_data
+в конце) через MemoryStorage, SQLiteStorage с отложенной записью и SQLiteStorage с записью
+на каждое изменение. После закрытия SQLite-хранилища проверяет, что состояния пережили
+"перезапуск":
+    python -m benchmarks.fsm_storage --chats 2000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from app.fsm_storage import SQLiteStorage
+
+BOT_ID = 123456
+STEPS = (
+    ('ClientForm:name', {'name': 'Иван'}),
+    ('ClientForm:waiting_for_start', {}),
+    ('ClientForm:object_type', {'object_type': 'apartment'}),
+    ('ClientForm:insect_quantity', {'insect_quantity': 'less_50'}),
+    ('ClientForm:disinsect_experience', {'disinsect_experience': False}),
+    ('ClientForm:phone', {'phone': '+79001234567'}),
+    ('ClientForm:address', {'address': 'ул. Тестовая, д. 1'}),
+)
+
+
+class WriteThroughStorage(SQLiteStorage):
+    # Для сравнения: запись на диск после каждого изменения
+    async def set_state(self, key, state=None):
+        await super().set_state(key, state)
+        await self.flush()
+
+    async def update_data(self, key, data):
+        result = await super().update_data(key, data)
+        await self.flush()
+        return result
+
+
+def storage_key(chat_id):
+    return StorageKey(bot_id=BOT_ID, chat_id=chat_id, user_id=chat_id)
+
+
+async def conversation(storage, chat_id):
+    key = storage_key(chat_id)
+    for state, data in STEPS:
+        await storage.set_state(key, state)
+        if data:
+            await storage.update_data(key, data)
+        # Как в обработчиках: перед следующим шагом читаем накопленные данные
+        await storage.get_data(key)
+    return len(STEPS) * 3
+
+
+async def run(storage, chats, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(chat_id):
+        async with semaphore:
+            return await conversation(storage, chat_id)
+
+    start = time.perf_counter()
+    operations = sum(await asyncio.gather(*(one(chat_id) for chat_id in range(1, chats + 1))))
+    seconds = time.perf_counter() - start
+    return operations, seconds
+
+
+async def verify_restart(path, chats):
+    storage = SQLiteStorage(path)
+    try:
+        state = await storage.get_state(storage_key(chats))
+        data = await storage.get_data(storage_key(chats))
+    finally:
+        await storage.close()
+    expected = {}
+    for _, step_data in STEPS:
+        expected.update(step_data)
+    return state == STEPS[-1][0] and data == expected
+
+
+async def main_async(args):
+    directory = tempfile.mkdtemp(prefix='bench_fsm_')
+    variants = (
+        ('memory', lambda path: MemoryStorage()),
+        ('sqlite', lambda path: SQLiteStorage(path, flush_interval=args.flush_interval)),
+        ('sqlite-write-through', lambda path: WriteThroughStorage(path)),
+    )
+    baseline = None
+    for name, factory in variants:
+        path = os.path.join(directory, f'{name}.db')
+        storage = factory(path)
+        operations, seconds = await run(storage, args.chats, args.concurrency)
+        close_start = time.perf_counter()
+        await storage.close()
+        close_seconds = time.perf_counter() - close_start
+
+        per_operation = seconds / operations * 1e6
+        baseline = baseline or per_operation
+        line = f"{name:>21}: {per_operation:8.1f} мкс/операция ({per_operation / baseline:5.1f}x)"
+        if isinstance(storage, SQLiteStorage):
+            stats = storage.stats
+            line += (f", записей на диск: {stats['rows_written']}, транзакций: {stats['flushes']}, "
+                     f"close: {close_seconds * 1000:.0f} мс, после перезапуска: "
+                     f"{'ok' if await verify_restart(path, args.chats) else 'ПОТЕРЯНО'}")
+        print(line)
+
+    for name in os.listdir(directory):
+        os.unlink(os.path.join(directory, name))
+    os.rmdir(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=100, help='диалогов одновременно')
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    args = parser.parse_args()
+    print(f"диалогов: {args.chats}, шагов в диалоге: {len(STEPS)}, одновременно: {args.concurrency}")
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# benchmarks/import_time.py
+"""
+Холодный старт точек входа: время импорта (-X importtime) и лишние зависимости.
+
+Каждая точка входа запускается в отдельном процессе python -X importtime несколько раз;
+берется медиана суммарного времени импорта. Бюджет задан не в миллисекундах, а как
+допустимое отношение к базовому импорту фреймворков, который точка входа загружает
+в любом случае (flask_sqlalchemy, для ботов еще aiogram). Базовый импорт замеряется
+в том же прогоне, вперемешку с точкой входа, поэтому проверка не зависит от скорости
+машины: бюджет ограничивает только собственный вклад приложения. Кроме того
+проверяется список модулей, которые точка входа загружать не должна (веб-приложение -
+aiogram и aiohttp, клиентский бот - модули бота дезинсекторов и т.д.). Код возврата 1
+при нарушении (для CI):
+    python -m benchmarks.import_time --runs 5
+    python -m benchmarks.import_time --budget-scale 1.2 --top 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Базовые импорты: зависимости, без которых точка входа не обходится
+BASELINES = {
+    'flask': 'import flask_sqlalchemy',
+    'aiogram': 'import aiogram, flask_sqlalchemy',
+}
+
+# Имя -> (код, базовый импорт, допустимое отношение к нему,
+#         модули, которых не должно быть в sys.modules)
+ENTRY_POINTS = {
+    'web': (
+        'from app import create_app; create_app()', 'flask', 1.5,
+        ('aiogram', 'aiohttp', 'flask_migrate', 'alembic', 'requests', 'client_bot', 'disinsector_bot', 'outbox_relay'),
+    ),
+    'db_app': (
+        'from app import create_db_app; create_db_app()', 'flask', 1.4,
+        ('aiogram', 'aiohttp', 'flask_migrate', 'app.main', 'app.api', 'app.auth'),
+    ),
+    'manage': (
+        'import manage', 'flask', 1.8,
+        ('aiogram', 'aiohttp', 'app.main', 'app.api', 'app.auth', 'client_bot', 'disinsector_bot'),
+    ),
+    'client_bot': (
+        'import client_bot', 'aiogram', 1.5,
+        ('disinsector_bot', 'outbox_relay', 'app.main', 'app.api', 'app.auth', 'flask_migrate',
+         'aiogram.webhook.aiohttp_server'),
+    ),
+    'disinsector_bot': (
+        'import disinsector_bot', 'aiogram', 1.5,
+        ('client_bot', 'app.main', 'app.api', 'app.auth', 'flask_migrate'),
+    ),
+    'outbox_relay': (
+        'import outbox_relay', 'flask', 2.0,
+        ('aiogram', 'client_bot', 'disinsector_bot', 'app.main', 'app.api', 'app.auth', 'flask_migrate'),
+    ),
+}
+
+PROBE = 'import json, sys; {code}; print(json.dumps(sorted(sys.modules)))'
+
+
+def run_once(code, env):
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(code=code)],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else 'ошибка запуска')
+    total, direct = 0.0, {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        name = name[1:]
+        # Модули верхнего уровня записаны без отступа: их сумма - все время импорта;
+        # с отступом в два пробела - прямые зависимости точки входа
+        if not name.startswith(' '):
+            total += int(cumulative) / 1000
+        elif not name.startswith('   '):
+            direct[name.strip()] = direct.get(name.strip(), 0) + int(cumulative) / 1000
+    modules = json.loads(completed.stdout.strip().splitlines()[-1])
+    return total, direct, modules
+
+
+def check(name, runs, scale, top, env):
+    code, baseline, max_ratio, forbidden = ENTRY_POINTS[name]
+    totals, baseline_totals, last_top, modules = [], [], {}, []
+    # Запуски чередуются с базовым импортом, чтобы оба замера видели одну и ту же нагрузку
+    for _ in range(runs):
+        baseline_totals.append(run_once(BASELINES[baseline], env)[0])
+        total, last_top, modules = run_once(code, env)
+        totals.append(total)
+    median = statistics.median(totals)
+    baseline_median = statistics.median(baseline_totals)
+    ratio = median / baseline_median
+    loaded = set(modules)
+    unexpected = [module for module in forbidden if module in loaded]
+    problems = []
+    if ratio > max_ratio * scale:
+        problems.append(f"импорт {ratio:.2f}x от {baseline} > бюджета {max_ratio * scale:.2f}x")
+    if unexpected:
+        problems.append(f"загружены лишние модули: {', '.join(unexpected)}")
+    print(f"{name:<16} {median:7.0f} мс  {ratio:5.2f}x {baseline:<8} (бюджет {max_ratio * scale:4.2f}x, "
+          f"база {baseline_median:5.0f} мс)  модулей {len(modules):5d}  "
+          f"{'FAIL: ' + '; '.join(problems) if problems else 'OK'}")
+    if top:
+        for module, ms in sorted(last_top.items(), key=lambda item: -item[1])[:top]:
+            print(f"    {ms:8.1f} мс  {module}")
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='запусков на точку входа (берется медиана)')
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='множитель допустимых отношений к базовому импорту')
+    parser.add_argument('--top', type=int, default=0, help='показать N самых тяжелых прямых импортов')
+    parser.add_argument('--only', nargs='*', choices=sorted(ENTRY_POINTS))
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp(prefix='bench_import_')
+    # Настройки, без которых точки входа не импортируются или пишут логи в рабочий каталог
+    env = dict(
+        os.environ,
+        CLIENT_BOT_TOKEN=os.environ.get('CLIENT_BOT_TOKEN', '123456:IMPORT-TIME-CHECK'),
+        LOG_DIR=log_dir,
+        LOG_FILE=os.path.join(log_dir, 'app.log'),
+        LOG_CONSOLE='false',
+        PYTHONDONTWRITEBYTECODE='',
+    )
+    ok = True
+    try:
+        for name in args.only or ENTRY_POINTS:
+            try:
+                ok &= check(name, args.runs, args.budget_scale, args.top, env)
+            except RuntimeError as e:
+                print(f"{name:<16} FAIL: {e}")
+                ok = False
+    finally:
+        for file_name in os.listdir(log_dir):
+            os.unlink(os.path.join(log_dir, file_name))
+        os.rmdir(log_dir)
+    print("\nOK" if ok else "\nFAIL: холодный старт вышел за бюджет")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
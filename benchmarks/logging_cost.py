@@ -0,0 +1,142 @@
+# benchmarks/logging_cost.py
+"""
+Стоимость вызова logger.info на горячем пути в разных схемах логирования.
+
+- sync: как было в модулях ботов - FileHandler и StreamHandler пишут прямо в вызывающем потоке;
+- sync_rotating_10k: как было в create_app - RotatingFileHandler с maxBytes=10240
+  (ротация каждые несколько десятков строк);
+- queue_json: app.logging_setup - запись кладется в очередь, JSON в файл с ротацией и
+  вывод в консоль делает поток QueueListener;
+- disabled: logger.debug при уровне INFO (нижняя граница).
+
+Консоль перенаправляется в /dev/null, файлы пишутся во временный каталог. Считаются
+p50/p99/max времени одного вызова в вызывающем потоке (для бота - в цикле событий)
+и время, за которое поток записи разбирает очередь. --slow-disk-us добавляет задержку
+к каждому сбросу файла (медленный или сетевой диск, конкуренция за fsync):
+    python -m benchmarks.logging_cost --calls 50000 --slow-disk-us 200
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+from app import logging_setup
+from benchmarks.common import percentile
+from config import Config
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def slow_flush(handler, delay_us):
+    flush = handler.flush
+
+    def slowed():
+        time.sleep(delay_us / 1e6)
+        flush()
+    handler.flush = slowed
+
+
+def file_handlers():
+    handlers = list(logging.getLogger().handlers)
+    if logging_setup._listener is not None:
+        handlers += logging_setup._listener.handlers
+    return [handler for handler in handlers if isinstance(handler, logging.FileHandler)]
+
+
+def setup_sync(directory, devnull):
+    formatter = logging.Formatter(FORMAT)
+    file_handler = logging.FileHandler(os.path.join(directory, 'sync.log'), encoding='utf-8')
+    stream_handler = logging.StreamHandler(devnull)
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+        logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.INFO)
+
+
+def setup_sync_rotating(directory, devnull):
+    handler = RotatingFileHandler(os.path.join(directory, 'app.log'), maxBytes=10240, backupCount=10)
+    handler.setFormatter(logging.Formatter(FORMAT + ' [in %(pathname)s:%(lineno)d]'))
+    logging.getLogger().addHandler(handler)
+    stream_handler = logging.StreamHandler(devnull)
+    stream_handler.setFormatter(logging.Formatter(FORMAT))
+    logging.getLogger().addHandler(stream_handler)
+    logging.getLogger().setLevel(logging.INFO)
+
+
+def setup_queue(directory, devnull):
+    Config.LOG_DIR = directory
+    stderr, sys.stderr = sys.stderr, devnull
+    try:
+        logging_setup.configure_logging('bench')
+    finally:
+        sys.stderr = stderr
+
+
+def run(logger, calls, debug=False):
+    log = logger.debug if debug else logger.info
+    latencies = []
+    token = logging_setup.log_context.set({'chat_id': 123456789})
+    try:
+        for order_id in range(calls):
+            started = time.perf_counter_ns()
+            log("Заявка %s назначена дезинсектору %s", order_id, 'Иванов', extra={'order_id': order_id})
+            latencies.append(time.perf_counter_ns() - started)
+    finally:
+        logging_setup.log_context.reset(token)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=50000)
+    parser.add_argument('--slow-disk-us', type=int, default=0, help='задержка сброса файла, мкс')
+    args = parser.parse_args()
+
+    logger = logging.getLogger('bench.hot_path')
+    directory = tempfile.mkdtemp(prefix='bench_logs_')
+    devnull = open(os.devnull, 'w')
+    variants = (
+        ('sync', setup_sync),
+        ('sync_rotating_10k', setup_sync_rotating),
+        ('queue_json', setup_queue),
+        ('disabled', setup_sync),
+    )
+    print(f"{'схема':<20}{'p50, мкс':>10}{'p99, мкс':>10}{'max, мкс':>10}{'всего, с':>10}{'запись, с':>11}")
+    try:
+        for name, setup in variants:
+            reset_root()
+            setup(directory, devnull)
+            if args.slow_disk_us:
+                for handler in file_handlers():
+                    slow_flush(handler, args.slow_disk_us)
+            started = time.perf_counter()
+            latencies = run(logger, args.calls, debug=(name == 'disabled'))
+            in_caller = time.perf_counter() - started
+            # Для очереди - пока поток записи не допишет все в файл
+            logging_setup.shutdown_logging()
+            drained = time.perf_counter() - started
+            print(f"{name:<20}{percentile(latencies, 50) / 1000:>10.1f}{percentile(latencies, 99) / 1000:>10.1f}"
+                  f"{max(latencies) / 1000:>10.0f}{in_caller:>10.2f}{drained:>11.2f}")
+        reset_root()
+        with open(os.path.join(directory, 'bench.log'), encoding='utf-8') as file:
+            print(f"\nпример строки JSON: {file.readline().strip()}")
+    finally:
+        reset_root()
+        devnull.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
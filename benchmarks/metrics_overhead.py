@@ -0,0 +1,119 @@
+# benchmarks/metrics_overhead.py
+"""
+Во что обходятся метрики: запись в гистограмму и счетчик, middleware вокруг пустого
+обработчика aiogram, HTTP-запрос админ-панели с METRICS_ENABLED и без, отдача /metrics.
+
+Дашборд меряется на одной базе двумя приложениями; кэш строк выключен, чтобы каждый
+запрос шел в базу и учет SQL-запросов работал в полную силу:
+    python -m benchmarks.metrics_overhead --ops 200000 --requests 500
+"""
+
+import argparse
+import asyncio
+import time
+
+from app import create_app, dashboard_cache
+from app.bot_metrics import HandlerMetricsMiddleware
+from app.metrics import Counter, Histogram, REGISTRY, Registry
+from benchmarks.common import bench_config, drop_db, make_app, percentile, seed, timer
+from database import db
+
+
+def per_op_ns(func, ops):
+    with timer() as t:
+        for _ in range(ops):
+            func()
+    return t['seconds'] / ops * 1e9
+
+
+def primitives(ops):
+    registry = Registry()
+    histogram = Histogram('bench_seconds', 'бенчмарк', ('route',), registry=registry)
+    counter = Counter('bench_total', 'бенчмарк', ('route',), registry=registry)
+    print(f"Histogram.observe: {per_op_ns(lambda: histogram.observe(0.012, route='/x'), ops):7.0f} нс/оп")
+    print(f"Counter.inc:       {per_op_ns(lambda: counter.inc(route='/x'), ops):7.0f} нс/оп")
+
+
+async def middleware_overhead(ops):
+    class Callback:
+        @staticmethod
+        async def bench_handler(event, data):
+            return None
+
+    handler_object = type('HandlerObject', (), {'callback': Callback.bench_handler})()
+    middleware = HandlerMetricsMiddleware('bench')
+
+    async def run(call):
+        started = time.perf_counter()
+        for _ in range(ops):
+            await call()
+        return (time.perf_counter() - started) / ops * 1e9
+
+    bare = await run(lambda: Callback.bench_handler(None, {}))
+    wrapped = await run(lambda: middleware(Callback.bench_handler, None, {'handler': handler_object}))
+    print(f"обработчик без middleware: {bare:7.0f} нс, с HandlerMetricsMiddleware: {wrapped:7.0f} нс "
+          f"(+{wrapped - bare:.0f} нс на апдейт)")
+
+
+def dashboard(app, requests):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_id'] = 1
+    for _ in range(20):
+        client.get('/admin/dashboard')
+    latencies = []
+    for _ in range(requests):
+        with timer() as t:
+            response = client.get('/admin/dashboard')
+        if response.status_code != 200:
+            raise RuntimeError(f"ответ {response.status_code}")
+        latencies.append(t['seconds'] * 1000)
+    return percentile(latencies, 50), percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=200000, help='операций в микробенчмарках')
+    parser.add_argument('--requests', type=int, default=500, help='запросов к дашборду на вариант')
+    parser.add_argument('--orders', type=int, default=5000)
+    args = parser.parse_args()
+
+    primitives(args.ops)
+    asyncio.run(middleware_overhead(args.ops))
+
+    dashboard_cache.fragments.maxsize = 0
+    app_on = make_app()
+    path = app_on.config['BENCH_DB_PATH']
+    try:
+        with app_on.app_context():
+            seed(disinsectors=10, orders=args.orders)
+
+        class NoMetricsConfig(bench_config(path)):
+            METRICS_ENABLED = False
+
+        app_off = create_app(NoMetricsConfig)
+        # Чередуем варианты, чтобы прогрев и фон машины влияли на оба одинаково
+        results = {'без метрик': [], 'с метриками': []}
+        for _ in range(3):
+            results['без метрик'].append(dashboard(app_off, args.requests))
+            results['с метриками'].append(dashboard(app_on, args.requests))
+        for name, runs in results.items():
+            p50, p95 = min(runs)
+            print(f"/admin/dashboard {name:<12} p50 {p50:6.2f} мс  p95 {p95:6.2f} мс")
+
+        client = app_on.test_client()
+        with timer() as t:
+            for _ in range(100):
+                body = client.get('/metrics').get_data()
+        print(f"/metrics: {len(body) / 1024:.0f} КиБ, {t['seconds'] / 100 * 1000:.2f} мс на отдачу "
+              f"(из них render {per_op_ns(REGISTRY.render, 100) / 1e6:.2f} мс)")
+        with app_off.app_context():
+            db.engine.dispose()
+        with app_on.app_context():
+            db.engine.dispose()
+    finally:
+        drop_db(path)
+
+
+if __name__ == '__main__':
+    main()
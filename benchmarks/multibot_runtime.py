@@ -0,0 +1,221 @@
+# benchmarks/multibot_runtime.py
+"""
+Память, открытые сокеты и задержка sendMessage рантайма ботов дезинсекторов при 10, 100
+и 1000 токенах.
+
+Сравниваются схемы:
+    legacy       - как раньше: свой Bot, Dispatcher, MemoryStorage и HTTP-сессия на каждый токен;
+    polling      - общий Dispatcher/роутер/хранилище/сессия, long polling по всем токенам;
+    polling-flat - то же, но пул сессии TELEGRAM_POOL_LIMIT без учета long polling (прежний размер);
+    webhook      - общий рантайм, апдейты приходят на один aiohttp-сервер.
+
+После прогрева --sends сообщений отправляются одновременно ботами рантайма, каждое с
+таймаутом --send-timeout. Когда токенов больше TELEGRAM_POOL_LIMIT, в polling-flat все
+соединения заняты getUpdates, и отправки не дожидаются свободного соединения: в отчет
+попадают число неудачных отправок и время до первой из них. Каждый сценарий запускается
+в отдельном процессе против локальной заглушки Bot API; упавший сценарий выводит свой
+stderr и отмечается в отчете, остальные продолжаются:
+    python -m benchmarks.multibot_runtime --tokens 10 100 1000 --duration 5 --send-timeout 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramNetworkError
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiohttp import web
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from config import Config
+
+MODES = ('legacy', 'polling', 'polling-flat', 'webhook')
+
+
+def rss_kb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def open_sockets():
+    count = 0
+    for fd in os.listdir('/proc/self/fd'):
+        try:
+            if os.readlink(f'/proc/self/fd/{fd}').startswith('socket:'):
+                count += 1
+        except OSError:
+            pass
+    return count
+
+
+def fake_tokens(count):
+    return [(i, f"{100000 + i}:BENCH{i:06d}") for i in range(1, count + 1)]
+
+
+def build_legacy(tokens, api_url):
+    # Воспроизводит старую схему start_disinsector_bot: все объекты на каждый токен
+    from disinsector_bot import router
+
+    runtimes = []
+    for _, token in tokens:
+        session = AiohttpSession()
+        session.api = TelegramAPIServer.from_base(api_url)
+        bot = Bot(token=token, session=session)
+        dp = Dispatcher(storage=MemoryStorage())
+        for observer_name in ('message', 'callback_query'):
+            for handler in getattr(router, observer_name).handlers:
+                filters = [f.callback for f in handler.filters or []]
+                getattr(dp, observer_name).register(handler.callback, *filters)
+        runtimes.append((dp, bot))
+    return runtimes
+
+
+async def send_latencies(bots, sends, timeout):
+    """
+    Одновременно отправляет sends сообщений ботами по кругу, каждое не дольше timeout секунд.
+    Возвращает (задержки успешных отправок в мс по возрастанию, задержки неудачных в мс):
+    при нехватке соединений в пуле отправки завершаются таймаутом, а не роняют сценарий.
+    """
+    async def send(bot, chat_id):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(bot.send_message(chat_id=chat_id, text='ping', request_timeout=timeout), timeout)
+            ok = True
+        except (asyncio.TimeoutError, TelegramNetworkError):
+            ok = False
+        return ok, (time.perf_counter() - started) * 1000
+
+    results = await asyncio.gather(*(send(bots[i % len(bots)], i + 1) for i in range(sends)))
+    return (
+        sorted(ms for ok, ms in results if ok),
+        sorted(ms for ok, ms in results if not ok),
+    )
+
+
+async def run_scenario(mode, count, api_url, duration, sends, send_timeout):
+    import disinsector_bot
+    from app.bot_session import create_bot_session
+
+    Config.TELEGRAM_API_URL = api_url
+    Config.DISINSECTOR_BOT_MODE = 'webhook' if mode == 'webhook' else 'polling'
+    tokens = fake_tokens(count)
+    baseline_rss = rss_kb()
+    baseline_sockets = open_sockets()
+
+    dispatchers = []
+    runner = None
+    if mode == 'legacy':
+        runtimes = build_legacy(tokens, api_url)
+        tasks = [asyncio.create_task(dp.start_polling(bot, handle_signals=False)) for dp, bot in runtimes]
+        dispatchers = [dp for dp, _ in runtimes]
+        bots = [bot for _, bot in runtimes]
+    else:
+        # polling-flat воспроизводит пул без запаса под getUpdates
+        session = create_bot_session() if mode == 'polling-flat' else None
+        dp, bot_map = disinsector_bot.create_disinsector_runtime(tokens, session=session, storage=MemoryStorage())
+        bots = list(bot_map.values())
+        if mode != 'webhook':
+            tasks = [asyncio.create_task(dp.start_polling(*bots, handle_signals=False))]
+            dispatchers = [dp]
+        else:
+            web_app = web.Application()
+            disinsector_bot.DisinsectorWebhookHandler(dp, bot_map).register(web_app, path=Config.WEBHOOK_PATH)
+            runner = web.AppRunner(web_app)
+            await runner.setup()
+            await web.TCPSite(runner, '127.0.0.1', 0).start()
+            tasks = []
+
+    await asyncio.sleep(duration)
+    result = {
+        'mode': mode,
+        'tokens': count,
+        'rss_mb': round((rss_kb() - baseline_rss) / 1024, 1),
+        'sockets': open_sockets() - baseline_sockets,
+    }
+    latencies, failures = await send_latencies(bots, sends, send_timeout)
+    result['send_p50_ms'] = round(latencies[len(latencies) // 2]) if latencies else None
+    result['send_max_ms'] = round(latencies[-1]) if latencies else None
+    result['send_failed'] = len(failures)
+    result['first_fail_ms'] = round(failures[0]) if failures else None
+
+    for dp in dispatchers:
+        await dp.stop_polling()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if runner is not None:
+        await runner.cleanup()
+    return result
+
+
+async def run_all(token_counts, duration, port, sends, send_timeout, long_poll_hold):
+    server = FakeTelegramServer(port=port, long_poll_hold=long_poll_hold)
+    await server.start()
+    try:
+        results = []
+        for count in token_counts:
+            for mode in MODES:
+                proc = await asyncio.create_subprocess_exec(
+                    sys.executable, '-m', 'benchmarks.multibot_runtime',
+                    '--scenario', mode, '--tokens', str(count),
+                    '--duration', str(duration), '--sends', str(sends), '--send-timeout', str(send_timeout),
+                    '--api-url', server.base_url,
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                )
+                stdout, stderr = await proc.communicate()
+                lines = stdout.decode().strip().splitlines()
+                if proc.returncode != 0 or not lines:
+                    print(f"Сценарий {mode} на {count} токенах завершился с кодом {proc.returncode}:", file=sys.stderr)
+                    print(stderr.decode(errors='replace'), file=sys.stderr)
+                    results.append({'mode': mode, 'tokens': count, 'error': proc.returncode})
+                    continue
+                results.append(json.loads(lines[-1]))
+        return results
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--duration', type=float, default=5.0, help='сколько секунд работает рантайм перед замером')
+    parser.add_argument('--sends', type=int, default=50, help='одновременных sendMessage после прогрева')
+    parser.add_argument('--send-timeout', type=int, default=5, help='таймаут одной отправки, с')
+    parser.add_argument('--long-poll-hold', type=float, default=10.0, help='сколько заглушка держит getUpdates, с')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--scenario', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--api-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        result = asyncio.run(run_scenario(
+            args.scenario, args.tokens[0], args.api_url, args.duration, args.sends, args.send_timeout,
+        ))
+        print(json.dumps(result))
+        return
+
+    results = asyncio.run(run_all(
+        args.tokens, args.duration, args.port, args.sends, args.send_timeout, args.long_poll_hold,
+    ))
+    print(f"{'режим':<14}{'токенов':>10}{'RSS, МБ':>12}{'сокетов':>10}{'send p50, мс':>15}{'send max, мс':>15}"
+          f"{'неудачных':>12}{'1-я неудача, мс':>18}")
+    for row in results:
+        if 'error' in row:
+            print(f"{row['mode']:<14}{row['tokens']:>10}  FAIL: код {row['error']}, см. stderr")
+            continue
+        print(f"{row['mode']:<14}{row['tokens']:>10}{row['rss_mb']:>12}{row['sockets']:>10}"
+              f"{row['send_p50_ms'] if row['send_p50_ms'] is not None else '-':>15}"
+              f"{row['send_max_ms'] if row['send_max_ms'] is not None else '-':>15}"
+              f"{row['send_failed']:>12}{row['first_fail_ms'] if row['first_fail_ms'] is not None else '-':>18}")
+
+
+if __name__ == '__main__':
+    main()
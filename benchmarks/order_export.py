@@ -0,0 +1,122 @@
+# benchmarks/order_export.py
+"""
+Выгрузка заявок из админ-панели (/admin/orders/export): строк/сек и пиковая память.
+
+База наполняется один раз, каждая выгрузка идет в отдельном процессе, чтобы
+пиковый RSS (VmHWM) относился только к ней. Для сравнения прежний способ:
+все строки через .all() и файл целиком в памяти.
+    python -m benchmarks.order_export --rows 10000 200000
+"""
+
+import argparse
+import csv
+import io
+import json
+import resource
+import subprocess
+import sys
+import zipfile
+
+from app.order_export import EXPORT_HEADERS, iter_export_rows
+from benchmarks.common import drop_db, make_app, seed, timer
+
+MODES = ('csv', 'xlsx', 'load-all')
+
+
+def proc_status_mb(field):
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    # ru_maxrss у дочернего процесса на Linux наследует пик родителя до exec, VmHWM - нет
+    peak = proc_status_mb('VmHWM')
+    return peak if peak is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def export_once(db_path, mode):
+    app = make_app(db_path)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_id'] = 1
+    baseline = peak_rss_mb()
+
+    size = 0
+    with timer() as t:
+        if mode == 'load-all':
+            with app.app_context():
+                rows = list(iter_export_rows(batch_size=10 ** 9))
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(EXPORT_HEADERS)
+                writer.writerows(rows)
+                size = len(buffer.getvalue().encode('utf-8'))
+        else:
+            response = client.get(f'/admin/orders/export?format={mode}', buffered=False)
+            assert response.status_code == 200, response.status_code
+            for chunk in response.response:
+                size += len(chunk)
+            response.close()
+    # Страницы файла базы, отображенные через mmap (SQLITE_PRAGMAS), тоже входят в RSS;
+    # RssAnon - память самого процесса
+    return {'seconds': t['seconds'], 'bytes': size, 'baseline_mb': baseline, 'peak_mb': peak_rss_mb(),
+            'anon_mb': proc_status_mb('RssAnon') or 0}
+
+
+def check_files(db_path, rows):
+    # Обе выгрузки должны содержать заголовок и все заявки
+    app = make_app(db_path)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_id'] = 1
+    body = client.get('/admin/orders/export?format=csv').data.decode('utf-8-sig')
+    csv_rows = list(csv.reader(io.StringIO(body)))
+    archive = zipfile.ZipFile(io.BytesIO(client.get('/admin/orders/export?format=xlsx').data))
+    sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    return csv_rows[0] == EXPORT_HEADERS and len(csv_rows) == rows + 1 and sheet.count('<row>') == rows + 1
+
+
+def run_child(db_path, mode):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.order_export', '--child', db_path, mode],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 200000])
+    parser.add_argument('--child', nargs=2, metavar=('DB_PATH', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(export_once(*args.child)))
+        return
+
+    for rows in args.rows:
+        app = make_app()
+        db_path = app.config['BENCH_DB_PATH']
+        try:
+            with app.app_context():
+                seed(disinsectors=50, orders=rows, max_load=rows)
+            if rows <= 20000:
+                print(f"проверка содержимого CSV и XLSX на {rows} строках: {'OK' if check_files(db_path, rows) else 'FAIL'}")
+            for mode in MODES:
+                result = run_child(db_path, mode)
+                print(f"{mode:>8} {rows:>8} строк: {result['seconds']:6.2f} с -> "
+                      f"{rows / result['seconds']:8.0f} строк/с, {result['bytes'] / 1e6:7.1f} МБ, "
+                      f"RSS {result['baseline_mb']:.0f} -> {result['peak_mb']:.0f} МБ, "
+                      f"из них анонимной {result['anon_mb']:.0f} МБ")
+        finally:
+            drop_db(db_path)
+
+
+if __name__ == '__main__':
+    main()
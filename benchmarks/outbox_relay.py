@@ -0,0 +1,137 @@
+# benchmarks/outbox_relay.py
+"""
+Проверка и замер relay уведомлений из outbox против локальной заглушки Bot API.
+
+Назначает очередь заявок (по одной и пакетом), затем разбирает outbox, пока он не
+опустеет. Заглушка отвечает 429 на часть запросов. Проверяется, что:
+- повторная постановка с тем же ключом не создает дубликат;
+- каждое уведомление доставлено ровно один раз, если relay не падал;
+- сообщение, взятое упавшим relay, отправляется повторно после истечения аренды;
+- уведомление дезинсектору, отключившему бота, откладывается с задержкой, а не теряется.
+    python -m benchmarks.outbox_relay --orders 500 --disinsectors 20
+"""
+
+import argparse
+import asyncio
+import threading
+from collections import Counter
+
+from sqlalchemy import func, update
+
+import outbox_relay
+from app.assignment import assign_order, dispatch_backlog
+from app.bot_db import init_bot_db, shutdown_bot_db
+from app.entity_cache import invalidate_disinsector
+from app.model import Disinsector, Order, OutboxMessage, JOB_DONE, JOB_PENDING
+from app.outbox import claim_outbox_messages, enqueue_order_notification
+from app.telegram_sender import TelegramSender
+from benchmarks.common import drop_db, make_app, seed, timer
+from benchmarks.fake_telegram import FakeTelegramServer
+from config import Config
+from database import db
+
+
+def outbox_counts():
+    return dict(db.session.query(OutboxMessage.status, func.count(OutboxMessage.id)).group_by(OutboxMessage.status))
+
+
+async def drain(sender):
+    relayed = 0
+    while True:
+        batch = await outbox_relay.relay_outbox_batch(sender)
+        if not batch:
+            return relayed
+        relayed += batch
+
+
+def run(orders, disinsectors, single, flood_every, port):
+    server = FakeTelegramServer(port=port, flood_every=flood_every, retry_after=1)
+    server_loop = asyncio.new_event_loop()
+    threading.Thread(target=server_loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(server.start(), server_loop).result()
+    sender = TelegramSender(api_url=server.base_url, global_rate=1000, chat_rate=1000).start()
+
+    app = make_app()
+    try:
+        with app.app_context():
+            seed(disinsectors=disinsectors, orders=orders, max_load=orders, assigned=False)
+            order_ids = [order_id for order_id, in db.session.query(Order.id).order_by(Order.id).limit(single)]
+            assigned = [assign_order(order_id) for order_id in order_ids]
+            first = assigned[0]
+            enqueue_order_notification(first['disinsector']['id'], first['order'])
+            db.session.commit()
+            backlog = dispatch_backlog()
+            enqueued = db.session.query(func.count(OutboxMessage.id)).scalar()
+            expected = len(order_ids) + len(backlog)
+            print(f"в outbox {enqueued} уведомлений (ожидалось {expected}, повторная постановка не дублирует)")
+
+            # Один дезинсектор отключил бота после назначения: его уведомления ждут повтора
+            db.session.execute(update(Disinsector).where(Disinsector.id == disinsectors).values(telegram_user_id=None))
+            db.session.commit()
+            invalidate_disinsector(disinsectors)
+
+            # Relay взял пачку в аренду и упал до отправки
+            crashed = claim_outbox_messages(limit=5, lease_seconds=120)
+            db.session.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_([message['id'] for message in crashed]))
+                .values(locked_until=func.datetime('now', '-1 second'))
+            )
+            db.session.commit()
+
+        async def relay():
+            init_bot_db(app)
+            try:
+                with timer() as t:
+                    relayed = await drain(sender)
+            finally:
+                shutdown_bot_db()
+            return relayed, t['seconds']
+
+        relayed, seconds = asyncio.run(relay())
+
+        with app.app_context():
+            counts = outbox_counts()
+            unreachable = db.session.query(func.count(OutboxMessage.id)).join(
+                Disinsector, Disinsector.id == OutboxMessage.disinsector_id
+            ).filter(Disinsector.telegram_user_id.is_(None)).scalar()
+    finally:
+        sender.stop()
+        asyncio.run_coroutine_threadsafe(server.stop(), server_loop).result()
+        server_loop.call_soon_threadsafe(server_loop.stop)
+        drop_db(app.config['BENCH_DB_PATH'])
+
+    # Ответы 429 заглушка тоже записывает в calls: такие запросы не доставлены
+    delivered = Counter(params['text'] for _, _, _, params in server.calls_of('sendMessage'))
+    total = sum(delivered.values()) - server.flood_responses
+    duplicates = total - len(delivered)
+    print(f"разобрано {relayed} сообщений за {seconds:.2f} с -> {relayed / seconds:.0f} сообщ/с, "
+          f"ответов 429: {server.flood_responses}")
+    print(f"статусы: {counts}; недоступных получателей {unreachable}, повторно отправлено после аренды {len(crashed)}")
+    print(f"доставлено {total}, уникальных {len(delivered)}, дубликатов {duplicates}")
+
+    ok = (
+        enqueued == expected
+        and counts.get(JOB_PENDING, 0) == unreachable
+        and counts.get(JOB_DONE, 0) == enqueued - unreachable
+        and duplicates == 0
+        and len(delivered) == enqueued - unreachable
+    )
+    print("OK" if ok else "FAIL")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--disinsectors', type=int, default=20)
+    parser.add_argument('--single', type=int, default=50, help='заявок, назначаемых по одной')
+    parser.add_argument('--flood-every', type=int, default=25, help='429 на каждый N-й sendMessage')
+    parser.add_argument('--port', type=int, default=8093)
+    args = parser.parse_args()
+    Config.OUTBOX_BATCH = 100
+    raise SystemExit(0 if run(args.orders, args.disinsectors, args.single, args.flood_every, args.port) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# benchmarks/query_budgets.py
+"""
+Проверка бюджетов SQL-запросов маршрутов в строгом режиме app.query_monitor.
+
+Приложение поднимается с QUERY_BUDGET_STRICT: маршрут, превысивший свой @query_budget
+или повторивший запрос одной формы N_PLUS_ONE_THRESHOLD раз, падает с QueryBudgetExceeded.
+Каждый сценарий выполняется на холодных кэшах (профили, строки дашбордов), затем на
+теплых; сначала проверяется, что сам детектор ловит заведомый N+1. Код возврата 1
+при любом нарушении (для CI):
+    python -m benchmarks.query_budgets --orders 2000
+"""
+
+import argparse
+import sys
+
+from app import create_app, dashboard_cache, entity_cache
+from app.model import Order, STATUS_IN_PROGRESS
+from app.order_queries import fetch_orders_page
+from app.metrics import unit_of_work
+from app.query_monitor import QueryBudgetExceeded
+from benchmarks.common import QueryCounter, bench_config, drop_db, make_app, seed
+from database import db
+
+
+def strict_config(db_path):
+    class StrictConfig(bench_config(db_path)):
+        QUERY_BUDGET_STRICT = True
+        N_PLUS_ONE_THRESHOLD = 5
+        SLOW_QUERY_MS = 0
+    return StrictConfig
+
+
+def login(app, key, value):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session[key] = value
+    return client
+
+
+def scenarios(app):
+    admin = login(app, 'admin_id', 1)
+    cabinet = login(app, 'disinsector_id', 1)
+    api = app.test_client()
+    api.environ_base['HTTP_X_API_KEY'] = app.config['API_KEY']
+    with app.app_context():
+        order_id = db.session.query(Order.id).filter(Order.disinsector_id == 1).order_by(Order.id.desc()).first()[0]
+        _, cursor = fetch_orders_page(page_size=app.config['ADMIN_PAGE_SIZE'])
+    return [
+        ('main.admin_dashboard', lambda: admin.get('/admin/dashboard')),
+        ('main.admin_dashboard[after]', lambda: admin.get('/admin/dashboard', query_string={'after': cursor})),
+        ('main.admin_reports', lambda: admin.get('/admin/reports')),
+        ('main.disinsector_dashboard', lambda: cabinet.get('/disinsector/dashboard')),
+        ('main.update_order_status', lambda: cabinet.post('/update_order_status', data={
+            'order_id': order_id, 'new_status': STATUS_IN_PROGRESS,
+        })),
+        ('api.create_order', lambda: api.post('/api/create_order', json={
+            'client_name': 'Проверка',
+            'phone_number': '79990000001',
+            'address': 'ул. Тестовая, д. 1',
+            'object_type': 'apartment',
+            'insect_quantity': 'less_50',
+            'disinsect_experience': False,
+        })),
+        ('api.order_status', lambda: api.get(f'/api/orders/{order_id}/status')),
+    ]
+
+
+def detector_works(app):
+    """
+    Заведомый N+1 в строгом режиме обязан бросить исключение.
+    """
+    with app.app_context():
+        ids = [order_id for order_id, in db.session.query(Order.id).limit(10)]
+        try:
+            with unit_of_work('self_check'):
+                for order_id in ids:
+                    db.session.get(Order, order_id)
+                    db.session.expunge_all()
+        except QueryBudgetExceeded:
+            return True
+    return False
+
+
+def clear_caches():
+    for cache in entity_cache.CACHES + (dashboard_cache.fragments,):
+        cache.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--disinsectors', type=int, default=10)
+    args = parser.parse_args()
+
+    seed_app = make_app()
+    path = seed_app.config['BENCH_DB_PATH']
+    failures = 0
+    try:
+        with seed_app.app_context():
+            seed(disinsectors=args.disinsectors, orders=args.orders)
+            db.engine.dispose()
+        app = create_app(strict_config(path))
+        with app.app_context():
+            counter = QueryCounter(db.engine)
+
+        if not detector_works(app):
+            print("FAIL: детектор N+1 не сработал на заведомом N+1")
+            failures += 1
+
+        for name, request in scenarios(app):
+            for phase in ('холодный', 'теплый'):
+                if phase == 'холодный':
+                    clear_caches()
+                before = counter.queries
+                try:
+                    response = request()
+                    status = response.status_code
+                    note = 'OK' if status < 400 else f'FAIL: ответ {status}'
+                except QueryBudgetExceeded as e:
+                    note = f'FAIL: {e}'
+                if note != 'OK':
+                    failures += 1
+                print(f"{name:<32} {phase:<9} SQL {counter.queries - before:3d}  {note}")
+    finally:
+        drop_db(path)
+    print(f"\nнарушений: {failures}" if failures else "\nбюджеты соблюдены")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/query_plans.py
+"""
+Проверка планов частых запросов: каждый запрос прогоняется через EXPLAIN QUERY PLAN
+на наполненной базе. Если SQLite читает таблицу целиком (SCAN без индекса), проверка
+падает с кодом возврата 1. Та же проверка на небольшой базе входит в тесты
+(tests/test_query_plans.py); скрипт - для прогона на большом объеме данных:
+    python -m benchmarks.query_plans --orders 20000
+
+Запросы не копируются сюда, а строятся теми же функциями, которые их выполняют
+(orders_page_query, reserve_capacity_statement, claim_order_jobs_statement и т.д.),
+поэтому изменение запроса в коде сразу попадает в проверку.
+"""
+
+import argparse
+
+from datetime import datetime
+
+from sqlalchemy.dialects import sqlite
+
+from app.assignment import backlog_orders_query, reserve_capacity_statement
+from app.dashboard_cache import orders_version_query
+from app.entity_cache import client_id_query, profile_by_telegram_query
+from app.model import Order, STATUS_NEW
+from app.order_feed import changes_query, latest_change_query
+from app.order_jobs import assignment_job_query, claim_order_jobs_statement
+from app.order_queries import disinsector_orders_query, encode_cursor, oldest_new_order_query, orders_page_query
+from app.order_stats import order_counts_query
+from app.outbox import claim_outbox_statement
+from benchmarks.common import drop_db, make_app, seed
+from database import db
+
+
+def hot_queries():
+    """
+    (название, запрос) для всех запросов, которые выполняются на каждую заявку или страницу.
+    """
+    position = db.session.query(Order.created_at, Order.id).order_by(Order.id.desc()).first()
+    now = datetime.utcnow()
+    return [
+        ('клиент по телефону (get_client_id)', client_id_query('+70000000001')),
+        ('дезинсектор по telegram_user_id (get_disinsector_id_by_telegram_user)',
+         profile_by_telegram_query(123456789)),
+        ('резерв емкости с выбором кандидата (reserve_capacity)', reserve_capacity_statement()),
+        ('резерв емкости у кандидата из кучи (reserve_capacity)', reserve_capacity_statement(1)),
+        ('очередь неназначенных заявок (dispatch_backlog)', backlog_orders_query()),
+        ('самая ранняя новая заявка дезинсектора (take_order_in_work)', oldest_new_order_query(1)),
+        ('заявки дезинсектора (disinsector_dashboard)', disinsector_orders_query(1)),
+        ('страница админ-панели без фильтра (fetch_orders_page)', orders_page_query()),
+        ('страница админ-панели по статусу', orders_page_query(STATUS_NEW)),
+        ('следующая страница админ-панели по статусу', orders_page_query(STATUS_NEW, cursor=encode_cursor(position))),
+        ('отчет по дезинсекторам (order_counts_query)', order_counts_query()),
+        ('готовые задачи очереди (claim_order_jobs)', claim_order_jobs_statement(now)),
+        ('последняя задача заявки (order_assignment_status)', assignment_job_query(1).limit(1)),
+        ('готовые уведомления outbox (claim_outbox_messages)', claim_outbox_statement(now)),
+        ('последнее изменение заявок (ChangeMarker)', latest_change_query()),
+        ('изменения заявок после курсора (SSE админ-панели)', changes_query(position, now).limit(200)),
+        ('изменения заявок дезинсектора после курсора (SSE кабинета)',
+         changes_query(position, now, disinsector_id=1).limit(200)),
+        ('версия заявок дезинсектора (ETag кабинета)', orders_version_query(1)),
+    ]
+
+
+def explain(statement):
+    # ORM Query из функций приложения компилируется через его Core-запрос
+    statement = getattr(statement, 'statement', statement)
+    compiled = statement.compile(dialect=sqlite.dialect(), compile_kwargs={'literal_binds': True})
+    rows = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").all()
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    """
+    Шаги плана, где таблица читается целиком. 'SCAN t USING [COVERING] INDEX' - обход
+    индекса, его допускаем: так выполняются ORDER BY ... LIMIT и GROUP BY по индексу.
+    """
+    return [step for step in plan if step.startswith('SCAN ') and ' USING ' not in step]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--disinsectors', type=int, default=50)
+    parser.add_argument('--verbose', action='store_true', help='печатать планы всех запросов')
+    args = parser.parse_args()
+
+    app = make_app()
+    failed = []
+    try:
+        with app.app_context():
+            seed(disinsectors=args.disinsectors, orders=args.orders)
+            db.session.execute(db.text('ANALYZE'))
+            for name, statement in hot_queries():
+                plan = explain(statement)
+                scans = full_scans(plan)
+                print(f"{'FAIL' if scans else 'ok  '} {name}")
+                if scans or args.verbose:
+                    for step in plan:
+                        print(f"       {step}")
+                if scans:
+                    failed.append(name)
+    finally:
+        drop_db(app.config['BENCH_DB_PATH'])
+
+    if failed:
+        print(f"Полный просмотр таблицы в {len(failed)} запросах")
+        raise SystemExit(1)
+    print("Все частые запросы используют индексы")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+# benchmarks/routes.py
+"""
+Набор бенчмарков Flask-маршрутов на синтетических базах растущего размера.
+
+generate - строит базы с реалистичным распределением (дезинсекторов ~1 на 2000 заявок,
+           статусы 15% новых / 10% в работе / 75% выполненных, 3% не назначены,
+           постоянные клиенты) и кладет их в --data-dir, повторно не пересобирает;
+run      - на копии каждой базы гоняет сценарии и пишет результаты в JSON;
+compare  - сравнивает два файла результатов и отмечает регрессии (код возврата 1).
+
+Кэш строк дашбордов на время замера выключен: меряется полная отрисовка страницы.
+    python -m benchmarks.routes run --sizes 1000 100000 1000000 --output results.json
+    python -m benchmarks.routes compare base.json results.json --threshold 0.15
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from app import dashboard_cache
+from app.model import Disinsector, Order, ORDER_STATUSES, STATUS_IN_PROGRESS, STATUS_NEW
+from app.order_queries import ALL_STATUSES
+from app.order_stats import rebuild_order_stats
+from benchmarks.common import QueryCounter, drop_db, make_app, percentile, seed, timer
+from database import db
+
+DATASET_VERSION = 1
+RESULTS_FORMAT = 1
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'disinsector_bench_data')
+
+
+def dataset_params(orders):
+    return {
+        'orders': orders,
+        'disinsectors': min(500, max(10, orders // 2000)),
+        'clients': max(1, orders * 7 // 10),
+        'max_load': 5,
+        'status_weights': (15, 10, 75),
+        'unassigned_share': 0.03,
+    }
+
+
+def dataset_path(data_dir, orders):
+    return os.path.join(data_dir, f'routes_v{DATASET_VERSION}_{orders}.db')
+
+
+def generate(data_dir, orders):
+    """
+    База на orders заявок; уже построенная берется как есть.
+    """
+    path = dataset_path(data_dir, orders)
+    if os.path.exists(path):
+        return path
+    os.makedirs(data_dir, exist_ok=True)
+    tmp_path = path + '.tmp'
+    drop_db(tmp_path)
+    app = make_app(tmp_path)
+    with timer() as t, app.app_context():
+        seed(**dataset_params(orders))
+        rebuild_order_stats()
+        # Все из WAL - в основной файл, чтобы базу можно было копировать одним файлом
+        db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+        db.session.commit()
+        db.engine.dispose()
+    os.replace(tmp_path, path)
+    drop_db(tmp_path)
+    print(f"база на {orders} заявок: {path} ({os.path.getsize(path) / 1e6:.0f} МБ, {t['seconds']:.1f} с)")
+    return path
+
+
+class Scenarios:
+    """
+    Сценарии одного прогона: name -> функция, выполняющая один запрос и возвращающая ответ.
+    """
+    def __init__(self, app, seed_value=11):
+        self.app = app
+        self.rnd = random.Random(seed_value)
+        with app.app_context():
+            disinsector_ids = [row.id for row in db.session.query(Disinsector.id).order_by(Disinsector.id).limit(20)]
+            self.orders = {
+                disinsector_id: [
+                    row.id for row in db.session.query(Order.id)
+                    .filter(Order.disinsector_id == disinsector_id).order_by(Order.id.desc()).limit(50)
+                ]
+                for disinsector_id in disinsector_ids
+            }
+        self.admin = self.login('admin_id', 1)
+        self.cabinets = {disinsector_id: self.login('disinsector_id', disinsector_id) for disinsector_id in disinsector_ids}
+        self.api = app.test_client()
+        self.api.environ_base['HTTP_X_API_KEY'] = app.config['API_KEY']
+        self.phone_count = 0
+
+    def login(self, key, value):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session[key] = value
+        return client
+
+    def all(self):
+        scenarios = {'api.create_order': self.create_order}
+        for status in (ALL_STATUSES,) + ORDER_STATUSES:
+            scenarios[f'main.admin_dashboard[{status}]'] = self.admin_dashboard(status)
+        scenarios['main.disinsector_dashboard'] = self.disinsector_dashboard
+        scenarios['main.update_order_status'] = self.update_order_status
+        scenarios['main.admin_reports'] = self.admin_reports
+        return scenarios
+
+    def create_order(self):
+        # Примерно треть заявок - от уже известных клиентов
+        self.phone_count += 1
+        phone = f'7900{self.rnd.randint(1, 1000):07d}' if self.rnd.random() < 0.3 else f'7950{self.phone_count:07d}'
+        return self.api.post('/api/create_order', json={
+            'client_name': 'Бенчмарк',
+            'phone_number': phone,
+            'address': 'ул. Тестовая, д. 1',
+            'object_type': 'apartment',
+            'insect_quantity': 'less_50',
+            'disinsect_experience': False,
+        })
+
+    def admin_dashboard(self, status):
+        return lambda: self.admin.get('/admin/dashboard', query_string={'status': status})
+
+    def disinsector_dashboard(self):
+        return self.cabinets[self.rnd.choice(list(self.cabinets))].get('/disinsector/dashboard')
+
+    def update_order_status(self):
+        disinsector_id = self.rnd.choice([key for key, orders in self.orders.items() if orders])
+        order_id = self.rnd.choice(self.orders[disinsector_id])
+        return self.cabinets[disinsector_id].post('/update_order_status', data={
+            'order_id': order_id,
+            'new_status': self.rnd.choice((STATUS_NEW, STATUS_IN_PROGRESS)),
+        })
+
+    def admin_reports(self):
+        return self.admin.get('/admin/reports')
+
+
+def measure(app, counter, request, count, warmup):
+    for _ in range(warmup):
+        request()
+    latencies = []
+    queries_before = counter.queries
+    with timer() as total:
+        for _ in range(count):
+            with timer() as t:
+                response = request()
+            if response.status_code >= 400:
+                raise RuntimeError(f"ответ {response.status_code}")
+            latencies.append(t['seconds'] * 1000)
+    return {
+        'requests': count,
+        'mean_ms': round(sum(latencies) / count, 3),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'rps': round(count / total['seconds'], 1),
+        'queries': round((counter.queries - queries_before) / count, 2),
+    }
+
+
+def run_size(data_dir, orders, count, warmup, only):
+    source = generate(data_dir, orders)
+    fd, path = tempfile.mkstemp(prefix='bench_routes_', suffix='.db')
+    os.close(fd)
+    shutil.copyfile(source, path)
+    results = []
+    try:
+        app = make_app(path)
+        with app.app_context():
+            counter = QueryCounter(db.engine)
+        scenarios = Scenarios(app).all()
+        for name, request in scenarios.items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            result = measure(app, counter, request, count, warmup)
+            result.update(size=orders, scenario=name)
+            results.append(result)
+            print(f"{orders:>9} {name:<40} p50 {result['p50_ms']:8.2f} мс  p95 {result['p95_ms']:8.2f} мс  "
+                  f"{result['rps']:8.1f} запр/с  SQL {result['queries']:5.2f}")
+    finally:
+        drop_db(path)
+    return results
+
+
+def environment():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'revision': revision,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+    }
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+    if data.get('format') != RESULTS_FORMAT:
+        raise SystemExit(f"{path}: неизвестный формат результатов {data.get('format')}")
+    return {(row['size'], row['scenario']): row for row in data['results']}
+
+
+def compare(base_path, new_path, threshold, min_ms, metrics=('p50_ms', 'p95_ms')):
+    """
+    Регрессия - метрика выросла больше чем на threshold и больше чем на min_ms
+    (шум коротких запросов), либо SQL-запросов на запрос стало больше хотя бы на четверть.
+    """
+    base, new = load_results(base_path), load_results(new_path)
+    regressions = []
+    for key in sorted(base.keys() & new.keys(), key=lambda item: (item[0], item[1])):
+        old_row, new_row = base[key], new[key]
+        notes = []
+        for metric in metrics:
+            old_value, new_value = old_row[metric], new_row[metric]
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            flag = change > threshold and new_value - old_value > min_ms
+            notes.append(f"{metric} {old_value:.2f} -> {new_value:.2f} ({change:+.0%}){' !' if flag else ''}")
+            if flag:
+                regressions.append((key, metric))
+        if new_row['queries'] > old_row['queries'] + 0.25:
+            notes.append(f"SQL {old_row['queries']} -> {new_row['queries']} !")
+            regressions.append((key, 'queries'))
+        print(f"{key[0]:>9} {key[1]:<40} " + ', '.join(notes))
+    for key in sorted(base.keys() ^ new.keys()):
+        print(f"{key[0]:>9} {key[1]:<40} есть только в {'первом' if key in base else 'втором'} файле")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help='построить базы заранее')
+    generate_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    generate_parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+
+    run_parser = commands.add_parser('run', help='прогнать сценарии и записать результаты')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    run_parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    run_parser.add_argument('--requests', type=int, default=200, help='запросов на сценарий')
+    run_parser.add_argument('--warmup', type=int, default=20)
+    run_parser.add_argument('--only', nargs='*', help='только сценарии, содержащие эти подстроки')
+    run_parser.add_argument('--output', default='benchmark_results.json')
+
+    compare_parser = commands.add_parser('compare', help='сравнить два файла результатов')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.15, help='допустимый рост задержки, доля')
+    compare_parser.add_argument('--min-ms', type=float, default=0.5, help='меньший рост считается шумом')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        for orders in args.sizes:
+            generate(args.data_dir, orders)
+    elif args.command == 'run':
+        dashboard_cache.fragments.maxsize = 0
+        meta = environment()
+        results = []
+        for orders in args.sizes:
+            results.extend(run_size(args.data_dir, orders, args.requests, args.warmup, args.only))
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'format': RESULTS_FORMAT, 'environment': meta, 'dataset_version': DATASET_VERSION,
+                       'results': results}, file, ensure_ascii=False, indent=2)
+        print(f"результаты: {args.output}")
+    else:
+        regressions = compare(args.base, args.new, args.threshold, args.min_ms)
+        if regressions:
+            print(f"регрессий: {len(regressions)}")
+            sys.exit(1)
+        print("регрессий нет")
+
+
+if __name__ == '__main__':
+    main()
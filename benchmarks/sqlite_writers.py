@@ -0,0 +1,123 @@
+# benchmarks/sqlite_writers.py
+"""
+Конкурентная запись в одну базу SQLite из нескольких процессов (как веб-приложение и боты).
+
+Писатели создают заявки и меняют их статус, читатели листают админ-панель. Сравниваются
+прежние настройки (без прагм и опций движка) и профиль из Config (WAL, busy_timeout и т.д.):
+    python -m benchmarks.sqlite_writers --writers 6 --readers 2 --seconds 10
+"""
+
+import argparse
+import multiprocessing
+import random
+import time
+
+from benchmarks.common import bench_config, drop_db, make_app, seed
+
+PROFILES = ('legacy', 'tuned')
+
+
+def profile_config(db_path, profile):
+    config = bench_config(db_path)
+    if profile == 'legacy':
+        class LegacyConfig(config):
+            SQLITE_PRAGMAS = {}
+            SQLALCHEMY_ENGINE_OPTIONS = {}
+        return LegacyConfig
+    return config
+
+
+def writer(db_path, profile, seconds, seed_value, results):
+    from app import create_app
+    from app.model import Order, ORDER_STATUSES
+    from app.order_status import change_order_status
+    from database import db
+
+    app = create_app(profile_config(db_path, profile))
+    rnd = random.Random(seed_value)
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    with app.app_context():
+        max_id = db.session.query(db.func.max(Order.id)).scalar()
+        while time.monotonic() < deadline:
+            try:
+                order = Order(client_id=rnd.randint(1, 100), disinsector_id=rnd.randint(1, 20),
+                              object_type='home', insect_quantity='less_50', disinsect_experience=False)
+                db.session.add(order)
+                db.session.commit()
+                change_order_status(rnd.randint(1, max_id), rnd.choice(ORDER_STATUSES))
+                done += 2
+            except Exception:
+                db.session.rollback()
+                errors += 1
+    results.put(('write', done, errors))
+
+
+def reader(db_path, profile, seconds, results):
+    from app import create_app
+    from app.order_queries import fetch_orders_page
+    from app.order_stats import disinsector_report
+    from database import db
+
+    app = create_app(profile_config(db_path, profile))
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    with app.app_context():
+        while time.monotonic() < deadline:
+            try:
+                fetch_orders_page(page_size=50)
+                disinsector_report()
+                done += 1
+            except Exception:
+                db.session.rollback()
+                errors += 1
+            finally:
+                db.session.remove()
+    results.put(('read', done, errors))
+
+
+def run(profile, writers, readers, seconds, orders):
+    app = make_app()
+    db_path = app.config['BENCH_DB_PATH']
+    with app.app_context():
+        seed(disinsectors=20, orders=orders, clients=100)
+
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    processes = [ctx.Process(target=writer, args=(db_path, profile, seconds, n, results)) for n in range(writers)]
+    processes += [ctx.Process(target=reader, args=(db_path, profile, seconds, results)) for _ in range(readers)]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    drop_db(db_path)
+
+    summary = {'write': [0, 0], 'read': [0, 0]}
+    for kind, done, errors in totals:
+        summary[kind][0] += done
+        summary[kind][1] += errors
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=6)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--orders', type=int, default=20000, help='заявок в базе перед запуском')
+    parser.add_argument('--profile', choices=PROFILES, help='запустить только один профиль')
+    args = parser.parse_args()
+
+    print(f"писателей: {args.writers}, читателей: {args.readers}, длительность: {args.seconds} с")
+    for profile in ([args.profile] if args.profile else PROFILES):
+        summary = run(profile, args.writers, args.readers, args.seconds, args.orders)
+        writes, write_errors = summary['write']
+        reads, read_errors = summary['read']
+        print(f"{profile:>7}: записей {writes / args.seconds:8.1f}/с (ошибок {write_errors}), "
+              f"страниц {reads / args.seconds:8.1f}/с (ошибок {read_errors})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/telegram_sender.py
+"""
+Проверка и замер очереди исходящих сообщений против локальной заглушки Bot API.
+
+Отправляет сообщения в несколько чатов из нескольких потоков (как Flask-view),
+заглушка отвечает 429 на часть запросов. В конце проверяется, что все сообщения
+доставлены, порядок в каждом чате сохранен, а интервал между сообщениями в чат
+и общая частота не превышают лимитов:
+    python -m benchmarks.telegram_sender --messages 300 --chats 30
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import wait
+
+from app.telegram_sender import TelegramSender
+from benchmarks.fake_telegram import FakeTelegramServer
+
+TOKEN = '100001:BENCHSENDER'
+
+
+def run(messages, chats, threads, flood_every, global_rate, chat_rate, port):
+    server = FakeTelegramServer(port=port, flood_every=flood_every, retry_after=1)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+
+    sender = TelegramSender(api_url=server.base_url, global_rate=global_rate, chat_rate=chat_rate).start()
+    futures = []
+    lock = threading.Lock()
+
+    def producer(offset):
+        for i in range(offset, messages, threads):
+            future = sender.enqueue(TOKEN, 1000 + i % chats, f'{offset} {i}')
+            with lock:
+                futures.append(future)
+
+    start = time.perf_counter()
+    enqueue_start = time.perf_counter()
+    workers = [threading.Thread(target=producer, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    enqueue_seconds = time.perf_counter() - enqueue_start
+    wait(futures)
+    seconds = time.perf_counter() - start
+    sender.stop()
+
+    failed = sum(1 for f in futures if f.exception() is not None)
+    delivered = [call for call in server.calls_of('sendMessage')]
+    per_chat = {}
+    for at, _, _, params in delivered:
+        per_chat.setdefault(params['chat_id'], []).append((at, params['text']))
+
+    min_gap = min(
+        (b[0] - a[0] for sends in per_chat.values() for a, b in zip(sends, sends[1:])),
+        default=0,
+    )
+    # Внутри одного отправителя сообщения в чат должны уйти в порядке постановки
+    ordered = True
+    for sends in per_chat.values():
+        last_index = {}
+        for _, text in dedupe(sends):
+            producer_id, index = map(int, text.split())
+            if index < last_index.get(producer_id, -1):
+                ordered = False
+            last_index[producer_id] = index
+    asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+    print(f"сообщений: {messages}, чатов: {chats}, потоков-отправителей: {threads}")
+    print(f"постановка в очередь: {enqueue_seconds * 1000:.1f} мс всего, "
+          f"{enqueue_seconds / messages * 1e6:.1f} мкс на сообщение")
+    print(f"доставлено: {messages - failed}, ошибок: {failed}, ответов 429: {server.flood_responses}")
+    print(f"время доставки: {seconds:.2f} с, {(messages - failed) / seconds:.1f} сообщений/с "
+          f"(лимит {global_rate}/с)")
+    print(f"минимальный интервал в одном чате: {min_gap:.3f} с (лимит {1 / chat_rate:.3f} с)")
+    print(f"порядок в чатах сохранен: {'да' if ordered else 'НЕТ'}")
+    return failed == 0 and ordered
+
+
+def dedupe(sends):
+    # Повторы после 429 дают дубликаты запросов с тем же текстом
+    seen = set()
+    result = []
+    for at, text in sends:
+        if text not in seen:
+            seen.add(text)
+            result.append((at, text))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--chats', type=int, default=30)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--flood-every', type=int, default=50, help='каждый N-й запрос получает 429 (0 - никогда)')
+    parser.add_argument('--global-rate', type=float, default=30)
+    parser.add_argument('--chat-rate', type=float, default=1)
+    parser.add_argument('--port', type=int, default=8082)
+    args = parser.parse_args()
+    ok = run(args.messages, args.chats, args.threads, args.flood_every, args.global_rate, args.chat_rate, args.port)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
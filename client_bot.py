@@ -1,31 +1,29 @@
 import asyncio
+import hmac
 import logging
 import re
+import signal
+from aiohttp import web
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
 from keyboards import *
 from config import Config
-from app import create_app
+from app import create_db_app
+from app.assignment import assign_and_notify_disinsector
+from app.bot_db import init_bot_db, run_db, shutdown_bot_db
+from app.bot_metrics import HandlerMetricsMiddleware, fsm_refresher, start_metrics_server
+from app.bot_session import create_bot_session
+from app.entity_cache import cache_stats_loop, get_client_id, remember_client
+from app.fsm_storage import create_fsm_storage
+from app.logging_setup import configure_logging, log_context_middleware
 from app.model import Client, Order, Disinsector
+from app.update_queue import UpdateQueue
 from database import db
-from disinsector_bot import assign_and_notify_disinsector
 
-# Настройка логирования
+# Обработчики логов настраивает main() (app.logging_setup), модуль только получает логгер
 logger = logging.getLogger('client_bot')
-logger.setLevel(logging.INFO)
-
-file_handler = logging.FileHandler('client_bot.log')
-stream_handler = logging.StreamHandler()
-
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-stream_handler.setFormatter(formatter)
-
-logger.addHandler(file_handler)
-logger.addHandler(stream_handler)
 
 # Инициализация бота и диспетчера
 client_token = Config.CLIENT_BOT_TOKEN
@@ -36,9 +34,13 @@ if not client_token:
 else:
     logger.info("CLIENT_BOT_TOKEN успешно загружен.")
 
-bot_client = Bot(token=client_token)
-storage = MemoryStorage()
+# Сессия учитывает TELEGRAM_API_URL (локальный Bot API или заглушка в бенчмарках)
+bot_client = Bot(token=client_token, session=create_bot_session())
+storage = create_fsm_storage()
 dp = Dispatcher(bot=bot_client, storage=storage)
+dp.update.outer_middleware(log_context_middleware)
+dp.message.middleware(HandlerMetricsMiddleware('client'))
+dp.callback_query.middleware(HandlerMetricsMiddleware('client'))
 
 # FSM States
 class ClientForm(StatesGroup):
@@ -123,6 +125,33 @@ async def process_phone_text(message: types.Message, state: FSMContext):
     await message.answer("Пожалуйста, введите ваш домашний адрес:")
     await state.set_state(ClientForm.address)
 
+def create_order_from_form(user_data):
+    """
+    Сохраняет клиента (если его еще нет) и новую заявку. Возвращает id заявки.
+    id постоянного клиента берется из кэша процесса по телефону.
+    """
+    client_id = get_client_id(user_data['phone'])
+    if client_id is None:
+        client = Client(name=user_data['name'], phone=user_data['phone'], address=user_data['address'])
+        db.session.add(client)
+        db.session.flush()
+        client_id = client.id
+
+    # Создаем новую заявку
+    disinsect_experience = user_data['disinsect_experience'] == 'yes'
+    new_order = Order(
+        client_id=client_id,
+        object_type=user_data['object_type'],
+        insect_quantity=user_data['insect_quantity'],
+        disinsect_experience=disinsect_experience,
+        order_status='Новая'
+    )
+    db.session.add(new_order)
+    db.session.commit()
+    remember_client(user_data['phone'], client_id)
+    return new_order.id
+
+
 @dp.message(ClientForm.address)
 async def process_address(message: types.Message, state: FSMContext):
     try:
@@ -135,38 +164,23 @@ async def process_address(message: types.Message, state: FSMContext):
         # Получаем все данные из состояния
         user_data = await state.get_data()
 
-        # Сохраняем клиента в базе данных
-        client = Client.query.filter_by(phone=user_data['phone']).first()
-        if not client:
-            client = Client(name=user_data['name'], phone=user_data['phone'], address=user_data['address'])
-            db.session.add(client)
-            db.session.commit()
-
-        # Создаем новую заявку
-        disinsect_experience = user_data['disinsect_experience'] == 'yes'
-        new_order = Order(
-            client_id=client.id,
-            object_type=user_data['object_type'],
-            insect_quantity=user_data['insect_quantity'],
-            disinsect_experience=disinsect_experience,
-            order_status='Новая'
-        )
-        db.session.add(new_order)
-        db.session.commit()
+        # Сохраняем клиента и заявку в базе данных (в пуле потоков, не блокируя других пользователей)
+        order_id = await run_db(create_order_from_form, user_data)
 
-        logger.info(f"Заявка {new_order.id} успешно создана.")
+        logger.info(f"Заявка {order_id} успешно создана.", extra={'order_id': order_id})
 
         # Назначаем дезинсектора и отправляем уведомление
 
-        assigned_disinsector = await assign_and_notify_disinsector(new_order)
+        assigned_disinsector = await assign_and_notify_disinsector(order_id)
 
         if assigned_disinsector:
-            new_order.disinsector_id = assigned_disinsector.id
-            db.session.commit()  # Сохраняем обновленный заказ с disinsector_id
-            logger.info(f"Заявка {new_order.id} назначена дезинсектору {assigned_disinsector.name}")
+            logger.info(
+                f"Заявка {order_id} назначена дезинсектору {assigned_disinsector['name']}",
+                extra={'order_id': order_id, 'disinsector_id': assigned_disinsector['id']},
+            )
             await message.answer("Спасибо! Ваша заявка принята и назначена дезинсектору. Мы скоро свяжемся с вами.")
         else:
-            logger.warning("Нет доступных дезинсекторов для назначения заявки.")
+            logger.warning("Нет доступных дезинсекторов для назначения заявки.", extra={'order_id': order_id})
             await message.answer("Ваша заявка принята, но пока нет доступного дезинсектора. Мы свяжемся с вами позже.")
 
 
@@ -177,10 +191,94 @@ async def process_address(message: types.Message, state: FSMContext):
         await message.answer("Произошла ошибка при обработке заявки. Пожалуйста, попробуйте снова.")
 
 
+def create_webhook_app(queue, secret_token=None, enqueue_timeout=1.0):
+    """
+    aiohttp-приложение webhook: апдейт ставится в очередь, и Telegram сразу получает 200.
+    Если очередь полна дольше enqueue_timeout или бот останавливается - 503, Telegram повторит доставку.
+    """
+    async def handle(request):
+        if secret_token and not hmac.compare_digest(
+            request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), secret_token
+        ):
+            return web.Response(status=401)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if await queue.put(update, enqueue_timeout):
+            return web.Response()
+        return web.Response(status=503)
+
+    web_app = web.Application()
+    web_app.router.add_post(Config.CLIENT_WEBHOOK_PATH, handle)
+    return web_app
+
+
+async def run_webhook(stop=None):
+    """
+    Принимает апдейты через webhook до сигнала остановки (или события stop), затем закрывает
+    прием и дообрабатывает принятые апдейты не дольше CLIENT_WEBHOOK_DRAIN_TIMEOUT.
+    Возвращает число апдейтов, которые не успели обработаться.
+    """
+    queue = UpdateQueue(
+        dp, bot_client, 'client', workers=Config.CLIENT_WEBHOOK_WORKERS, max_pending=Config.CLIENT_WEBHOOK_MAX_PENDING,
+    )
+    await dp.emit_startup(bot=bot_client)
+    queue.start()
+    runner = web.AppRunner(
+        create_webhook_app(queue, Config.WEBHOOK_SECRET, Config.CLIENT_WEBHOOK_ENQUEUE_TIMEOUT), access_log=None,
+    )
+    await runner.setup()
+    await web.TCPSite(runner, Config.CLIENT_WEBHOOK_HOST, Config.CLIENT_WEBHOOK_PORT).start()
+    await bot_client.set_webhook(
+        f"{Config.WEBHOOK_BASE_URL}{Config.CLIENT_WEBHOOK_PATH}",
+        secret_token=Config.WEBHOOK_SECRET,
+        max_connections=Config.CLIENT_WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logger.info(
+        f"Webhook-сервер клиентского бота запущен на {Config.CLIENT_WEBHOOK_HOST}:{Config.CLIENT_WEBHOOK_PORT}, "
+        f"обработчиков {queue.workers}, очередь до {queue.max_pending} апдейтов"
+    )
+    if stop is None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        # Сначала закрываем прием: новые апдейты Telegram придержит и доставит после перезапуска
+        await runner.cleanup()
+        dropped = await queue.drain(Config.CLIENT_WEBHOOK_DRAIN_TIMEOUT)
+        # Как после start_polling: shutdown закрывает хранилище FSM (сбрасывает отложенную запись)
+        await dp.emit_shutdown(bot=bot_client)
+        await bot_client.session.close()
+    logger.info(f"Webhook-сервер клиентского бота остановлен, не обработано апдейтов: {dropped}")
+    return dropped
+
+
 async def main():
-    app = create_app()
-    with app.app_context():  # Используем обычный синхронный контекст
-        await dp.start_polling(bot_client)
+    configure_logging('client_bot')
+    app = create_db_app()
+    init_bot_db(app)
+    stats_task = asyncio.create_task(cache_stats_loop(logger))
+    metrics_runner = None
+    if Config.CLIENT_BOT_METRICS_PORT:
+        metrics_runner = await start_metrics_server(
+            Config.METRICS_HOST, Config.CLIENT_BOT_METRICS_PORT, [fsm_refresher(storage)],
+        )
+    logger.info(f"Запуск клиентского бота в режиме {Config.CLIENT_BOT_MODE}")
+    try:
+        if Config.CLIENT_BOT_MODE == 'webhook':
+            await run_webhook()
+        else:
+            await dp.start_polling(bot_client)
+    finally:
+        stats_task.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        shutdown_bot_db()
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -11,8 +11,153 @@ class Config:
 
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(basedir / 'entoforce_database.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Одну базу SQLite пишут веб-приложение и оба бота: WAL дает читателям не блокировать
+    # писателя, busy_timeout заставляет ждать блокировку вместо ошибки "database is locked".
+    # Прагмы применяются к каждому новому соединению (database.configure_sqlite).
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 15000))  # мс
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),  # в режиме WAL безопасно и без fsync на каждый коммит
+        'busy_timeout': SQLITE_BUSY_TIMEOUT,
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -20000)),  # отрицательное значение - в КиБ
+        'temp_store': 'MEMORY',
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        # Пул не меньше числа потоков BOT_DB_WORKERS, плюс запас для веб-запросов
+        'pool_size': int(os.getenv('SQLALCHEMY_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('SQLALCHEMY_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('SQLALCHEMY_POOL_TIMEOUT', 30)),
+        'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT / 1000},
+    }
     SECRET_KEY = os.getenv('SECRET_KEY', 'your_secret_key')  # Используйте переменные окружения для безопасности
     CLIENT_BOT_TOKEN = os.getenv('CLIENT_BOT_TOKEN', 'YOUR_CLIENT_BOT_TOKEN_HERE')
     API_KEY = os.getenv('API_KEY', 'your_default_api_key')
-    LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+    LOG_FILE = os.getenv('LOG_FILE', 'app.log')  # Лог веб-приложения; боты пишут в LOG_DIR/<сервис>.log
+    ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', 50))  # Заявок на странице админ-панели
+    # Массовый импорт заявок (/api/orders/bulk): размер пачки INSERT, предел строк на запрос
+    # и сколько ошибок по строкам вернуть в ответе (остальные только считаются)
+    BULK_IMPORT_CHUNK_SIZE = int(os.getenv('BULK_IMPORT_CHUNK_SIZE', 1000))
+    BULK_IMPORT_MAX_ROWS = int(os.getenv('BULK_IMPORT_MAX_ROWS', 200000))
+    BULK_IMPORT_MAX_ERRORS = int(os.getenv('BULK_IMPORT_MAX_ERRORS', 1000))
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))  # Строк, читаемых с курсора за раз при выгрузке
+
+    # Обновление дашбордов через Server-Sent Events. Открытый поток занимает обработчик
+    # веб-сервера на SSE_MAX_DURATION секунд, поэтому длинные потоки - только с асинхронными
+    # воркерами (gunicorn -k gevent). По умолчанию 0: короткий опрос, одна проверка на запрос,
+    # и браузер переподключается через SSE_POLL_INTERVAL - подходит для синхронных воркеров.
+    SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', 1.0))  # Как часто проверять маркер изменений, сек
+    SSE_HEARTBEAT = int(os.getenv('SSE_HEARTBEAT', 15))  # Комментарий-пинг, чтобы прокси не закрывали соединение
+    SSE_MAX_DURATION = int(os.getenv('SSE_MAX_DURATION', 0))  # После этого браузер переподключается
+    SSE_BATCH = int(os.getenv('SSE_BATCH', 200))  # Заявок в одном событии
+    SSE_LAG = float(os.getenv('SSE_LAG', 1.0))  # Отставание от текущего времени, чтобы не пропустить поздние коммиты
+
+    # Условные GET (ETag/Last-Modified) и кэш отрисованных строк таблиц дашбордов
+    DASHBOARD_FRAGMENT_CACHE_SIZE = int(os.getenv('DASHBOARD_FRAGMENT_CACHE_SIZE', 256))  # 0 - кэш выключен
+    DASHBOARD_FRAGMENT_CACHE_TTL = int(os.getenv('DASHBOARD_FRAGMENT_CACHE_TTL', 600))  # Сек, старые версии вытесняются раньше
+
+    # Telegram: пул соединений и адрес Bot API (можно указать локальный сервер для тестов)
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')  # например http://localhost:8081
+    TELEGRAM_POOL_LIMIT = int(os.getenv('TELEGRAM_POOL_LIMIT', 100))  # Исходящие вызовы, getUpdates long polling - сверх лимита
+    # Лимиты Telegram: около 30 сообщений в секунду на бота (на каждый токен) и не чаще 1 сообщения в секунду в один чат
+    TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))
+    TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', 1))
+    TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', 5))
+
+    # Режим работы ботов дезинсекторов: polling или webhook
+    DISINSECTOR_BOT_MODE = os.getenv('DISINSECTOR_BOT_MODE', 'polling')
+    WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')
+    WEBHOOK_PATH = '/webhook/disinsector/{disinsector_id}'
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+    WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+    WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+
+    # Режим клиентского бота: polling или webhook (адрес - WEBHOOK_BASE_URL + CLIENT_WEBHOOK_PATH,
+    # секрет - WEBHOOK_SECRET). В режиме webhook апдейты проходят через ограниченную очередь
+    # (app.update_queue): не больше CLIENT_WEBHOOK_WORKERS одновременно и по одному в каждом чате.
+    CLIENT_BOT_MODE = os.getenv('CLIENT_BOT_MODE', 'polling')
+    CLIENT_WEBHOOK_PATH = '/webhook/client'
+    CLIENT_WEBHOOK_HOST = os.getenv('CLIENT_WEBHOOK_HOST', '0.0.0.0')
+    CLIENT_WEBHOOK_PORT = int(os.getenv('CLIENT_WEBHOOK_PORT', 8082))
+    CLIENT_WEBHOOK_WORKERS = int(os.getenv('CLIENT_WEBHOOK_WORKERS', 32))
+    CLIENT_WEBHOOK_MAX_PENDING = int(os.getenv('CLIENT_WEBHOOK_MAX_PENDING', 1000))
+    # Сколько webhook-запрос ждет места в полной очереди, прежде чем ответить 503 (Telegram повторит доставку)
+    CLIENT_WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv('CLIENT_WEBHOOK_ENQUEUE_TIMEOUT', 1.0))
+    CLIENT_WEBHOOK_MAX_CONNECTIONS = int(os.getenv('CLIENT_WEBHOOK_MAX_CONNECTIONS', 40))  # параметр setWebhook, 1-100
+    # Сколько секунд при остановке дообрабатывать уже принятые апдейты
+    CLIENT_WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('CLIENT_WEBHOOK_DRAIN_TIMEOUT', 25))
+
+    # Размер пула потоков, в котором боты выполняют запросы к базе
+    BOT_DB_WORKERS = int(os.getenv('BOT_DB_WORKERS', 4))
+
+    # Хранилище состояний диалогов (FSM) ботов: отдельный файл SQLite с отложенной записью
+    FSM_STORAGE_PATH = os.getenv('FSM_STORAGE_PATH', str(basedir / 'fsm_state.db'))
+    FSM_FLUSH_INTERVAL = float(os.getenv('FSM_FLUSH_INTERVAL', 1.0))  # секунды
+    FSM_FLUSH_BATCH = int(os.getenv('FSM_FLUSH_BATCH', 500))
+    FSM_CACHE_SIZE = int(os.getenv('FSM_CACHE_SIZE', 10000))  # диалогов в памяти
+    FSM_IDLE_TTL = int(os.getenv('FSM_IDLE_TTL', 3600))  # через сколько секунд простоя диалог вытесняется из памяти
+
+    # Кэш профилей дезинсекторов и клиентов в процессах ботов
+    ENTITY_CACHE_SIZE = int(os.getenv('ENTITY_CACHE_SIZE', 10000))  # Записей в каждом кэше, 0 - кэш выключен
+    ENTITY_CACHE_TTL = int(os.getenv('ENTITY_CACHE_TTL', 300))  # Сек: столько могут жить изменения из других процессов
+    ENTITY_CACHE_STATS_INTERVAL = int(os.getenv('ENTITY_CACHE_STATS_INTERVAL', 300))  # Как часто писать статистику в лог
+
+    # Логирование (app.logging_setup): запись в файл в отдельном потоке, JSON по строке на запись.
+    # Каждый процесс пишет свой файл: несколько процессов не должны ротировать один и тот же.
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_DIR = os.getenv('LOG_DIR', '.')
+    LOG_ROTATION = os.getenv('LOG_ROTATION', 'size')  # size - по LOG_MAX_BYTES, time - по LOG_ROTATE_WHEN
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 50 * 1024 * 1024))
+    LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', 'midnight')
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 10))
+    LOG_CONSOLE = os.getenv('LOG_CONSOLE', 'true').lower() == 'true'
+    LOG_CONSOLE_FORMAT = os.getenv('LOG_CONSOLE_FORMAT', 'text')  # text или json (для сборщиков логов из stdout)
+
+    # Метрики Prometheus: /metrics веб-приложения и отдельный HTTP-слушатель в каждом боте
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # Если задан, нужен заголовок Authorization: Bearer <токен>
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    CLIENT_BOT_METRICS_PORT = int(os.getenv('CLIENT_BOT_METRICS_PORT', 9101))  # 0 - не запускать
+    DISINSECTOR_BOT_METRICS_PORT = int(os.getenv('DISINSECTOR_BOT_METRICS_PORT', 9102))
+
+    # Контроль SQL-запросов (app.query_monitor): лог медленных, поиск N+1 и бюджеты маршрутов
+    QUERY_MONITOR_ENABLED = os.getenv('QUERY_MONITOR_ENABLED', 'true').lower() == 'true'
+    SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 200))  # 0 - не писать медленные запросы в лог
+    N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 10))  # Одинаковых запросов на запрос/апдейт, 0 - выкл.
+    QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', 0))  # Для маршрутов без @query_budget, 0 - без ограничения
+    # Строгий режим для тестов и проверок: нарушение бросает QueryBudgetExceeded вместо записи в лог
+    QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+
+    # Куча свободной емкости в памяти процесса: выбор кандидата без запроса к таблице на каждую заявку
+    ASSIGNMENT_CAPACITY_HEAP = os.getenv('ASSIGNMENT_CAPACITY_HEAP', 'false').lower() == 'true'
+    ASSIGNMENT_CAPACITY_HEAP_TTL = int(os.getenv('ASSIGNMENT_CAPACITY_HEAP_TTL', 30))
+
+    # Как часто (в секундах) повторно распределять неназначенные заявки
+    BACKLOG_DISPATCH_INTERVAL = int(os.getenv('BACKLOG_DISPATCH_INTERVAL', 60))
+    # Как часто сверять load дезинсекторов с фактическим числом активных заявок
+    LOAD_RECONCILE_INTERVAL = int(os.getenv('LOAD_RECONCILE_INTERVAL', 3600))
+
+    # Фоновая очередь заявок из API (order_jobs): опрос, размер пачки, аренда и число попыток
+    ORDER_JOB_POLL_INTERVAL = float(os.getenv('ORDER_JOB_POLL_INTERVAL', 1.0))
+    ORDER_JOB_BATCH = int(os.getenv('ORDER_JOB_BATCH', 20))
+    ORDER_JOB_LEASE = int(os.getenv('ORDER_JOB_LEASE', 60))  # секунды
+    ORDER_JOB_MAX_ATTEMPTS = int(os.getenv('ORDER_JOB_MAX_ATTEMPTS', 5))
+    # Сколько дней хранить выполненные задачи; удаляет flask prune-order-jobs (по cron)
+    ORDER_JOB_RETENTION_DAYS = int(os.getenv('ORDER_JOB_RETENTION_DAYS', 7))
+
+    # Outbox уведомлений: relay в процессе ботов дезинсекторов или отдельно (python outbox_relay.py)
+    OUTBOX_RELAY_IN_BOT = os.getenv('OUTBOX_RELAY_IN_BOT', 'true').lower() == 'true'
+    # Интервал опроса outbox - верхняя граница задержки уведомлений о заявках из клиентского
+    # бота и API: relay будится сразу только назначениями в своем процессе
+    OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 1.0))
+    OUTBOX_BATCH = int(os.getenv('OUTBOX_BATCH', 50))
+    OUTBOX_LEASE = int(os.getenv('OUTBOX_LEASE', 120))  # секунды; больше худшего времени отправки с повторами
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+    # Сколько дней хранить отправленные уведомления; удаляет flask prune-outbox (по cron)
+    OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', 30))
+
+    # Отчеты по дезинсекторам из сводной таблицы, которая обновляется вместе с заявками.
+    # После включения заполните ее один раз: flask rebuild-order-stats
+    REPORTS_SUMMARY_TABLE = os.getenv('REPORTS_SUMMARY_TABLE', 'false').lower() == 'true'
 
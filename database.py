@@ -1,3 +1,34 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
 
 db = SQLAlchemy()
+
+
+def dialect_insert(table):
+    """
+    INSERT с поддержкой ON CONFLICT для текущей СУБД (SQLite или PostgreSQL).
+    """
+    dialects = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+    dialect_name = db.session.get_bind().dialect.name
+    if dialect_name not in dialects:
+        raise RuntimeError(f"INSERT ... ON CONFLICT не поддерживается для {dialect_name}.")
+    return dialects[dialect_name](table)
+
+
+def configure_sqlite(engine, pragmas):
+    """
+    Применяет PRAGMA к каждому новому соединению SQLite из пула движка.
+    Для других СУБД ничего не делает.
+    """
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
@@ -1,31 +1,37 @@
 import asyncio
+import hmac
 import logging
-from datetime import datetime
-from sqlite3 import IntegrityError
 
-from aiogram import Bot, Dispatcher, types, F
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher, Router, types, F
 from aiogram.filters import CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.fsm.storage.memory import MemoryStorage
-from app.model import Disinsector, Order
+from aiogram.webhook.aiohttp_server import BaseRequestHandler, setup_application
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app.assignment import assign_order, dispatch_backlog
+from app.bot_db import init_bot_db, run_db, shutdown_bot_db
+from app.bot_metrics import HandlerMetricsMiddleware, fsm_refresher, start_metrics_server
+from app.bot_session import create_bot_session
+from app.entity_cache import (
+    cache_stats_loop, get_disinsector_id_by_telegram_user, get_disinsector_profile, invalidate_disinsector,
+)
+from app.fsm_storage import create_fsm_storage
+from app.logging_setup import configure_logging, log_context_middleware
+from app.model import Disinsector, JOB_ASSIGN, JOB_DISPATCH_BACKLOG
+from app.order_jobs import claim_order_jobs, finish_order_job
+from app.order_queries import oldest_new_order_query
+from app.order_status import STATUS_IN_PROGRESS, change_order_status, reconcile_loads
 from database import db
-from app.utils import send_telegram_message
 from config import Config
-from app import create_app
-from keyboards import inl_kb_accept_order, inl_kb_chemical_type, inl_kb_poison_type, inl_kb_insect_type
+from app import create_db_app
+from app.outbox import wake_outbox_relay
+from outbox_relay import outbox_relay_loop
+from keyboards import inl_kb_chemical_type, inl_kb_poison_type, inl_kb_insect_type
 
-# Настройка логирования
+# Обработчики логов настраивает disinsector_bot_main() (app.logging_setup)
 logger = logging.getLogger('disinsector_bot')
-logger.setLevel(logging.INFO)
-
-file_handler = logging.FileHandler('disinsector_bot.log')
-stream_handler = logging.StreamHandler()
-
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
-logger.addHandler(stream_handler)
 
 # Определение состояний FSM
 class OrderForm(StatesGroup):
@@ -36,212 +42,402 @@ class OrderForm(StatesGroup):
     insect_type = State()  # Тип насекомых
     estimated_cost = State()  # Оценка стоимости
 
-# Асинхронная функция запуска бота дезинсектора
-async def start_disinsector_bot(token, disinsector_id):
-    storage = MemoryStorage()
-    bot = Bot(token=token)  # Здесь создаем объект bot
-    dp = Dispatcher(bot=bot, storage=storage)
+# Общий роутер для всех ботов дезинсекторов: обработчики регистрируются один раз,
+# а конкретный дезинсектор определяется по боту, получившему апдейт.
+router = Router(name='disinsector_bot')
+router.message.middleware(HandlerMetricsMiddleware('disinsector'))
+router.callback_query.middleware(HandlerMetricsMiddleware('disinsector'))
 
-    @dp.message(CommandStart())
-    async def start_command(message: types.Message, state: FSMContext):
-        try:
-            telegram_user_id = message.from_user.id
-            logger.info(f"Получен запрос на регистрацию от telegram_user_id={telegram_user_id} для дезинсектора id={disinsector_id}")
-
-            # Получаем дезинсектора по его уникальному id, используя Session.get()
-            disinsector = db.session.get(Disinsector, disinsector_id)
-            if not disinsector:
-                await message.answer("Ошибка авторизации. Некорректный токен.")
-                logger.error(f"Дезинсектор с id {disinsector_id} не найден.")
-                return
-
-            logger.info(f"Дезинсектор найден: {disinsector.id}, {disinsector.name}")
-
-            # Проверяем, имеет ли дезинсектор уже telegram_user_id
-            if disinsector.telegram_user_id:
-                if disinsector.telegram_user_id == telegram_user_id:
-                    await message.answer(f"Добро пожаловать снова, {disinsector.name}! Вы уже зарегистрированы.")
-                    logger.info(f"Дезинсектор {disinsector.name} ({disinsector.id}) уже зарегистрирован с telegram_user_id {telegram_user_id}")
-                else:
-                    await message.answer("Этот дезинсектор уже привязан к другому Telegram аккаунту.")
-                    logger.warning(f"Дезинсектор id={disinsector.id} уже привязан к другому telegram_user_id={disinsector.telegram_user_id}")
-                return
-
-            # Проверяем, привязан ли telegram_user_id к другому дезинсектору
-            existing_disinsector = db.session.query(Disinsector).filter_by(telegram_user_id=telegram_user_id).first()
-
-            if existing_disinsector:
-                await message.answer("Этот Telegram аккаунт уже привязан к другому дезинсектору.")
-                logger.warning(f"Пользователь с telegram_user_id={telegram_user_id} уже привязан к дезинсектору id={existing_disinsector.id}")
-                return
-
-            # Привязываем telegram_user_id к текущему дезинсектору, если он не привязан
-            disinsector.telegram_user_id = telegram_user_id
-            logger.info(f"Попытка привязать telegram_user_id {telegram_user_id} к дезинсектору {disinsector.id}")
-            try:
-                db.session.flush()  # Принудительная синхронизация с базой данных
-                db.session.commit()
-                logger.info(f"telegram_user_id {telegram_user_id} успешно привязан к дезинсектору {disinsector.id}")
-            except IntegrityError as e:
-                db.session.rollback()
-                await message.answer("Произошла ошибка при привязке аккаунта. Попробуйте позже.")
-                logger.error(f"IntegrityError при привязке telegram_user_id={telegram_user_id} к дезинсектору id={disinsector.id}: {e}")
-                return
 
-            welcome_text = f"Добро пожаловать, {disinsector.name}! Вы успешно зарегистрировались и можете принимать заявки."
-            send_telegram_message(token, telegram_user_id, welcome_text)
+class DisinsectorContextMiddleware(BaseMiddleware):
+    """
+    Подставляет в обработчики disinsector_id по id бота, получившего апдейт.
+    """
+    async def __call__(self, handler, event, data):
+        bot_disinsectors = data.get('bot_disinsectors', {})
+        data['disinsector_id'] = bot_disinsectors.get(data['bot'].id)
+        return await handler(event, data)
 
-            await state.update_data(disinsector_id=disinsector.id)
 
-        except Exception as e:
-            logger.error(f"Произошла ошибка при обработке команды /start: {e}")
-            await message.answer("Произошла ошибка при обработке команды /start. Попробуйте позже.")
+def bind_telegram_user(disinsector_id, telegram_user_id):
+    """
+    Привязывает telegram_user_id к дезинсектору. Возвращает (результат, имя дезинсектора).
 
-        await bot.send_message(disinsector.telegram_user_id, message, reply_markup= inl_kb_accept_order)
-        logger.info(f"Уведомление отправлено дезинсектору {disinsector.name}")
+    Повторный /start уже привязанного дезинсектора решается по кэшу профилей без запросов к базе.
+    """
+    profile = get_disinsector_profile(disinsector_id)
+    if not profile:
+        logger.error(f"Дезинсектор с id {disinsector_id} не найден.")
+        return 'not_found', None
+
+    logger.info(f"Дезинсектор найден: {profile['id']}, {profile['name']}")
+
+    # Проверяем, имеет ли дезинсектор уже telegram_user_id
+    if profile['telegram_user_id']:
+        if profile['telegram_user_id'] == telegram_user_id:
+            logger.info(f"Дезинсектор {profile['name']} ({profile['id']}) уже зарегистрирован с telegram_user_id {telegram_user_id}")
+            return 'already_registered', profile['name']
+        logger.warning(f"Дезинсектор id={profile['id']} уже привязан к другому telegram_user_id={profile['telegram_user_id']}")
+        return 'bound_to_other_user', profile['name']
+
+    # Проверяем, привязан ли telegram_user_id к другому дезинсектору
+    existing_disinsector_id = get_disinsector_id_by_telegram_user(telegram_user_id)
+    if existing_disinsector_id:
+        logger.warning(f"Пользователь с telegram_user_id={telegram_user_id} уже привязан к дезинсектору id={existing_disinsector_id}")
+        return 'user_taken', profile['name']
+
+    # Привязываем telegram_user_id к текущему дезинсектору условным UPDATE: если его успели
+    # привязать параллельно, строка не обновится
+    logger.info(f"Попытка привязать telegram_user_id {telegram_user_id} к дезинсектору {disinsector_id}")
+    try:
+        bound = db.session.execute(
+            update(Disinsector)
+            .where(Disinsector.id == disinsector_id, Disinsector.telegram_user_id.is_(None))
+            .values(telegram_user_id=telegram_user_id)
+        ).rowcount
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        logger.error(f"IntegrityError при привязке telegram_user_id={telegram_user_id} к дезинсектору id={disinsector_id}: {e}")
+        return 'error', None
+    finally:
+        invalidate_disinsector(disinsector_id, telegram_user_id)
+    if not bound:
+        logger.warning(f"Дезинсектор id={disinsector_id} уже привязан к Telegram параллельным запросом")
+        return 'error', None
+    logger.info(f"telegram_user_id {telegram_user_id} успешно привязан к дезинсектору {disinsector_id}")
+    return 'registered', profile['name']
+
+
+@router.message(CommandStart())
+async def start_command(message: types.Message, state: FSMContext, disinsector_id: int):
+    try:
+        telegram_user_id = message.from_user.id
+        logger.info(f"Получен запрос на регистрацию от telegram_user_id={telegram_user_id} для дезинсектора id={disinsector_id}")
+
+        result, name = await run_db(bind_telegram_user, disinsector_id, telegram_user_id)
+        if result == 'not_found':
+            await message.answer("Ошибка авторизации. Некорректный токен.")
+            return
+        if result == 'already_registered':
+            await message.answer(f"Добро пожаловать снова, {name}! Вы уже зарегистрированы.")
+            return
+        if result == 'bound_to_other_user':
+            await message.answer("Этот дезинсектор уже привязан к другому Telegram аккаунту.")
+            return
+        if result == 'user_taken':
+            await message.answer("Этот Telegram аккаунт уже привязан к другому дезинсектору.")
+            return
+        if result == 'error':
+            await message.answer("Произошла ошибка при привязке аккаунта. Попробуйте позже.")
+            return
+
+        welcome_text = f"Добро пожаловать, {name}! Вы успешно зарегистрировались и можете принимать заявки."
+        await message.answer(welcome_text)
+
+        await state.update_data(disinsector_id=disinsector_id)
+
+    except Exception as e:
+        logger.error(f"Произошла ошибка при обработке команды /start: {e}")
+        await message.answer("Произошла ошибка при обработке команды /start. Попробуйте позже.")
 
 
-    # Обработчики для работы с заявкой
-    @dp.callback_query(F.data == 'accept_order_yes', StateFilter(OrderForm.accept_order))
-    async def accept_order(callback: types.CallbackQuery, state: FSMContext):
-        user_data = await state.get_data()
-        disinsector_id = user_data['disinsector_id']  # Используем disinsector_id из состояния
+def take_order_in_work(disinsector_id):
+    """
+    Переводит самую раннюю новую заявку дезинсектора в статус 'В процессе'. Возвращает id заявки или None.
+    """
+    order_id = oldest_new_order_query(disinsector_id).scalar()
+    if not order_id:
+        return None
+    if not change_order_status(order_id, STATUS_IN_PROGRESS, disinsector_id=disinsector_id):
+        return None
+    return order_id
+
+
+# Обработчики для работы с заявкой
+@router.callback_query(F.data == 'accept_order_yes', StateFilter(OrderForm.accept_order))
+async def accept_order(callback: types.CallbackQuery, state: FSMContext, disinsector_id: int):
+    # Получаем первую заявку с статусом 'Новая'
+    order_id = await run_db(take_order_in_work, disinsector_id)
+
+    if order_id:
+        await state.update_data(disinsector_id=disinsector_id, order_id=order_id)
+        await callback.answer("Заявка принята.")
+        await callback.message.answer("Вы приняли заявку. Укажите тип химиката для обработки.", reply_markup=inl_kb_chemical_type)
+        await state.set_state(OrderForm.chemical_type)
+    else:
+        await callback.answer("Ошибка, заявка не найдена.")
+
+
+@router.callback_query(StateFilter(OrderForm.chemical_type))
+async def process_chemical_type(callback: types.CallbackQuery, state: FSMContext):
+    await state.update_data(chemical_type=callback.data)
+    await callback.message.answer("Укажите площадь помещения (в кв.м).")
+    await state.set_state(OrderForm.area)
+
+@router.message(StateFilter(OrderForm.area))
+async def process_area(message: types.Message, state: FSMContext):
+    await state.update_data(area=message.text)
+    await message.answer("Укажите тип яда.", reply_markup=inl_kb_poison_type)
+    await state.set_state(OrderForm.poison_type)
+
+@router.callback_query(StateFilter(OrderForm.poison_type))
+async def process_poison_type(callback: types.CallbackQuery, state: FSMContext):
+    await state.update_data(poison_type=callback.data)
+    await callback.message.answer("Укажите тип насекомых.", reply_markup=inl_kb_insect_type)
+    await state.set_state(OrderForm.insect_type)
+
+@router.callback_query(StateFilter(OrderForm.insect_type))
+async def process_insect_type(callback: types.CallbackQuery, state: FSMContext):
+    await state.update_data(insect_type=callback.data)
+    await callback.message.answer("Укажите примерную стоимость.")
+    await state.set_state(OrderForm.estimated_cost)
+
+def save_order_estimate(disinsector_id, order_id, user_data, estimated_price):
+    """
+    Сохраняет данные осмотра по принятой заявке. Возвращает True, если заявка найдена.
+    """
+    if not order_id:
+        return False
+    result = change_order_status(
+        order_id,
+        STATUS_IN_PROGRESS,
+        disinsector_id=disinsector_id,
+        client_area=user_data['area'],
+        poison_type=user_data['poison_type'],
+        insect_type=user_data['insect_type'],
+        estimated_price=estimated_price,
+    )
+    return result is not None
+
+
+@router.message(StateFilter(OrderForm.estimated_cost))
+async def process_estimated_cost(message: types.Message, state: FSMContext, disinsector_id: int):
+    user_data = await state.get_data()
+    updated = await run_db(save_order_estimate, disinsector_id, user_data.get('order_id'), user_data, message.text)
+
+    if updated:
+        await message.answer("Данные заявки обновлены и заявка переведена в статус 'В процессе'.")
+    else:
+        await message.answer("Ошибка при обновлении заявки.")
+    await state.clear()
+
+# Событие "освободилась емкость": будит цикл пакетного назначения раньше срока.
+# Выставляется задачей JOB_DISPATCH_BACKLOG из order_jobs, которую ставит change_order_status
+capacity_changed = asyncio.Event()
+
+
+def request_backlog_dispatch():
+    """
+    Просит цикл пакетного назначения обработать очередь заявок без ожидания таймера.
+    Несколько запросов до пробуждения цикла сливаются в одно назначение.
+    """
+    capacity_changed.set()
 
-        # Получаем первую заявку с статусом 'Новая'
-        order = db.session.query(Order).filter_by(disinsector_id=disinsector_id, order_status='Новая').first()
 
-        if order:
-            order.order_status = 'В процессе'
-            db.session.commit()
-            await callback.answer("Заявка принята.")
-            await callback.message.answer("Вы приняли заявку. Укажите тип химиката для обработки.", reply_markup=inl_kb_chemical_type)
-            await state.set_state(OrderForm.chemical_type)
+async def backlog_dispatch_loop(interval=None):
+    """
+    Периодически (или по событию capacity_changed) назначает неназначенные заявки пакетом.
+    Раз в LOAD_RECONCILE_INTERVAL секунд перед назначением сверяет load с фактическими заявками.
+    """
+    interval = interval or Config.BACKLOG_DISPATCH_INTERVAL
+    reconciled_at = 0
+    while True:
+        try:
+            await asyncio.wait_for(capacity_changed.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        capacity_changed.clear()
+        try:
+            loop_time = asyncio.get_running_loop().time()
+            if loop_time - reconciled_at >= Config.LOAD_RECONCILE_INTERVAL:
+                await run_db(reconcile_loads)
+                reconciled_at = loop_time
+            assignments = await run_db(dispatch_backlog)
+            if assignments:
+                wake_outbox_relay()
+        except Exception as e:
+            logger.error(f"Ошибка в цикле пакетного назначения заявок: {e}")
 
-            # # Передаем заявку в общую функцию назначения и уведомления, передав объект bot
-            # assign_and_notify_disinsector(bot, order)  # Передаем bot в функцию
 
+async def process_order_job(job):
+    """
+    Выполняет одну задачу из очереди order_jobs: назначение дезинсектора и уведомление
+    или запрос пакетного назначения после освобождения емкости.
+    """
+    error = None
+    try:
+        if job['kind'] == JOB_ASSIGN:
+            assignment = await run_db(assign_order, job['order_id'])
+            # Если свободных нет, заявка останется в очереди пакетного назначения
+            if assignment:
+                wake_outbox_relay()
+        elif job['kind'] == JOB_DISPATCH_BACKLOG:
+            request_backlog_dispatch()
         else:
-            await callback.answer("Ошибка, заявка не найдена.")
-
-
-    @dp.callback_query(StateFilter(OrderForm.chemical_type))
-    async def process_chemical_type(callback: types.CallbackQuery, state: FSMContext):
-        await state.update_data(chemical_type=callback.data)
-        await callback.message.answer("Укажите площадь помещения (в кв.м).")
-        await state.set_state(OrderForm.area)
-
-    @dp.message(StateFilter(OrderForm.area))
-    async def process_area(message: types.Message, state: FSMContext):
-        await state.update_data(area=message.text)
-        await message.answer("Укажите тип яда.", reply_markup=inl_kb_poison_type)
-        await state.set_state(OrderForm.poison_type)
-
-    @dp.callback_query(StateFilter(OrderForm.poison_type))
-    async def process_poison_type(callback: types.CallbackQuery, state: FSMContext):
-        await state.update_data(poison_type=callback.data)
-        await callback.message.answer("Укажите тип насекомых.", reply_markup=inl_kb_insect_type)
-        await state.set_state(OrderForm.insect_type)
-
-    @dp.callback_query(StateFilter(OrderForm.insect_type))
-    async def process_insect_type(callback: types.CallbackQuery, state: FSMContext):
-        await state.update_data(insect_type=callback.data)
-        await callback.message.answer("Укажите примерную стоимость.")
-        await state.set_state(OrderForm.estimated_cost)
-
-    @dp.message(StateFilter(OrderForm.estimated_cost))
-    async def process_estimated_cost(message: types.Message, state: FSMContext):
-        user_data = await state.get_data()
-        order = db.session.query(Order).filter_by(disinsector_id=user_data['disinsector_id'], order_status='Новая').first()
-
-        if order:
-            order.chemical_type = user_data['chemical_type']
-            order.area = user_data['area']
-            order.poison_type = user_data['poison_type']
-            order.insect_type = user_data['insect_type']
-            order.estimated_cost = user_data['estimated_cost']
-            order.order_status = 'В процессе'
-            db.session.commit()
-            await message.answer("Данные заявки обновлены и заявка переведена в статус 'В процессе'.")
-        else:
-            await message.answer("Ошибка при обновлении заявки.")
-        await state.clear()
+            raise ValueError(f"Неизвестный тип задачи: {job['kind']}")
+    except Exception as e:
+        logger.error(
+            f"Ошибка обработки задачи {job['id']} по заявке {job['order_id']}: {e}", extra={'order_id': job['order_id']},
+        )
+        error = e
+    await run_db(finish_order_job, job['id'], error, Config.ORDER_JOB_MAX_ATTEMPTS)
 
-    await dp.start_polling(bot)
 
-# Функция назначения дезинсектора и уведомления
-async def assign_and_notify_disinsector(order):
+async def order_job_loop(interval=None):
     """
-    Назначает дезинсектора для заявки и отправляет ему уведомление.
+    Разбирает очередь order_jobs, которую наполняют API и смена статусов заявок. Пока задачи
+    есть, забирает их пачками без пауз; на пустой очереди опрашивает раз в interval секунд.
     """
-    try:
-        # Запрос доступных дезинсекторов
-        available_disinsectors = Disinsector.query.filter(
-            Disinsector.token.isnot(None),
-            Disinsector.telegram_user_id.isnot(None),
-            Disinsector.load < Disinsector.max_load
-        ).order_by(Disinsector.last_assigned).all()
-
-        if not available_disinsectors:
-            logger.warning(f"Заявка {order.id}: Нет доступных дезинсекторов для назначения.")
-            return None
-
-        # Назначение дезинсектора
-        disinsector = available_disinsectors[0]
-        order.disinsector_id = disinsector.id  # Присваиваем disinsector_id заказу
-        disinsector.last_assigned = datetime.utcnow()
-        disinsector.load += 1
-        db.session.commit()
+    interval = interval or Config.ORDER_JOB_POLL_INTERVAL
+    while True:
+        try:
+            jobs = await run_db(claim_order_jobs, Config.ORDER_JOB_BATCH, Config.ORDER_JOB_LEASE)
+            await asyncio.gather(*(process_order_job(job) for job in jobs))
+        except Exception as e:
+            logger.error(f"Ошибка в цикле обработки очереди заявок: {e}")
+            jobs = []
+        if len(jobs) < Config.ORDER_JOB_BATCH:
+            await asyncio.sleep(interval)
 
-        # Создаем бота с токеном дезинсектора и отправляем уведомление
-        bot_disinsector = Bot(token=disinsector.token)
-        await notify_new_order(bot_disinsector, disinsector, order)
 
-        return disinsector
+def create_disinsector_runtime(disinsectors, session=None, storage=None):
+    """
+    Собирает один Dispatcher для всех дезинсекторов.
 
-    except Exception as e:
-        logger.error(f"Ошибка при назначении дезинсектора для заявки {order.id}: {e}")
-        db.session.rollback()
-        return None
+    disinsectors - последовательность пар (disinsector_id, token). Для каждого токена
+    создается легкий объект Bot, но роутер, хранилище FSM и HTTP-сессия общие.
+    В режиме polling пул сессии увеличивается на число токенов под их getUpdates.
+    По умолчанию состояния диалогов хранятся в SQLite (app.fsm_storage).
+    Возвращает (dp, bots), где bots - словарь {disinsector_id: Bot}.
+    """
+    if session is None:
+        long_polls = len(disinsectors) if Config.DISINSECTOR_BOT_MODE == 'polling' else 0
+        session = create_bot_session(long_polls=long_polls)
+    dp = Dispatcher(storage=storage or create_fsm_storage())
+    dp.update.outer_middleware(DisinsectorContextMiddleware())
+    dp.update.outer_middleware(log_context_middleware)
+    dp.include_router(router)
+
+    bots = {disinsector_id: Bot(token=token, session=session) for disinsector_id, token in disinsectors}
+    dp['bot_disinsectors'] = {bot.id: disinsector_id for disinsector_id, bot in bots.items()}
+    return dp, bots
 
-# Функция уведомления дезинсектора
-async def notify_new_order(bot, disinsector, order):
+
+class DisinsectorWebhookHandler(BaseRequestHandler):
     """
-    Отправляет уведомление дезинсектору о новой заявке с кнопкой "Ок" для принятия.
+    Единый webhook-обработчик для всех ботов: бот выбирается по id дезинсектора из пути,
+    поэтому токены не попадают в URL.
     """
-    try:
-        buttons = inl_kb_accept_order
+    def __init__(self, dispatcher, bots, secret_token=None, **data):
+        super().__init__(dispatcher=dispatcher, **data)
+        self.bots = bots
+        self.secret_token = secret_token
+
+    def verify_secret(self, telegram_secret_token, bot):
+        if not self.secret_token:
+            return True
+        return hmac.compare_digest(telegram_secret_token or '', self.secret_token)
+
+    async def close(self):
+        # Сессия общая, поэтому достаточно закрыть ее один раз
+        for bot in self.bots.values():
+            await bot.session.close()
+            break
+
+    async def resolve_bot(self, request):
+        try:
+            disinsector_id = int(request.match_info['disinsector_id'])
+        except ValueError:
+            raise web.HTTPNotFound()
+        bot = self.bots.get(disinsector_id)
+        if bot is None:
+            raise web.HTTPNotFound()
+        return bot
 
-        message = (
-            f"🔔 Новая заявка №{order.id}.\n"
-            f"Имя: {order.client.name}\n"
-            f"Адрес: {order.client.address}\n"
-            f"Телефон: {order.client.phone}\n"
-            f"Объект: {order.object_type}\n"
 
-        )
+async def set_webhooks(bots, base_url, secret_token=None, concurrency=20):
+    """
+    Регистрирует webhook для каждого бота, не более concurrency запросов одновременно.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
 
+    async def set_one(disinsector_id, bot):
+        async with semaphore:
+            try:
+                await bot.set_webhook(
+                    f"{base_url}{Config.WEBHOOK_PATH.format(disinsector_id=disinsector_id)}",
+                    secret_token=secret_token,
+                )
+            except Exception as e:
+                logger.error(f"Не удалось установить webhook для дезинсектора {disinsector_id}: {e}")
 
+    await asyncio.gather(*(set_one(disinsector_id, bot) for disinsector_id, bot in bots.items()))
 
-    except Exception as e:
-        logger.error(f"Ошибка при отправке уведомления дезинсектору {disinsector.name}: {e}")
-        # Дополнительная диагностика ошибок
-        if "chat not found" in str(e):
-            logger.error(f"Не удалось отправить сообщение дезинсектору с ID {disinsector.telegram_user_id}. Возможно, он не начал чат с ботом.")
-        else:
-            logger.error(f"Неизвестная ошибка при отправке сообщения: {e}")
 
+async def run_webhook(dp, bots):
+    """
+    Запускает aiohttp-сервер, принимающий апдейты всех ботов дезинсекторов.
+    """
+    web_app = web.Application()
+    DisinsectorWebhookHandler(dp, bots, secret_token=Config.WEBHOOK_SECRET).register(web_app, path=Config.WEBHOOK_PATH)
+    setup_application(web_app, dp, bots=list(bots.values()))
+
+    await set_webhooks(bots, Config.WEBHOOK_BASE_URL, Config.WEBHOOK_SECRET)
+
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    site = web.TCPSite(runner, Config.WEBHOOK_HOST, Config.WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook-сервер запущен на {Config.WEBHOOK_HOST}:{Config.WEBHOOK_PORT} для {len(bots)} ботов")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
 
 
 # Основная функция для запуска всех ботов
+def load_disinsector_tokens():
+    return [tuple(row) for row in db.session.query(Disinsector.id, Disinsector.token).filter(Disinsector.token.isnot(None))]
+
+
 async def disinsector_bot_main():
-    app = create_app()
-    with app.app_context():
-        disinsectors = Disinsector.query.filter(Disinsector.token.isnot(None)).all()
-        tasks = [
-            start_disinsector_bot(disinsector.token, disinsector.id)
-            for disinsector in disinsectors
-        ]
-        await asyncio.gather(*tasks)
+    configure_logging('disinsector_bot')
+    app = create_db_app()
+    init_bot_db(app)
+    disinsectors = await run_db(load_disinsector_tokens)
+    dp, bots = create_disinsector_runtime(disinsectors) if disinsectors else (None, {})
+
+    # Очередь заявок и outbox разбираются и без ботов: принятые API заявки не должны
+    # зависать в order_jobs, пока не появится хотя бы один дезинсектор с токеном
+    background_tasks = [
+        asyncio.create_task(backlog_dispatch_loop()),
+        asyncio.create_task(order_job_loop()),
+        asyncio.create_task(cache_stats_loop(logger)),
+    ]
+    if Config.OUTBOX_RELAY_IN_BOT:
+        background_tasks.append(asyncio.create_task(outbox_relay_loop()))
+    metrics_runner = None
+    if Config.DISINSECTOR_BOT_METRICS_PORT:
+        metrics_runner = await start_metrics_server(
+            Config.METRICS_HOST, Config.DISINSECTOR_BOT_METRICS_PORT, [fsm_refresher(dp.storage)] if dp else [],
+        )
+    try:
+        if not bots:
+            logger.warning("Нет дезинсекторов с токенами: боты не запущены, работают только очереди заявок и уведомлений.")
+            await asyncio.Event().wait()
+        elif Config.DISINSECTOR_BOT_MODE == 'webhook':
+            logger.info(f"Запуск {len(bots)} ботов дезинсекторов в режиме webhook")
+            await run_webhook(dp, bots)
+        else:
+            logger.info(f"Запуск {len(bots)} ботов дезинсекторов в режиме polling")
+            await dp.start_polling(*bots.values())
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        shutdown_bot_db()
 
 
 if __name__ == '__main__':
@@ -1,8 +1,8 @@
 # init_db.py
-from app import create_app
+from app import create_db_app
 from database import db
 
-app = create_app()
+app = create_db_app()
 
 with app.app_context():
     db.create_all()
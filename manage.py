@@ -1,12 +1,48 @@
 # manage.py
 
+import click
 from flask import Flask
 from flask_migrate import Migrate
-from app import create_app
+from app import create_db_app
 from database import db
 
-app = create_app()
+app = create_db_app()
 migrate = Migrate(app, db)
 
+
+@app.cli.command('reconcile-loads')
+def reconcile_loads_command():
+    """Пересчитать load дезинсекторов по фактическим активным заявкам."""
+    from app.order_status import reconcile_loads
+    corrected = reconcile_loads()
+    print(f"Исправлено дезинсекторов: {corrected}")
+
+
+@app.cli.command('rebuild-order-stats')
+def rebuild_order_stats_command():
+    """Пересобрать сводную таблицу отчетов по дезинсекторам."""
+    from app.order_stats import rebuild_order_stats
+    rebuild_order_stats()
+    print("Сводная таблица отчетов пересобрана")
+
+
+@app.cli.command('prune-order-jobs')
+@click.option('--days', type=int, default=None, help='По умолчанию ORDER_JOB_RETENTION_DAYS.')
+def prune_order_jobs_command(days):
+    """Удалить выполненные задачи order_jobs старше заданного числа дней."""
+    from app.order_jobs import prune_order_jobs
+    days = app.config['ORDER_JOB_RETENTION_DAYS'] if days is None else days
+    print(f"Удалено задач: {prune_order_jobs(days)}")
+
+
+@app.cli.command('prune-outbox')
+@click.option('--days', type=int, default=None, help='По умолчанию OUTBOX_RETENTION_DAYS.')
+def prune_outbox_command(days):
+    """Удалить отправленные уведомления outbox старше заданного числа дней."""
+    from app.outbox import prune_outbox_messages
+    days = app.config['OUTBOX_RETENTION_DAYS'] if days is None else days
+    print(f"Удалено уведомлений: {prune_outbox_messages(days)}")
+
+
 if __name__ == '__main__':
     app.run()
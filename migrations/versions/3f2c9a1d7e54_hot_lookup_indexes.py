@@ -0,0 +1,37 @@
+"""hot lookup indexes
+
+Индексы под частые запросы: поиск клиента по телефону, заявки дезинсектора по статусу,
+фильтр и keyset-пагинация админ-панели, выбор свободного дезинсектора.
+Часть индексов могла уже появиться через db.create_all(), поэтому создаются с if_not_exists.
+
+Revision ID: 3f2c9a1d7e54
+Revises: 5a7e0c31d2b8
+Create Date: 2026-10-18 14:25:10.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2c9a1d7e54'
+down_revision = '5a7e0c31d2b8'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_clients_phone', 'clients', ['phone']),
+    ('ix_disinsectors_capacity', 'disinsectors', ['load', 'max_load', 'last_assigned']),
+    ('ix_orders_created_at_id', 'orders', ['created_at', 'id']),
+    ('ix_orders_status_created_at_id', 'orders', ['order_status', 'created_at', 'id']),
+    ('ix_orders_disinsector_status', 'orders', ['disinsector_id', 'order_status']),
+)
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,41 @@
+"""disinsector order stats
+
+Сводная таблица счетчиков заявок по дезинсекторам и статусам (REPORTS_SUMMARY_TABLE).
+Таблица могла уже появиться через db.create_all(), тогда она не создается повторно.
+Счетчики заполняются по существующим заявкам тем же GROUP BY, что и rebuild-order-stats.
+
+Revision ID: 5a7e0c31d2b8
+Revises: 8b1498b6179d
+Create Date: 2026-10-18 14:22:41.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a7e0c31d2b8'
+down_revision = '8b1498b6179d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('disinsector_order_stats'):
+        return
+    op.create_table('disinsector_order_stats',
+    sa.Column('disinsector_id', sa.Integer(), nullable=False),
+    sa.Column('order_status', sa.String(length=50), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['disinsector_id'], ['disinsectors.id'], ),
+    sa.PrimaryKeyConstraint('disinsector_id', 'order_status')
+    )
+    op.execute(
+        "INSERT INTO disinsector_order_stats (disinsector_id, order_status, order_count) "
+        "SELECT disinsector_id, order_status, COUNT(id) FROM orders "
+        "WHERE disinsector_id IS NOT NULL AND order_status IS NOT NULL GROUP BY disinsector_id, order_status"
+    )
+
+
+def downgrade():
+    op.drop_table('disinsector_order_stats')
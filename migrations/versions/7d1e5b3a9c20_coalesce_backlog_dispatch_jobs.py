@@ -0,0 +1,39 @@
+"""coalesce backlog dispatch jobs
+
+Частичный уникальный индекс: в order_jobs не больше одной ожидающей задачи
+dispatch_backlog. Уже накопившиеся дубликаты перед созданием индекса закрываются
+как выполненные - их работу сделает оставшаяся задача.
+
+Revision ID: 7d1e5b3a9c20
+Revises: e4b7c2a9f013
+Create Date: 2026-10-18 18:12:09.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d1e5b3a9c20'
+down_revision = 'e4b7c2a9f013'
+branch_labels = None
+depends_on = None
+
+PENDING_DISPATCH = "kind = 'dispatch_backlog' AND status = 'pending'"
+
+
+def upgrade():
+    op.execute(
+        "UPDATE order_jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP "
+        f"WHERE {PENDING_DISPATCH} AND id NOT IN (SELECT MIN(id) FROM order_jobs WHERE {PENDING_DISPATCH})"
+    )
+    with op.batch_alter_table('order_jobs', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_order_jobs_pending_dispatch', ['kind'], unique=True,
+            sqlite_where=sa.text(PENDING_DISPATCH), postgresql_where=sa.text(PENDING_DISPATCH),
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('order_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_jobs_pending_dispatch')
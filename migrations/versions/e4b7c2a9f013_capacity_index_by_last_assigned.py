@@ -0,0 +1,32 @@
+"""capacity index by last_assigned
+
+ix_disinsectors_capacity пересоздается с last_assigned первой колонкой: условие
+load < max_load не использует индекс (load, max_load, last_assigned), и выбор кандидата
+читал всю таблицу с сортировкой. С новым порядком SQLite обходит индекс по last_assigned
+и останавливается на первом дезинсекторе со свободным местом.
+
+Revision ID: e4b7c2a9f013
+Revises: 1269f1b82fc3
+Create Date: 2026-10-18 16:05:37.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c2a9f013'
+down_revision = '1269f1b82fc3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('disinsectors', schema=None) as batch_op:
+        batch_op.drop_index('ix_disinsectors_capacity')
+        batch_op.create_index('ix_disinsectors_capacity', ['last_assigned', 'load', 'max_load'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('disinsectors', schema=None) as batch_op:
+        batch_op.drop_index('ix_disinsectors_capacity')
+        batch_op.create_index('ix_disinsectors_capacity', ['load', 'max_load', 'last_assigned'], unique=False)
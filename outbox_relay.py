@@ -0,0 +1,105 @@
+# outbox_relay.py
+"""
+Relay исходящих уведомлений: забирает из таблицы outbox_messages пачки сообщений,
+записанных вместе с назначением заявок, и отправляет их в Telegram.
+
+По умолчанию relay работает внутри процесса ботов дезинсекторов (OUTBOX_RELAY_IN_BOT);
+его можно запустить и отдельным процессом:
+    python outbox_relay.py
+Несколько relay одновременно безопасны: сообщения берутся в аренду условным UPDATE.
+"""
+
+import asyncio
+import logging
+from functools import lru_cache
+
+from app import create_db_app
+from app.bot_db import init_bot_db, run_db, shutdown_bot_db
+from app.logging_setup import configure_logging
+from app.outbox import KEYBOARD_ACCEPT_ORDER, claim_outbox_messages, outbox_ready, record_outbox_results
+from app.telegram_sender import TelegramDeliveryError, get_sender
+from config import Config
+
+logger = logging.getLogger('outbox_relay')
+
+KEYBOARDS = {
+    KEYBOARD_ACCEPT_ORDER: 'inl_kb_accept_order',
+}
+
+
+@lru_cache(maxsize=None)
+def keyboard_markup(name):
+    """
+    reply_markup клавиатуры из keyboards.py. Модуль (и aiogram) загружается при первом
+    сообщении с клавиатурой, а не при старте relay.
+    """
+    import keyboards
+
+    return getattr(keyboards, KEYBOARDS[name]).model_dump(exclude_none=True)
+
+
+async def deliver(sender, message):
+    if not message['token'] or not message['chat_id']:
+        raise TelegramDeliveryError("Дезинсектор еще не подключил Telegram-бота")
+    params = {}
+    if message['keyboard'] in KEYBOARDS:
+        params['reply_markup'] = keyboard_markup(message['keyboard'])
+    await sender.send(message['token'], message['chat_id'], message['text'], **params)
+
+
+async def relay_outbox_batch(sender=None):
+    """
+    Отправляет одну пачку из outbox и фиксирует результаты одной транзакцией.
+    Транзакции не держатся открытыми во время сетевых вызовов. Возвращает размер пачки.
+    """
+    messages = await run_db(claim_outbox_messages, Config.OUTBOX_BATCH, Config.OUTBOX_LEASE)
+    if not messages:
+        return 0
+
+    sender = sender or get_sender()
+    results = await asyncio.gather(*(deliver(sender, message) for message in messages), return_exceptions=True)
+
+    sent_ids, failures = [], []
+    for message, result in zip(messages, results):
+        if isinstance(result, Exception):
+            permanent = isinstance(result, TelegramDeliveryError) and result.permanent
+            failures.append((message['id'], result, permanent))
+        else:
+            sent_ids.append(message['id'])
+    await run_db(record_outbox_results, sent_ids, failures, Config.OUTBOX_MAX_ATTEMPTS)
+    return len(messages)
+
+
+async def outbox_relay_loop(interval=None):
+    """
+    Разбирает outbox: пока есть сообщения, без пауз; иначе ждет app.outbox.wake_outbox_relay()
+    или interval секунд.
+    """
+    interval = interval or Config.OUTBOX_POLL_INTERVAL
+    while True:
+        try:
+            relayed = await relay_outbox_batch()
+        except Exception as e:
+            logger.error(f"Ошибка в цикле отправки уведомлений из outbox: {e}")
+            relayed = 0
+        if relayed < Config.OUTBOX_BATCH:
+            try:
+                await asyncio.wait_for(outbox_ready.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            outbox_ready.clear()
+
+
+async def main():
+    configure_logging('outbox_relay')
+    app = create_db_app()
+    init_bot_db(app)
+    logger.info("Relay уведомлений из outbox запущен")
+    try:
+        await outbox_relay_loop()
+    finally:
+        shutdown_bot_db()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+# tests/conftest.py
+
+import pytest
+
+from config import Config
+from database import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    Приложение на отдельной базе SQLite во временном каталоге теста.
+    """
+    from app import assignment, create_app, entity_cache
+
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        WTF_CSRF_ENABLED = False
+        TESTING = True
+        REPORTS_SUMMARY_TABLE = True
+        API_KEY = 'test-api-key'
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+    # Кэши и куча емкости живут в процессе: данные прошлого теста к новой базе не относятся
+    for cache in entity_cache.CACHES:
+        cache.clear()
+    assignment._capacity_heap = None
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def make_disinsector(app_context):
+    from app.model import Disinsector
+
+    counter = iter(range(1, 10 ** 6))
+
+    def make(max_load=5, load=0, **values):
+        number = next(counter)
+        disinsector = Disinsector(
+            name=f'Дезинсектор {number}',
+            email=f'disinsector{number}@example.com',
+            password='x',
+            token=f'{100000 + number}:TEST{number:06d}',
+            telegram_user_id=500000 + number,
+            load=load,
+            max_load=max_load,
+            **values,
+        )
+        db.session.add(disinsector)
+        db.session.commit()
+        return disinsector.id
+    return make
+
+
+@pytest.fixture
+def make_order(app_context):
+    from app.model import Client, Order, STATUS_NEW
+
+    counter = iter(range(1, 10 ** 6))
+
+    def make(disinsector_id=None, order_status=STATUS_NEW, **values):
+        number = next(counter)
+        client = Client(name=f'Клиент {number}', phone=f'7900{number:07d}', address=f'ул. Тестовая, д. {number}')
+        db.session.add(client)
+        db.session.flush()
+        order = Order(
+            client_id=client.id,
+            disinsector_id=disinsector_id,
+            order_status=order_status,
+            object_type='apartment',
+            insect_quantity='less_50',
+            disinsect_experience=False,
+            **values,
+        )
+        db.session.add(order)
+        db.session.commit()
+        return order.id
+    return make
@@ -0,0 +1,44 @@
+# tests/test_api.py
+
+import pytest
+
+ORDER = {
+    'client_name': 'Иван',
+    'phone_number': '79991234567',
+    'address': 'ул. Тестовая, д. 1',
+    'object_type': 'apartment',
+    'insect_quantity': 'less_50',
+}
+
+
+@pytest.fixture
+def csrf_app(app):
+    app.config['WTF_CSRF_ENABLED'] = True
+    return app
+
+
+def test_bulk_import_is_exempt_from_csrf_but_needs_api_key(csrf_app):
+    client = csrf_app.test_client()
+    body = '{"client_name": "Иван", "phone_number": "79991234567", "address": "ул. Тестовая, д. 1", ' \
+           '"object_type": "apartment", "insect_quantity": "less_50"}\n'
+    headers = {'Content-Type': 'application/x-ndjson'}
+    assert client.post('/api/orders/bulk', data=body, headers=headers).status_code == 401
+    response = client.post('/api/orders/bulk', data=body, headers=dict(headers, **{'X-API-Key': 'test-api-key'}))
+    assert response.status_code == 200
+    assert response.get_json()['imported'] == 1
+
+
+def test_order_api_requires_api_key(app):
+    client = app.test_client()
+    assert client.post('/api/create_order', json=ORDER).status_code == 401
+    headers = {'X-API-Key': 'test-api-key'}
+    response = client.post('/api/create_order', json=ORDER, headers=headers)
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+    assert client.get(status_url).status_code == 401
+    assert client.get(status_url, headers=headers).status_code == 200
+
+
+def test_create_order_with_api_key_is_exempt_from_csrf(csrf_app):
+    response = csrf_app.test_client().post('/api/create_order', json=ORDER, headers={'X-API-Key': 'test-api-key'})
+    assert response.status_code == 202
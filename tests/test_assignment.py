@@ -0,0 +1,114 @@
+# tests/test_assignment.py
+
+import threading
+from datetime import datetime, timedelta
+
+from app.assignment import CapacityHeap, assign_order, dispatch_backlog, reserve_capacity
+from app.metrics import unit_of_work
+from app.model import Disinsector, Order, OutboxMessage
+from database import db
+
+
+def loads():
+    return {row.id: (row.load, row.max_load) for row in db.session.query(Disinsector.id, Disinsector.load, Disinsector.max_load)}
+
+
+def test_reserve_capacity_stops_at_max_load(make_disinsector):
+    disinsector_id = make_disinsector(max_load=2)
+    reserved = [reserve_capacity(disinsector_id) for _ in range(5)]
+    db.session.commit()
+    assert reserved == [disinsector_id, disinsector_id, None, None, None]
+    assert loads()[disinsector_id] == (2, 2)
+
+
+def test_assign_order_never_exceeds_capacity(make_disinsector, make_order):
+    ids = [make_disinsector(max_load=1) for _ in range(3)]
+    order_ids = [make_order() for _ in range(5)]
+    results = [assign_order(order_id) for order_id in order_ids]
+    assert sum(result is not None for result in results) == 3
+    assert all(load <= max_load for load, max_load in loads().values())
+    assigned = [row.disinsector_id for row in db.session.query(Order.disinsector_id).filter(Order.disinsector_id.isnot(None))]
+    assert sorted(assigned) == sorted(ids)
+    # Уведомление ставится в outbox вместе с назначением
+    assert db.session.query(OutboxMessage).count() == 3
+
+
+def test_assign_order_twice_keeps_first_assignment(make_disinsector, make_order):
+    make_disinsector(max_load=5)
+    order_id = make_order()
+    assert assign_order(order_id) is not None
+    assert assign_order(order_id) is None
+    assert [load for load, _ in loads().values()] == [1]
+
+
+def test_assign_order_without_capacity_tries_once(make_disinsector, make_order):
+    make_disinsector(max_load=1, load=1)
+    order_id = make_order()
+    with unit_of_work('assign_order') as unit:
+        assert assign_order(order_id, attempts=3) is None
+    # Подзапрос уже выбрал лучшего кандидата: повторять UPDATE без кучи бессмысленно
+    assert unit.queries == 1
+
+
+def test_assign_order_with_capacity_heap(app, make_disinsector, make_order):
+    app.config['ASSIGNMENT_CAPACITY_HEAP'] = True
+    make_disinsector(max_load=2)
+    make_disinsector(max_load=1)
+    results = [assign_order(make_order()) for _ in range(5)]
+    assert sum(result is not None for result in results) == 3
+    assert all(load == max_load for load, max_load in loads().values())
+
+
+def test_capacity_heap_release_keeps_least_recently_assigned_first(make_disinsector):
+    now = datetime.utcnow()
+    first = make_disinsector(max_load=1, last_assigned=now - timedelta(hours=2))
+    waiting = make_disinsector(max_load=1, last_assigned=now - timedelta(hours=1))
+    heap = CapacityHeap()
+    heap.refresh()
+    assert heap.candidate() == first
+    heap.reserved(first)
+    assert heap.candidate() == waiting
+    # Освободившийся дезинсектор только что получил заявку и не обгоняет того, кто ждет дольше
+    heap.released(first)
+    assert heap.candidate() == waiting
+    heap.reserved(waiting)
+    assert heap.candidate() == first
+
+
+def test_concurrent_assignment_respects_capacity(app, make_disinsector, make_order):
+    for _ in range(3):
+        make_disinsector(max_load=2)
+    order_ids = [make_order() for _ in range(20)]
+    errors = []
+
+    def worker(chunk):
+        with app.app_context():
+            for order_id in chunk:
+                try:
+                    assign_order(order_id)
+                except Exception as e:
+                    errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(order_ids[i::4],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db.session.expire_all()
+    assert errors == []
+    assert all(load == max_load == 2 for load, max_load in loads().values())
+    assert db.session.query(Order).filter(Order.disinsector_id.isnot(None)).count() == 6
+
+
+def test_dispatch_backlog_respects_capacity(make_disinsector, make_order):
+    make_disinsector(max_load=2, load=1)
+    make_disinsector(max_load=3)
+    for _ in range(10):
+        make_order()
+    assignments = dispatch_backlog()
+    assert sum(len(assignment['orders']) for assignment in assignments.values()) == 4
+    assert all(load == max_load for load, max_load in loads().values())
+    assert db.session.query(Order).filter(Order.disinsector_id.is_(None)).count() == 6
+    # Одно пакетное уведомление на дезинсектора
+    assert db.session.query(OutboxMessage).count() == 2
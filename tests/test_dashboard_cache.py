@@ -0,0 +1,32 @@
+# tests/test_dashboard_cache.py
+
+import os
+import shutil
+
+import pytest
+from jinja2 import FileSystemLoader
+
+from app.dashboard_cache import DASHBOARD_TEMPLATES, templates_version
+
+
+@pytest.fixture
+def templates(app_context, tmp_path):
+    # Копия шаблонов: тест меняет время изменения файлов
+    folder = tmp_path / 'templates'
+    shutil.copytree(app_context.jinja_loader.searchpath[0], folder)
+    app_context.jinja_loader = FileSystemLoader(str(folder))
+    return folder
+
+
+def touch(folder, name):
+    path = folder / name
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+@pytest.mark.parametrize('auto_reload', [True, False])
+def test_templates_version_follows_auto_reload(app_context, templates, auto_reload):
+    app_context.jinja_env.auto_reload = auto_reload
+    before = templates_version()
+    touch(templates, DASHBOARD_TEMPLATES[1])
+    assert (templates_version() != before) == auto_reload
@@ -0,0 +1,96 @@
+# tests/test_disinsector_bot.py
+
+import asyncio
+from datetime import datetime, timedelta
+
+import disinsector_bot
+from app.bot_db import init_bot_db, shutdown_bot_db
+from app.model import Disinsector, Order, OrderJob, JOB_DONE, STATUS_DONE, STATUS_IN_PROGRESS, STATUS_NEW
+from app.order_jobs import claim_order_jobs
+from app.order_status import change_order_status
+from database import db
+from disinsector_bot import take_order_in_work
+
+
+def test_take_order_in_work_picks_oldest_of_several_new_orders(make_disinsector, make_order):
+    disinsector_id = make_disinsector(load=3)
+    now = datetime.utcnow()
+    newer = make_order(disinsector_id=disinsector_id, created_at=now)
+    oldest = make_order(disinsector_id=disinsector_id, created_at=now - timedelta(hours=1))
+    make_order(disinsector_id=disinsector_id, order_status=STATUS_IN_PROGRESS, created_at=now - timedelta(days=1))
+
+    assert take_order_in_work(disinsector_id) == oldest
+    assert take_order_in_work(disinsector_id) == newer
+    assert take_order_in_work(disinsector_id) is None
+    statuses = {order_status for order_status, in db.session.query(Order.order_status)}
+    assert statuses == {STATUS_IN_PROGRESS}
+
+
+def test_take_order_in_work_ignores_other_disinsectors(make_disinsector, make_order):
+    disinsector_id = make_disinsector()
+    other = make_disinsector(load=1)
+    make_order(disinsector_id=other, order_status=STATUS_NEW)
+    assert take_order_in_work(disinsector_id) is None
+
+
+def test_freed_capacity_wakes_backlog_dispatch(app, make_disinsector, make_order):
+    disinsector_id = make_disinsector(max_load=1, load=1)
+    done = make_order(disinsector_id=disinsector_id)
+    waiting = make_order()
+    # Статус меняет веб-кабинет, бот узнает об освободившемся месте из order_jobs
+    change_order_status(done, STATUS_DONE)
+    [job] = claim_order_jobs()
+
+    async def run():
+        disinsector_bot.capacity_changed.clear()
+        await disinsector_bot.process_order_job(job)
+        assert disinsector_bot.capacity_changed.is_set()
+        loop = asyncio.create_task(disinsector_bot.backlog_dispatch_loop(interval=60))
+        while await disinsector_bot.run_db(lambda: db.session.get(Order, waiting).disinsector_id) is None:
+            await asyncio.sleep(0.01)
+        loop.cancel()
+
+    init_bot_db(app)
+    try:
+        asyncio.run(asyncio.wait_for(run(), 5))
+    finally:
+        shutdown_bot_db()
+    db.session.expire_all()
+    assert db.session.get(OrderJob, job['id']).status == JOB_DONE
+    assert db.session.get(Order, waiting).disinsector_id == disinsector_id
+    assert db.session.get(Disinsector, disinsector_id).load == 1
+
+
+def test_main_without_bots_still_runs_order_jobs_and_outbox(app, monkeypatch):
+    started = set()
+
+    def fake_loop(name):
+        async def loop(*args, **kwargs):
+            started.add(name)
+            await asyncio.Event().wait()
+        return loop
+
+    monkeypatch.setattr(disinsector_bot, 'configure_logging', lambda name: None)
+    monkeypatch.setattr(disinsector_bot, 'create_db_app', lambda: app)
+    monkeypatch.setattr(disinsector_bot, 'order_job_loop', fake_loop('order_jobs'))
+    monkeypatch.setattr(disinsector_bot, 'outbox_relay_loop', fake_loop('outbox'))
+    monkeypatch.setattr(disinsector_bot, 'backlog_dispatch_loop', fake_loop('backlog'))
+    monkeypatch.setattr(disinsector_bot.Config, 'OUTBOX_RELAY_IN_BOT', True)
+    monkeypatch.setattr(disinsector_bot.Config, 'DISINSECTOR_BOT_METRICS_PORT', None)
+
+    async def run():
+        main = asyncio.create_task(disinsector_bot.disinsector_bot_main())
+        while not {'order_jobs', 'outbox'} <= started:
+            assert not main.done()
+            await asyncio.sleep(0.01)
+        main.cancel()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+
+
+def test_webhook_handler_verifies_secret():
+    handler = disinsector_bot.DisinsectorWebhookHandler(disinsector_bot.Dispatcher(), {}, secret_token='s3cret')
+    assert handler.verify_secret('s3cret', None)
+    assert not handler.verify_secret('wrong', None)
+    assert not handler.verify_secret(None, None)
+    assert disinsector_bot.DisinsectorWebhookHandler(disinsector_bot.Dispatcher(), {}).verify_secret(None, None)
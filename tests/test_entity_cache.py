@@ -0,0 +1,68 @@
+# tests/test_entity_cache.py
+
+from app.entity_cache import (
+    LRUTTLCache, get_client_id, get_disinsector_id_by_telegram_user, get_disinsector_profile, invalidate_disinsector,
+)
+from app.model import Client, Disinsector
+from database import db
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = LRUTTLCache('test_ttl', maxsize=10, ttl=5, clock=clock)
+    cache.set('a', 1)
+    clock.now = 4.9
+    assert cache.get('a') == 1
+    clock.now = 5.0
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = LRUTTLCache('test_lru', maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_zero_size_disables_cache():
+    cache = LRUTTLCache('test_disabled', maxsize=0)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+
+
+def test_profile_invalidation_reloads_from_database(make_disinsector):
+    disinsector_id = make_disinsector()
+    profile = get_disinsector_profile(disinsector_id)
+    assert get_disinsector_id_by_telegram_user(profile['telegram_user_id']) == disinsector_id
+
+    disinsector = db.session.get(Disinsector, disinsector_id)
+    disinsector.name = 'Новое имя'
+    disinsector.telegram_user_id = 999
+    db.session.commit()
+    # До инвалидации процесс видит закэшированный профиль
+    assert get_disinsector_profile(disinsector_id)['name'] == profile['name']
+
+    invalidate_disinsector(disinsector_id)
+    assert get_disinsector_profile(disinsector_id)['name'] == 'Новое имя'
+    assert get_disinsector_id_by_telegram_user(profile['telegram_user_id']) is None
+    assert get_disinsector_id_by_telegram_user(999) == disinsector_id
+
+
+def test_missing_client_is_not_cached(app_context):
+    assert get_client_id('79990000000') is None
+    client = Client(name='Иван', phone='79990000000', address='ул. Тестовая, д. 1')
+    db.session.add(client)
+    db.session.commit()
+    assert get_client_id('79990000000') == client.id
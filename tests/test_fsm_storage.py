@@ -0,0 +1,73 @@
+# tests/test_fsm_storage.py
+
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from app.fsm_storage import SQLiteStorage
+
+
+def key(chat_id, bot_id=1):
+    return StorageKey(bot_id=bot_id, chat_id=chat_id, user_id=chat_id)
+
+
+def test_dialogs_survive_restart(tmp_path):
+    path = tmp_path / 'fsm.db'
+
+    async def first_run():
+        storage = SQLiteStorage(path, flush_interval=60)
+        await storage.set_state(key(1), 'ClientForm:phone')
+        await storage.update_data(key(1), {'name': 'Иван'})
+        await storage.update_data(key(1), {'object_type': 'apartment'})
+        await storage.set_state(key(2), 'ClientForm:name')
+        await storage.set_state(key(2), None)
+        # Изменения не записываются сразу, их сохраняет close
+        assert storage.stats['flushes'] == 0
+        await storage.close()
+        assert storage.stats['flushes'] == 1
+
+    async def second_run():
+        storage = SQLiteStorage(path)
+        try:
+            return (
+                await storage.get_state(key(1)), await storage.get_data(key(1)),
+                await storage.get_state(key(2)), await storage.get_data(key(2)),
+            )
+        finally:
+            await storage.close()
+
+    asyncio.run(first_run())
+    assert asyncio.run(second_run()) == (
+        'ClientForm:phone', {'name': 'Иван', 'object_type': 'apartment'}, None, {},
+    )
+
+
+def test_evicted_dirty_dialog_is_not_lost(tmp_path):
+    async def run():
+        storage = SQLiteStorage(tmp_path / 'fsm.db', flush_interval=60, max_cached=2)
+        try:
+            for chat_id in range(1, 6):
+                await storage.set_data(key(chat_id), {'step': chat_id})
+            assert len(storage._cache) == 2
+            # Вытесненная, но не записанная запись читается из ожидающих записи
+            assert await storage.get_data(key(1)) == {'step': 1}
+            await storage.flush()
+            storage._cache.clear()
+            return [await storage.get_data(key(chat_id)) for chat_id in range(1, 6)]
+        finally:
+            await storage.close()
+
+    assert asyncio.run(run()) == [{'step': chat_id} for chat_id in range(1, 6)]
+
+
+def test_keys_of_different_bots_are_separate(tmp_path):
+    async def run():
+        storage = SQLiteStorage(tmp_path / 'fsm.db')
+        try:
+            await storage.set_state(key(1, bot_id=1), 'A')
+            await storage.set_state(key(1, bot_id=2), 'B')
+            return await storage.get_state(key(1, bot_id=1)), await storage.get_state(key(1, bot_id=2))
+        finally:
+            await storage.close()
+
+    assert asyncio.run(run()) == ('A', 'B')
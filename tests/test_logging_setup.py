@@ -0,0 +1,46 @@
+# tests/test_logging_setup.py
+
+import json
+import logging
+
+import pytest
+
+from app import logging_setup
+from app.logging_setup import NoisyLoggersFilter
+
+
+def record(name, level):
+    return logging.LogRecord(name, level, __file__, 0, 'message', (), None)
+
+
+@pytest.mark.parametrize('name, level, passed', [
+    ('aiogram.event', logging.INFO, False),
+    ('aiohttp.access', logging.INFO, False),
+    ('aiogram.event.child', logging.DEBUG, False),
+    ('aiogram.event', logging.WARNING, True),
+    ('aiohttp.access', logging.ERROR, True),
+    ('aiogram.eventual', logging.INFO, True),
+    ('assignment', logging.INFO, True),
+])
+def test_noisy_loggers_filter(name, level, passed):
+    assert NoisyLoggersFilter().filter(record(name, level)) is passed
+
+
+def test_noisy_loggers_are_filtered_only_in_the_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(logging_setup, '_listener', None)
+    monkeypatch.setattr(logging_setup, '_queue_handler', None)
+    monkeypatch.setattr(logging_setup.Config, 'LOG_CONSOLE', False)
+    root = logging.getLogger()
+    monkeypatch.setattr(root, 'level', root.level)
+    log_file = tmp_path / 'bot.log'
+    logging_setup.configure_logging('test', log_file=str(log_file), level=logging.INFO)
+    try:
+        logging.getLogger('aiogram.event').info('update handled')
+        logging.getLogger('aiogram.event').warning('slow update')
+        logging.getLogger('assignment').info('order assigned')
+    finally:
+        logging_setup.shutdown_logging()
+    # Уровень логгера не меняется: INFO доходит до консоли, отсекает его только файловый обработчик
+    assert logging.getLogger('aiogram.event').level == logging.NOTSET
+    messages = [json.loads(line)['message'] for line in log_file.read_text(encoding='utf-8').splitlines()]
+    assert messages == ['slow update', 'order assigned']
@@ -0,0 +1,23 @@
+# tests/test_order_feed.py
+
+import json
+from datetime import datetime, timedelta
+
+from app.order_feed import encode_change_cursor, order_events
+
+
+def test_zero_max_duration_is_a_single_poll(make_order):
+    changed_at = datetime.utcnow() - timedelta(minutes=1)
+    order_id = make_order(created_at=changed_at, updated_at=changed_at)
+    cursor = encode_change_cursor(changed_at - timedelta(seconds=1), 0)
+
+    # Поток завершается сразу после одной проверки, без ожидания poll_interval
+    events = list(order_events(cursor, poll_interval=60, max_duration=0))
+
+    assert events[0] == 'retry: 60000\n\n'
+    [event] = events[1:]
+    event_id, name, data = event.strip().split('\n')
+    # Курсор сдвигается к границе lag, а не к последней отправленной заявке
+    assert event_id > f"id: {encode_change_cursor(changed_at, order_id)}"
+    assert name == 'event: orders'
+    assert [order['id'] for order in json.loads(data[len('data: '):])] == [order_id]
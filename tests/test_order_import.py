@@ -0,0 +1,59 @@
+# tests/test_order_import.py
+
+import pytest
+
+from app.model import Client, Order
+from app.order_import import import_orders, parse_order_row
+from database import db
+
+ROW = {
+    'client_name': ' Иван ',
+    'phone_number': '+7 (999) 123-45-67',
+    'address': 'ул. Тестовая, д. 1',
+    'object_type': 'apartment',
+    'insect_quantity': 'less_50',
+}
+
+
+def test_parse_order_row_normalizes_fields():
+    fields, error = parse_order_row(dict(ROW, disinsect_experience='Да'))
+    assert error is None
+    assert fields['client_name'] == 'Иван'
+    assert fields['phone'] == '79991234567'
+    assert fields['disinsect_experience'] is True
+
+
+@pytest.mark.parametrize('row, error', [
+    (None, 'invalid json object'),
+    (dict(ROW, address=' '), 'Missing fields: address'),
+    ({}, 'Missing fields: client_name, phone_number, address, object_type, insect_quantity'),
+    (dict(ROW, phone_number='12-34'), 'invalid phone_number'),
+])
+def test_parse_order_row_errors(row, error):
+    assert parse_order_row(row) == (None, error)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (True, True), ('no', False), ('1', True), (None, False), ('', False),
+])
+def test_parse_order_row_experience(value, expected):
+    fields, _ = parse_order_row(dict(ROW, disinsect_experience=value))
+    assert fields['disinsect_experience'] is expected
+
+
+def test_import_orders_returns_counts_and_first_errors(app_context):
+    rows = [
+        (1, ROW),
+        (2, None),
+        (3, dict(ROW, client_name='Петр', phone_number='79990000001')),
+        (4, dict(ROW, address='')),
+        (5, dict(ROW, phone_number='1')),
+    ]
+    result = import_orders(rows, chunk_size=2, max_errors=2)
+    assert result == {
+        'imported': 2,
+        'failed': 3,
+        'errors': [{'row': 2, 'error': 'invalid json object'}, {'row': 4, 'error': 'Missing fields: address'}],
+    }
+    assert db.session.query(Order).count() == 2
+    assert db.session.query(Client).count() == 2
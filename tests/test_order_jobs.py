@@ -0,0 +1,25 @@
+# tests/test_order_jobs.py
+
+from datetime import datetime, timedelta
+
+from app.model import JOB_DONE, JOB_FAILED, JOB_PENDING, OrderJob
+from app.order_jobs import enqueue_order_job, prune_order_jobs
+from database import db
+
+
+def test_prune_removes_only_old_done_jobs(make_order):
+    order_id = make_order()
+    old = datetime.utcnow() - timedelta(days=10)
+    for status, finished_at in [
+        (JOB_DONE, old), (JOB_DONE, old), (JOB_DONE, old),
+        (JOB_DONE, datetime.utcnow()),  # еще в окне хранения
+        (JOB_FAILED, old),  # остается для разбора
+        (JOB_PENDING, None),
+    ]:
+        job = enqueue_order_job(order_id)
+        job.status, job.finished_at = status, finished_at
+    db.session.commit()
+
+    assert prune_order_jobs(7, batch=2) == 3
+    remaining = sorted(status for status, in db.session.query(OrderJob.status))
+    assert remaining == sorted([JOB_DONE, JOB_FAILED, JOB_PENDING])
@@ -0,0 +1,25 @@
+# tests/test_order_queries.py
+
+from datetime import datetime, timedelta
+
+from app.model import Order, STATUS_IN_PROGRESS
+from app.order_queries import SORT_OLDEST, fetch_orders_page
+from app.order_status import change_order_status
+from database import db
+
+
+def test_status_change_keeps_keyset_position(make_disinsector, make_order):
+    disinsector_id = make_disinsector()
+    started = datetime(2026, 1, 1)
+    order_ids = [
+        make_order(disinsector_id=disinsector_id, created_at=started + timedelta(minutes=minute))
+        for minute in range(4)
+    ]
+
+    rows, cursor = fetch_orders_page(sort=SORT_OLDEST, page_size=2)
+    # Смена статуса обновляет updated_at, но не created_at - ключ пагинации
+    change_order_status(order_ids[0], STATUS_IN_PROGRESS)
+    assert db.session.get(Order, order_ids[0]).created_at == started
+    more, _ = fetch_orders_page(sort=SORT_OLDEST, cursor=cursor, page_size=2)
+
+    assert [row.id for row in rows + more] == order_ids
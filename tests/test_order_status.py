@@ -0,0 +1,122 @@
+# tests/test_order_status.py
+
+import pytest
+
+from app.model import (
+    Disinsector, OrderJob, JOB_DISPATCH_BACKLOG, JOB_DONE, JOB_PENDING, JOB_PROCESSING,
+    STATUS_DONE, STATUS_IN_PROGRESS, STATUS_NEW,
+)
+from app.order_jobs import claim_order_jobs, finish_order_job
+from app.order_status import change_order_status, load_delta, reconcile_loads
+from database import db
+
+
+def load_of(disinsector_id):
+    return db.session.query(Disinsector.load).filter(Disinsector.id == disinsector_id).scalar()
+
+
+@pytest.mark.parametrize('old_status, new_status, delta', [
+    (STATUS_NEW, STATUS_IN_PROGRESS, 0),
+    (STATUS_IN_PROGRESS, STATUS_NEW, 0),
+    (STATUS_NEW, STATUS_DONE, -1),
+    (STATUS_IN_PROGRESS, STATUS_DONE, -1),
+    (STATUS_DONE, STATUS_NEW, 1),
+    (STATUS_DONE, STATUS_IN_PROGRESS, 1),
+    (STATUS_DONE, STATUS_DONE, 0),
+])
+def test_load_delta(old_status, new_status, delta):
+    assert load_delta(old_status, new_status) == delta
+
+
+@pytest.mark.parametrize('old_status, new_status, load_before, load_after', [
+    (STATUS_NEW, STATUS_IN_PROGRESS, 1, 1),
+    (STATUS_IN_PROGRESS, STATUS_DONE, 1, 0),
+    (STATUS_DONE, STATUS_IN_PROGRESS, 0, 1),
+    (STATUS_NEW, STATUS_DONE, 0, 0),  # load не уходит ниже нуля
+])
+def test_change_order_status_adjusts_load(make_disinsector, make_order, old_status, new_status, load_before, load_after):
+    disinsector_id = make_disinsector(load=load_before)
+    order_id = make_order(disinsector_id=disinsector_id, order_status=old_status)
+    result = change_order_status(order_id, new_status)
+    assert result['old_status'] == old_status
+    assert result['freed'] == (load_delta(old_status, new_status) < 0)
+    assert load_of(disinsector_id) == load_after
+
+
+@pytest.mark.parametrize('new_status, enqueued', [(STATUS_DONE, True), (STATUS_IN_PROGRESS, False)])
+def test_freed_capacity_enqueues_backlog_dispatch(make_disinsector, make_order, new_status, enqueued):
+    order_id = make_order(disinsector_id=make_disinsector(load=1))
+    change_order_status(order_id, new_status)
+    jobs = db.session.query(OrderJob.order_id).filter(OrderJob.kind == JOB_DISPATCH_BACKLOG).all()
+    assert jobs == ([(order_id,)] if enqueued else [])
+
+
+def test_backlog_dispatch_jobs_are_coalesced(make_disinsector, make_order):
+    disinsector_id = make_disinsector(load=3)
+    order_ids = [make_order(disinsector_id=disinsector_id) for _ in range(3)]
+    for order_id in order_ids:
+        change_order_status(order_id, STATUS_DONE)
+    jobs = db.session.query(OrderJob.order_id).filter(OrderJob.kind == JOB_DISPATCH_BACKLOG).all()
+    assert jobs == [(order_ids[0],)]
+
+    # Пока задача в обработке, новое освобождение емкости ставит следующую
+    [job] = claim_order_jobs()
+    change_order_status(make_order(disinsector_id=disinsector_id), STATUS_DONE)
+    statuses = db.session.query(OrderJob.status).filter(OrderJob.kind == JOB_DISPATCH_BACKLOG).order_by(OrderJob.id)
+    assert [status for status, in statuses] == [JOB_PROCESSING, JOB_PENDING]
+
+    # Повтор упавшей задачи не нужен: ее работу сделает уже ожидающая
+    finish_order_job(job['id'], error=RuntimeError('сбой'))
+    assert [status for status, in statuses] == [JOB_DONE, JOB_PENDING]
+
+
+def test_change_order_status_checks_disinsector(make_disinsector, make_order):
+    owner = make_disinsector(load=1)
+    other = make_disinsector()
+    order_id = make_order(disinsector_id=owner)
+    assert change_order_status(order_id, STATUS_DONE, disinsector_id=other) is None
+    assert load_of(owner) == 1
+
+
+def test_change_order_status_rejects_unknown_status(make_order):
+    with pytest.raises(ValueError):
+        change_order_status(make_order(), 'Отменена')
+
+
+def test_reconcile_loads(make_disinsector, make_order):
+    drifted = make_disinsector(load=4)
+    correct = make_disinsector(load=1)
+    make_order(disinsector_id=drifted, order_status=STATUS_IN_PROGRESS)
+    make_order(disinsector_id=drifted, order_status=STATUS_DONE)
+    make_order(disinsector_id=correct)
+    assert reconcile_loads() == 1
+    assert (load_of(drifted), load_of(correct)) == (1, 1)
+    assert reconcile_loads() == 0
+
+
+def test_concurrent_reassignment_moves_load_of_new_owner(make_disinsector, make_order):
+    from sqlalchemy import event, update
+
+    from app.model import Order
+
+    owner = make_disinsector(load=1)
+    new_owner = make_disinsector(load=1)
+    order_id = make_order(disinsector_id=owner)
+    engine = db.engine
+    reassigned = []
+
+    def reassign_before_update(conn, cursor, statement, parameters, context, executemany):
+        # Между чтением заявки и условным UPDATE ее переназначает другой процесс
+        if statement.startswith('UPDATE orders') and not reassigned:
+            reassigned.append(True)
+            with engine.begin() as other:
+                other.execute(update(Order).where(Order.id == order_id).values(disinsector_id=new_owner))
+
+    event.listen(engine, 'before_cursor_execute', reassign_before_update)
+    try:
+        result = change_order_status(order_id, STATUS_DONE)
+    finally:
+        event.remove(engine, 'before_cursor_execute', reassign_before_update)
+
+    assert reassigned and result['disinsector_id'] == new_owner
+    assert (load_of(owner), load_of(new_owner)) == (1, 0)
@@ -0,0 +1,86 @@
+# tests/test_outbox.py
+
+from datetime import datetime, timedelta
+
+from app.model import JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_PROCESSING, OutboxMessage
+from app.outbox import (
+    add_outbox_message, claim_outbox_messages, enqueue_order_notification, prune_outbox_messages, record_outbox_results,
+)
+from database import db
+
+ORDER = {'id': 7, 'client_name': 'Иван', 'address': 'ул. Тестовая, д. 1', 'phone': '79991234567', 'object_type': 'apartment'}
+
+
+def test_enqueue_is_idempotent(make_disinsector):
+    disinsector_id = make_disinsector()
+    for _ in range(3):
+        enqueue_order_notification(disinsector_id, ORDER)
+        db.session.commit()
+    assert db.session.query(OutboxMessage).count() == 1
+
+
+def test_claim_leases_messages_once(make_disinsector):
+    disinsector_id = make_disinsector()
+    add_outbox_message('a', disinsector_id, 'текст')
+    db.session.commit()
+    messages = claim_outbox_messages()
+    assert [(message['idempotency_key'], message['attempts']) for message in messages] == [('a', 1)]
+    assert messages[0]['chat_id'] is not None and messages[0]['token'] is not None
+    # Аренда еще действует - повторно сообщение не выдается
+    assert claim_outbox_messages() == []
+
+
+def test_expired_lease_is_claimed_again(make_disinsector):
+    add_outbox_message('a', make_disinsector(), 'текст')
+    db.session.commit()
+    claim_outbox_messages(lease_seconds=0)
+    messages = claim_outbox_messages()
+    assert [message['attempts'] for message in messages] == [2]
+
+
+def test_record_results_backoff_and_failures(make_disinsector):
+    disinsector_id = make_disinsector()
+    for key in ('sent', 'retry', 'permanent'):
+        add_outbox_message(key, disinsector_id, 'текст')
+    db.session.commit()
+    ids = {message['idempotency_key']: message['id'] for message in claim_outbox_messages()}
+
+    before = datetime.utcnow()
+    record_outbox_results([ids['sent']], [(ids['retry'], 'timeout', False), (ids['permanent'], 'blocked', True)])
+    messages = {message.idempotency_key: message for message in db.session.query(OutboxMessage)}
+    assert messages['sent'].status == JOB_DONE
+    assert messages['permanent'].status == JOB_FAILED
+    retry = messages['retry']
+    assert retry.status == JOB_PENDING and retry.last_error == 'timeout'
+    # Первая попытка - задержка 2 ** 1 секунды
+    assert before + timedelta(seconds=1) <= retry.available_at <= datetime.utcnow() + timedelta(seconds=2)
+    assert claim_outbox_messages() == []
+
+
+def test_attempts_exhausted_fail_message(make_disinsector):
+    add_outbox_message('a', make_disinsector(), 'текст')
+    db.session.commit()
+    message_id = claim_outbox_messages()[0]['id']
+    record_outbox_results([], [(message_id, 'timeout', False)], max_attempts=1)
+    assert db.session.get(OutboxMessage, message_id).status == JOB_FAILED
+    assert db.session.query(OutboxMessage).filter(OutboxMessage.status == JOB_PROCESSING).count() == 0
+
+
+def test_prune_removes_only_old_sent_messages(make_disinsector):
+    disinsector_id = make_disinsector()
+    old = datetime.utcnow() - timedelta(days=40)
+    for key, status, sent_at in [
+        ('old-1', JOB_DONE, old), ('old-2', JOB_DONE, old),
+        ('recent', JOB_DONE, datetime.utcnow()),
+        ('failed', JOB_FAILED, None),
+        ('pending', JOB_PENDING, None),
+    ]:
+        add_outbox_message(key, disinsector_id, 'текст')
+        db.session.query(OutboxMessage).filter(OutboxMessage.idempotency_key == key).update(
+            {'status': status, 'sent_at': sent_at},
+        )
+    db.session.commit()
+
+    assert prune_outbox_messages(30, batch=1) == 2
+    remaining = sorted(key for key, in db.session.query(OutboxMessage.idempotency_key))
+    assert remaining == ['failed', 'pending', 'recent']
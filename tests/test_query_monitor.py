@@ -0,0 +1,51 @@
+# tests/test_query_monitor.py
+
+import pytest
+
+from app import query_monitor
+from app.metrics import unit_of_work
+from app.model import Order
+from database import db
+
+HEADERS = {'X-API-Key': 'test-api-key'}
+
+
+@pytest.fixture
+def strict_app(app, monkeypatch):
+    # Настройки монитора общие для процесса: возвращаются после теста
+    monkeypatch.setattr(query_monitor, '_settings', dict(query_monitor._settings))
+    app.config.update(QUERY_BUDGET_STRICT=True, N_PLUS_ONE_THRESHOLD=5)
+    query_monitor.init_app(app)
+    return app
+
+
+def test_strict_mode_fails_route_over_budget(strict_app, make_order, monkeypatch):
+    order_id = make_order()
+    client = strict_app.test_client()
+    assert client.get(f'/api/orders/{order_id}/status', headers=HEADERS).status_code == 200
+
+    monkeypatch.setattr(strict_app.view_functions['api.order_status'], 'query_budget', 1)
+    with pytest.raises(query_monitor.QueryBudgetExceeded, match='при бюджете 1'):
+        client.get(f'/api/orders/{order_id}/status', headers=HEADERS)
+
+
+def test_repeated_shape_is_flagged_as_n_plus_one(strict_app, make_order):
+    ids = [make_order() for _ in range(5)]
+    db.session.expunge_all()
+
+    with pytest.raises(query_monitor.QueryBudgetExceeded, match='N\\+1') as error:
+        with unit_of_work('orders_one_by_one'):
+            for order_id in ids:
+                db.session.get(Order, order_id)
+    assert 'orders_one_by_one' in str(error.value)
+
+    # Один запрос со списком IN того же набора - не N+1
+    with unit_of_work('orders_in_one_query') as unit:
+        db.session.query(Order).filter(Order.id.in_(ids)).all()
+    assert unit.queries == 1
+
+
+def test_in_lists_of_any_length_share_one_shape():
+    short = query_monitor.statement_shape('SELECT * FROM orders WHERE id IN (?, ?)')
+    long = query_monitor.statement_shape('SELECT *\n  FROM orders WHERE id IN (?, ?, ?, ?)')
+    assert short == long == 'SELECT * FROM orders WHERE id IN (?...)'
@@ -0,0 +1,15 @@
+# tests/test_query_plans.py
+
+from benchmarks.common import seed
+from benchmarks.query_plans import explain, full_scans, hot_queries
+from database import db
+
+
+def test_hot_queries_use_indexes(app_context):
+    # Небольшой набор данных, ANALYZE дает планировщику ту же статистику, что и на проде
+    seed(disinsectors=100, orders=2000)
+    db.session.execute(db.text('ANALYZE'))
+
+    scans = {name: full_scans(explain(statement)) for name, statement in hot_queries()}
+
+    assert {name: steps for name, steps in scans.items() if steps} == {}
@@ -0,0 +1,65 @@
+# tests/test_telegram_sender.py
+
+import asyncio
+import time
+
+from aiohttp import web
+
+from app.telegram_sender import TelegramSender
+
+
+async def start_server(handler):
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f'http://127.0.0.1:{port}'
+
+
+def ok(chat_id):
+    return web.json_response({'ok': True, 'result': {'message_id': 1, 'chat': {'id': chat_id}}})
+
+
+def test_non_json_gateway_error_is_retried():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.match_info['token'])
+        if len(calls) == 1:
+            return web.Response(status=502, text='<html><body>502 Bad Gateway</body></html>', content_type='text/html')
+        return ok((await request.json())['chat_id'])
+
+    async def run():
+        runner, url = await start_server(handler)
+        sender = TelegramSender(api_url=url, global_rate=100, chat_rate=100, max_retries=2).start()
+        try:
+            return await sender.send('1:A', 10, 'text')
+        finally:
+            sender.stop()
+            await runner.cleanup()
+
+    assert asyncio.run(run())['chat']['id'] == 10
+    assert len(calls) == 2
+
+
+def test_rate_limit_is_per_token():
+    async def handler(request):
+        return ok((await request.json())['chat_id'])
+
+    async def run():
+        runner, url = await start_server(handler)
+        # Один токен - одно сообщение в секунду; с общим лимитом второй бот ждал бы секунду
+        sender = TelegramSender(api_url=url, global_rate=1, chat_rate=100).start()
+        try:
+            await sender.send('1:A', 10, 'warm-up')
+            started = time.perf_counter()
+            await asyncio.gather(*(sender.send(f'{bot}:B', 10, 'text') for bot in range(2, 5)))
+            return time.perf_counter() - started
+        finally:
+            sender.stop()
+            await runner.cleanup()
+
+    assert asyncio.run(run()) < 0.5
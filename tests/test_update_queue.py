@@ -0,0 +1,98 @@
+# tests/test_update_queue.py
+
+import asyncio
+
+from app.update_queue import UpdateQueue
+
+
+def message(update_id, chat_id):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 1700000000,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': str(update_id),
+        },
+    }
+
+
+class StubDispatcher:
+    """
+    Записывает начало и конец обработки каждого апдейта; release держит обработчики.
+    """
+    def __init__(self, release=None, delay=0):
+        self.release = release
+        self.delay = delay
+        self.events = []
+        self.active = {}
+        self.max_active_per_chat = 0
+
+    async def feed_update(self, bot, update):
+        chat_id = update.message.chat.id
+        self.active[chat_id] = self.active.get(chat_id, 0) + 1
+        self.max_active_per_chat = max(self.max_active_per_chat, self.active[chat_id])
+        self.events.append(('start', chat_id, update.update_id))
+        if self.release is not None:
+            await self.release.wait()
+        await asyncio.sleep(self.delay)
+        self.events.append(('end', chat_id, update.update_id))
+        self.active[chat_id] -= 1
+
+
+def test_updates_of_one_chat_run_in_order_one_at_a_time():
+    dispatcher = StubDispatcher(delay=0.001)
+
+    async def run():
+        queue = UpdateQueue(dispatcher, bot=None, name='test', workers=4)
+        queue.start()
+        for update_id in range(1, 11):
+            assert queue.put_nowait(message(update_id, chat_id=100 + update_id % 2))
+        return await queue.drain(timeout=5)
+
+    assert asyncio.run(run()) == 0
+    assert dispatcher.max_active_per_chat == 1
+    for chat_id in (100, 101):
+        started = [update_id for kind, chat, update_id in dispatcher.events if kind == 'start' and chat == chat_id]
+        assert started == sorted(started) and len(started) == 5
+    # Чаты обрабатывались параллельно, а не друг за другом
+    assert dispatcher.events[0][0] == dispatcher.events[1][0] == 'start'
+
+
+def test_full_queue_rejects_updates():
+    async def run():
+        release = asyncio.Event()
+        queue = UpdateQueue(StubDispatcher(release), bot=None, name='test', workers=1, max_pending=2)
+        queue.start()
+        assert queue.put_nowait(message(1, 1))
+        assert queue.put_nowait(message(2, 2))
+        assert not queue.put_nowait(message(3, 3))
+        assert not await queue.put(message(4, 4), timeout=0.01)
+
+        # Освободившееся место достается ожидающему put
+        waiting = asyncio.create_task(queue.put(message(5, 5), timeout=5))
+        await asyncio.sleep(0)
+        release.set()
+        assert await waiting
+        return await queue.drain(timeout=5)
+
+    assert asyncio.run(run()) == 0
+
+
+def test_drain_reports_dropped_updates_on_timeout():
+    async def run():
+        release = asyncio.Event()
+        dispatcher = StubDispatcher(release)
+        queue = UpdateQueue(dispatcher, bot=None, name='test', workers=1)
+        queue.start()
+        for update_id in range(1, 4):
+            queue.put_nowait(message(update_id, chat_id=1))
+        await asyncio.sleep(0)
+        dropped = await queue.drain(timeout=0.01)
+        # После остановки новые апдейты не принимаются
+        return dropped, queue.put_nowait(message(4, 1)), dispatcher.events
+
+    dropped, accepted, events = asyncio.run(run())
+    assert dropped == 3
+    assert not accepted
+    assert events == [('start', 1, 1)]